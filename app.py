@@ -1,35 +1,97 @@
 from flask import (
     Flask, render_template, jsonify, redirect, url_for, request,
-    flash, session, make_response
+    flash, session, make_response, g, send_file, stream_with_context,
+    before_render_template, template_rendered
 )
-from flask_mysqldb import MySQL
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import os
 import datetime
+import hmac
+import itertools
 import logging
+import math
+import uuid
+import threading
 from functools import wraps
-import MySQLdb  # for better exception messages
+from db_pool import ConnectionPool
+from storage import create_backend, DataStore, PAGINATED_TABLES, EXPORT_TABLES, encode_cursor, decode_cursor
+from slot_index import SlotIndex
+from content_cache import create_content_cache
+from http_cache import PageCache
+from instrumentation import Instrumentation, SlowRequestProfiler
+from query_log import QueryLog
+from bill_renderer import BillRenderer, QueueFull, find_wkhtmltopdf
+import bill_export
+import data_export
+from tariff import TariffTable
+from payment_ingest import PaymentIngestor, IngestTimeout
+from slot_release import SlotReleaseScheduler
+from booking_engine import BookingEngine, BookingContention
+from slot_events import SlotEventHub, TooManySubscribers
+import availability
+import locations
+import occupancy
+import pdf_bill
 
 app = Flask(__name__)
 
 # -------------------------
 # Configuration
 # -------------------------
+app.config['DB_BACKEND'] = os.getenv('DB_BACKEND', 'mysql')  # 'mysql' or 'sqlite'
+app.config['SQLITE_PATH'] = os.getenv('SQLITE_PATH', 'parking_system1.db')
 app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST', 'localhost')
 app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'root')
 app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', 'kane@22*')
 app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'parking_system1')
 app.config['MYSQL_PORT'] = int(os.getenv('MYSQL_PORT', 3306))
+app.config['MYSQL_POOL_MIN_SIZE'] = int(os.getenv('MYSQL_POOL_MIN_SIZE', 2))
+app.config['MYSQL_POOL_MAX_SIZE'] = int(os.getenv('MYSQL_POOL_MAX_SIZE', 10))
+app.config['MYSQL_POOL_TIMEOUT'] = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))
+app.config['MYSQL_POOL_MAX_LIFETIME'] = float(os.getenv('MYSQL_POOL_MAX_LIFETIME', 3600))
+app.config['SLOT_INDEX_RECONCILE_SECONDS'] = float(os.getenv('SLOT_INDEX_RECONCILE_SECONDS', 60))
+app.config['ADMIN_DASHBOARD_PAGE_SIZE'] = int(os.getenv('ADMIN_DASHBOARD_PAGE_SIZE', 10))
+app.config['CONTENT_CACHE_BACKEND'] = os.getenv('CONTENT_CACHE_BACKEND', 'lru')  # 'lru', 'file' or 'none'
+app.config['CONTENT_CACHE_TTL'] = float(os.getenv('CONTENT_CACHE_TTL', 300))
+app.config['CONTENT_CACHE_MAX_ENTRIES'] = int(os.getenv('CONTENT_CACHE_MAX_ENTRIES', 256))
+app.config['CONTENT_CACHE_DIR'] = os.getenv('CONTENT_CACHE_DIR', '')
+app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 512))
+app.config['NOTIFICATIONS_PAGE_SIZE'] = int(os.getenv('NOTIFICATIONS_PAGE_SIZE', 10))
+app.config['HOMEPAGE_NOTIFICATIONS'] = int(os.getenv('HOMEPAGE_NOTIFICATIONS', 5))
+app.config['BILL_STORAGE_DIR'] = os.getenv('BILL_STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bills'))
+app.config['BILL_PDF_ENGINE'] = os.getenv('BILL_PDF_ENGINE', 'auto')  # 'wkhtmltopdf', 'native' or 'auto'
+app.config['BILL_RENDER_WORKERS'] = int(os.getenv('BILL_RENDER_WORKERS', 2))
+app.config['BILL_RENDER_QUEUE_SIZE'] = int(os.getenv('BILL_RENDER_QUEUE_SIZE', 32))
+app.config['BILL_RENDER_WAIT'] = float(os.getenv('BILL_RENDER_WAIT', 2))  # seconds generate_bill waits for a PDF
+app.config['TARIFF_FILE'] = os.getenv('TARIFF_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tariffs.json'))
+app.config['TARIFF_BATCH_LIMIT'] = int(os.getenv('TARIFF_BATCH_LIMIT', 10000))
+app.config['PAYMENT_BATCH_SIZE'] = int(os.getenv('PAYMENT_BATCH_SIZE', 32))
+app.config['PAYMENT_BATCH_DELAY_MS'] = float(os.getenv('PAYMENT_BATCH_DELAY_MS', 0))
+app.config['BOOKING_HOLD_MINUTES'] = float(os.getenv('BOOKING_HOLD_MINUTES', 15))  # unpaid bookings are released after this
+app.config['SLOT_RELEASE_BATCH_SIZE'] = int(os.getenv('SLOT_RELEASE_BATCH_SIZE', 500))
+app.config['SLOT_RELEASE_SWEEP_SECONDS'] = float(os.getenv('SLOT_RELEASE_SWEEP_SECONDS', 60))
+app.config['BOOKING_STRATEGY'] = os.getenv('BOOKING_STRATEGY', 'auto')  # 'skip_locked', 'allocator' or 'auto'
+app.config['BOOKING_MAX_ATTEMPTS'] = int(os.getenv('BOOKING_MAX_ATTEMPTS', 5))
+app.config['SLOT_EVENTS_COALESCE_MS'] = float(os.getenv('SLOT_EVENTS_COALESCE_MS', 250))
+app.config['SLOT_EVENTS_MAX_SUBSCRIBERS'] = int(os.getenv('SLOT_EVENTS_MAX_SUBSCRIBERS', 1000))
+app.config['OCCUPANCY_RETENTION_DAYS'] = float(os.getenv('OCCUPANCY_RETENTION_DAYS', 365))  # ~2.2 MB per location-year
+app.config['OCCUPANCY_FLUSH_SECONDS'] = float(os.getenv('OCCUPANCY_FLUSH_SECONDS', 1))
+app.config['OCCUPANCY_FORECAST_DAYS'] = int(os.getenv('OCCUPANCY_FORECAST_DAYS', 28))
+app.config['LOCATION_MAX_PROVISION'] = int(os.getenv('LOCATION_MAX_PROVISION', 100000))  # slots per request
+app.config['ASGI_WSGI_THREADS'] = int(os.getenv('ASGI_WSGI_THREADS', 8))  # threads for the routes asgi.py does not serve natively
+app.config['ASYNC_POOL_MAX_SIZE'] = int(os.getenv('ASYNC_POOL_MAX_SIZE', 20))
+app.config['HEALTH_CHECK_TIMEOUT'] = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))  # seconds /readyz waits for a pooled connection
+app.config['SLOW_REQUEST_MS'] = float(os.getenv('SLOW_REQUEST_MS', 500))  # requests this slow are logged with their breakdown
+app.config['PROFILE_ENDPOINTS'] = os.getenv('PROFILE_ENDPOINTS', '')  # e.g. 'admin_dashboard,generate_bill', '*' for all; empty: off
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+app.config['STATS_TOKEN'] = os.getenv('STATS_TOKEN', '')  # bearer token for /metrics and the *_stats endpoints; empty: admins only
+app.config['QUERY_REPEAT_THRESHOLD'] = int(os.getenv('QUERY_REPEAT_THRESHOLD', 2))  # same statement this often in one request is flagged
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'static/uploads')
 app.config['ALLOWED_EXTENSIONS'] = set(os.getenv('ALLOWED_EXTENSIONS', 'png,jpg,jpeg,gif').split(','))
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5 MB
 app.secret_key = os.getenv('SECRET_KEY', 'f894cb67a8c0b040dc8243b0864a320f')
 
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-mysql = MySQL(app)
-logging.basicConfig(level=logging.DEBUG)
-
 # -------------------------
 # Decorators
 # -------------------------
@@ -42,53 +104,262 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_func
 
+def stats_required(f):
+    """Operational endpoints (/metrics, *_stats): signed-in admins, or a scraper
+    sending Authorization: Bearer <STATS_TOKEN>."""
+    @wraps(f)
+    def decorated_func(*args, **kwargs):
+        token = app.config['STATS_TOKEN']
+        bearer = request.headers.get('Authorization', '')
+        if not session.get('is_admin') and not (token and hmac.compare_digest(bearer.encode(), f'Bearer {token}'.encode())):
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated_func
+
 # -------------------------
 # Helper functions
 # -------------------------
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def get_cursor():
-    try:
-        cur = mysql.connection.cursor()
-        return cur
-    except Exception as e:
-        logging.error(f"DB connection error in get_cursor: {e}")
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    db_backend.connect,
+                    ping=db_backend.ping,
+                    min_size=app.config['MYSQL_POOL_MIN_SIZE'],
+                    max_size=app.config['MYSQL_POOL_MAX_SIZE'],
+                    timeout=app.config['MYSQL_POOL_TIMEOUT'],
+                    max_lifetime=app.config['MYSQL_POOL_MAX_LIFETIME'],
+                    name=db_backend.name,
+                )
+                if db_backend.name == 'sqlite':
+                    pooled = _pool.acquire()
+                    try:
+                        db_backend.init_schema(pooled.raw)
+                    finally:
+                        _pool.release(pooled)
+    return _pool
+
+def get_db():
+    """Connection borrowed from the pool for the current app context."""
+    if 'db_conn' not in g:
+        g.db_conn = get_pool().acquire()
+    return g.db_conn.raw
+
+@app.teardown_appcontext
+def release_db(exc):
+    pooled = g.pop('db_conn', None)
+    if pooled is not None:
+        get_pool().release(pooled, broken=isinstance(exc, db_backend.OperationalError))
+
+def content_last_modified(tables):
+    return [content_cache.get_or_load(f'updated_at:{table}', lambda table=table: store.max_updated_at(table))
+            for table in tables]
+
+def invalidate_content(key, table):
+    """Drop a cached content list, the version stamp of its table and the pages built from it."""
+    content_cache.invalidate(key, f'updated_at:{table}')
+    page_cache.invalidate(table)
+
+def create_bill_renderer(config):
+    wkhtmltopdf = find_wkhtmltopdf()
+    engine = config['BILL_PDF_ENGINE']
+    if engine == 'auto':
+        engine = 'wkhtmltopdf' if wkhtmltopdf else 'native'
+    return BillRenderer(
+        config['BILL_STORAGE_DIR'],
+        engine=engine,
+        workers=config['BILL_RENDER_WORKERS'],
+        max_pending=config['BILL_RENDER_QUEUE_SIZE'],
+        wkhtmltopdf=wkhtmltopdf,
+    )
+
+def slot_snapshot(location):
+    """Availability of one location as served by /api/slots and the live event stream."""
+    return {
+        'counts': slot_index.counts(location),
+        'slots': [
+            {'id': slot_id, 'slot_number': number, 'status': status}
+            for slot_id, _, number, status in slot_index.slots(location)
+        ],
+    }
+
+def _load_slot_rows():
+    with app.app_context():
+        return store.list_all_slots()
+
+def get_slot_index():
+    """Availability index, built from the DB on first use and reconciled on a timer."""
+    if not slot_index.loaded:
+        with _slot_index_lock:
+            if not slot_index.loaded:
+                slot_index.rebuild(store.list_all_slots())
+                slot_index.start_reconciler(_load_slot_rows, app.config['SLOT_INDEX_RECONCILE_SECONDS'])
+                slot_release.start(store.reserved_slots)
+                occupancy_recorder.start(slot_index.locations())
+    return slot_index
+
+def reload_slot_index():
+    """Rebuild the index right away (e.g. after slots were provisioned) instead of
+    waiting for the reconciler."""
+    get_slot_index()
+    with _slot_index_lock:
+        slot_index.rebuild(store.list_all_slots())
+
+def find_location(name):
+    """Stored name of a location, matched case-insensitively ('Mall' finds 'mall'), or None."""
+    known = get_slot_index().locations()
+    if name in known:
+        return name
+    return next((location for location in known if location.lower() == name.lower()), None)
+
+def _slots_released(slot_ids):
+    for slot_id in slot_ids:
+        slot_index.set_status(slot_id, 'available')
+
+def booking_now():
+    """Current time at the precision reserved_until is stored with."""
+    return datetime.datetime.now().replace(microsecond=0)
+
+def hold_until():
+    """Expiry of a fresh, not yet paid booking."""
+    return (booking_now() + datetime.timedelta(minutes=app.config['BOOKING_HOLD_MINUTES'])).replace(microsecond=0)
+
+def create_booking_engine(config):
+    strategy = config['BOOKING_STRATEGY']
+    if strategy == 'auto':
+        # SKIP LOCKED needs MySQL 8.0+; set BOOKING_STRATEGY=allocator on older servers
+        strategy = 'skip_locked' if db_backend.name == 'mysql' else 'allocator'
+    return BookingEngine(db_backend, get_pool, get_slot_index, strategy=strategy,
+                         max_attempts=config['BOOKING_MAX_ATTEMPTS'])
+
+def create_profiler(config):
+    endpoints = [e.strip() for e in config['PROFILE_ENDPOINTS'].split(',') if e.strip()]
+    if not endpoints:
         return None
+    return SlowRequestProfiler(config['PROFILE_DIR'], threshold_ms=config['SLOW_REQUEST_MS'],
+                               endpoints=None if endpoints == ['*'] else endpoints)
+
+def init_components(config):
+    """Build every component from config. Nothing here connects to the database
+    or starts a thread: the pool opens on first use and the background threads
+    start with the slot index, so the module is safe to import in a pre-fork
+    master (gunicorn --preload) and each worker starts clean."""
+    global db_backend, _pool, _pool_lock, store, content_cache, bill_renderer, tariffs, payment_ingestor
+    global slot_index, _slot_index_lock, slot_events, occupancy_series, occupancy_recorder, slot_release
+    global booking_engine
+    db_backend = instruments.wrap_backend(create_backend(config))
+    _pool = None  # never closed here: after a fork its connections belong to the parent
+    _pool_lock = threading.Lock()
+    store = DataStore(db_backend, get_db)
+    content_cache = create_content_cache(config)
+    page_cache.reset(max_entries=config['PAGE_CACHE_MAX_ENTRIES'])
+    bill_renderer = create_bill_renderer(config)
+    instruments.reset(slow_ms=config['SLOW_REQUEST_MS'], profiler=create_profiler(config))
+    query_log.reset(repeat_threshold=config['QUERY_REPEAT_THRESHOLD'])
+
+    # Rate tables are compiled once; restart (or redeploy) to pick up tariff changes
+    tariffs = TariffTable.from_file(config['TARIFF_FILE'])
+
+    payment_ingestor = PaymentIngestor(db_backend, get_pool, max_batch=config['PAYMENT_BATCH_SIZE'],
+                                       max_delay=config['PAYMENT_BATCH_DELAY_MS'] / 1000)
+
+    slot_index = SlotIndex()
+    _slot_index_lock = threading.Lock()
+
+    # Live availability: every index change is pushed to /api/slots/<location>/events subscribers
+    slot_events = SlotEventHub(slot_snapshot, coalesce=config['SLOT_EVENTS_COALESCE_MS'] / 1000,
+                               max_subscribers=config['SLOT_EVENTS_MAX_SUBSCRIBERS'])
+    slot_index.add_listener(slot_events.publish)
+
+    # Occupancy history: every index change is logged and folded into per-minute rollups
+    occupancy_series = occupancy.OccupancySeries(retention_days=config['OCCUPANCY_RETENTION_DAYS'])
+    occupancy_recorder = occupancy.OccupancyRecorder(db_backend, get_pool, occupancy_series, slot_index.counts,
+                                                     flush_interval=config['OCCUPANCY_FLUSH_SECONDS'])
+    slot_index.add_listener(occupancy_recorder.on_change)
+
+    # Expired reservations are released by a background thread, started with the slot index
+    slot_release = SlotReleaseScheduler(db_backend, get_pool, on_release=_slots_released,
+                                        max_batch=config['SLOT_RELEASE_BATCH_SIZE'],
+                                        sweep_interval=config['SLOT_RELEASE_SWEEP_SECONDS'])
+
+    booking_engine = create_booking_engine(config)
+
+def create_app(config=None):
+    """Configure the app and (re)build its components; config overrides the
+    environment defaults above. Call it before serving: background threads
+    already started keep the components they were started with. For app
+    servers that take a factory: gunicorn 'app:create_app()'."""
+    if config:
+        app.config.update(config)
+    if _pool is not None:
+        _pool.close()
+    init_components(app.config)
+    return app
 
-def test_db_connection():
-    cur = get_cursor()
-    if not cur:
-        return False
+def ping_database(timeout=None):
+    """Check a pooled connection out and ping it; raises if the database is unreachable."""
+    pool = get_pool()
+    pooled = pool.acquire(timeout=timeout)
+    broken = True
     try:
-        cur.execute("SELECT 1")
-        cur.close()
-        return True
-    except Exception as e:
-        logging.error(f"Database connection failed during test query: {e}")
-        return False
+        db_backend.ping(pooled.raw)
+        broken = False
+    finally:
+        pool.release(pooled, broken=broken)
 
-if not test_db_connection():
-    logging.error("Failed to connect to database. Please check your MySQL configuration.")
-    print("❌ Database connection failed!")
-    print("Please ensure:\n1. MySQL server is running\n2. Database 'parking_system1' exists\n3. User credentials are correct\n4. Run: mysql -u root -p < database_setup.sql")
-else:
-    print("✅ Database connection successful!")
+# Per-route wall/DB/template time and bytes for /metrics; init_components() configures it
+instruments = Instrumentation()
+# Statements per request by fingerprint, for /query_stats: repeated queries and schema probes
+query_log = QueryLog()
+instruments.add_query_listener(query_log.on_query)
+instruments.add_request_listener(query_log.on_request)
+# Pages cached by the route decorators below; init_components() resizes it
+page_cache = PageCache(content_last_modified, os.path.join(app.root_path, app.template_folder),
+                       max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'])
+init_components(app.config)
+# Threads and sockets do not survive a fork: workers forked from a master
+# that already used the app rebuild everything instead of sharing it
+os.register_at_fork(after_in_child=lambda: init_components(app.config))
+
+# -------------------------
+# Instrumentation
+# -------------------------
+app.wsgi_app = instruments.middleware(app.wsgi_app)
+
+@app.before_request
+def instrument_request():
+    instruments.route_matched(request.endpoint)
+
+def _template_started(sender, template, context, **extra):
+    instruments.template_started()
+
+def _template_finished(sender, template, context, **extra):
+    instruments.template_finished()
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
 
 # -------------------------
 # Routes
 # -------------------------
+def latest_notifications():
+    """First page of the notifications feed, shared by the homepage and /notification."""
+    return content_cache.get_or_load(
+        'notifications:latest', lambda: store.notifications_feed(limit=app.config['NOTIFICATIONS_PAGE_SIZE'])
+    )
+
 @app.route('/')
+@page_cache.page('users', 'notifications')
 def index():
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database cursor not available")
-        cur.execute("SELECT COUNT(*) FROM users")
-        user_count = cur.fetchone()[0] or 0
-        cur.execute("SELECT title, message, created_at FROM notifications ORDER BY created_at DESC")
-        notifications = cur.fetchall()
-        cur.close()
+        user_count = content_cache.get_or_load('user_count', store.count_users)
+        notifications, _ = latest_notifications()
+        notifications = notifications[:app.config['HOMEPAGE_NOTIFICATIONS']]
     except Exception as e:
         logging.error(f"Error fetching data for index: {e}")
         user_count = 0
@@ -96,18 +367,85 @@ def index():
     return render_template('index.html', user_count=user_count, notifications=notifications)
 
 @app.route('/notification')
+@page_cache.page('notifications')
 def notification():
+    after = request.args.get('after')
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database cursor not available")
-        cur.execute("SELECT title, message, created_at FROM notifications ORDER BY created_at DESC")
-        notifications = cur.fetchall()
-        cur.close()
+        if after:
+            notifications, next_cursor = store.notifications_feed(
+                after=decode_cursor(after), limit=app.config['NOTIFICATIONS_PAGE_SIZE']
+            )
+        else:
+            notifications, next_cursor = latest_notifications()
+    except ValueError:
+        return redirect(url_for('notification'))
     except Exception as e:
         logging.error(f"Error fetching notifications: {e}")
-        notifications = []
-    return render_template('notifications.html', notifications=notifications)
+        notifications, next_cursor = [], None
+    return render_template('notifications.html', notifications=notifications,
+                           next_cursor=encode_cursor(next_cursor) if next_cursor else None,
+                           is_first_page=not after)
+
+@app.route('/api/notifications')
+def notifications_api():
+    """Active notifications, newest first: ?limit=&after=<cursor>"""
+    after = request.args.get('after')
+    try:
+        limit = int(request.args.get('limit', app.config['NOTIFICATIONS_PAGE_SIZE']))
+        if after:
+            rows, next_cursor = store.notifications_feed(after=decode_cursor(after), limit=limit)
+        elif limit == app.config['NOTIFICATIONS_PAGE_SIZE']:
+            rows, next_cursor = latest_notifications()
+        else:
+            rows, next_cursor = store.notifications_feed(limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error paginating notifications: {e}")
+        return jsonify({'error': 'Database error'}), 500
+    columns = PAGINATED_TABLES['notifications']['columns']
+    return jsonify({
+        'notifications': [dict(zip(columns, row)) for row in rows],
+        'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+    }), 200
+
+@app.route('/pool_stats')
+@stats_required
+def pool_stats():
+    return jsonify(get_pool().stats()), 200
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests. Never touches the database."""
+    return jsonify({'status': 'ok'}), 200
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: a pooled connection answers a ping and the slot index is loaded.
+    The first probe loads the index, so real traffic never waits for it."""
+    try:
+        ping_database(timeout=app.config['HEALTH_CHECK_TIMEOUT'])
+        get_slot_index()
+    except Exception as e:
+        logging.warning(f"Readiness check failed: {e}")
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ready', 'backend': db_backend.name}), 200
+
+@app.route('/metrics')
+@stats_required
+def metrics():
+    """Per-route request metrics in the Prometheus text format."""
+    return app.response_class(instruments.prometheus(), mimetype='text/plain; version=0.0.4'), 200
+
+@app.route('/query_stats')
+@stats_required
+def query_stats():
+    return jsonify(query_log.report()), 200
+
+@app.route('/cache_stats')
+@stats_required
+def cache_stats():
+    return jsonify(dict(content_cache.stats(), pages=page_cache.stats())), 200
 
 # ----------------- Admin -----------------
 @app.route('/admin_register', methods=['GET', 'POST'])
@@ -127,19 +465,11 @@ def admin_register():
 
         hashed_password = generate_password_hash(password)
         try:
-            cur = get_cursor()
-            if not cur:
-                raise Exception("Database not available")
-            cur.execute(
-                'INSERT INTO admins (username, email, password) VALUES (%s, %s, %s)',
-                (username, email, hashed_password)
-            )
-            mysql.connection.commit()
-            cur.close()
+            store.create_admin(username, email, hashed_password)
             flash('Admin registration successful!', 'success')
             return redirect(url_for('admin_login'))
-        except MySQLdb.Error as e:
-            logging.error(f"MySQL Error during admin_register: {e}")
+        except db_backend.Error as e:
+            logging.error(f"Database error during admin_register: {e}")
             flash('An error occurred during registration. Maybe email/username already exists.', 'danger')
         except Exception as e:
             logging.error(f"Error during admin registration: {e}")
@@ -152,12 +482,7 @@ def admin_login():
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '')
         try:
-            cur = get_cursor()
-            if not cur:
-                raise Exception("Database not available")
-            cur.execute("SELECT id, username, email, password FROM admins WHERE email = %s", (email,))
-            admin_user = cur.fetchone()
-            cur.close()
+            admin_user = store.get_admin_by_email(email)
             if admin_user is None or not check_password_hash(admin_user[3], password):
                 flash('Invalid email or password.', 'danger')
                 return redirect(url_for('admin_login'))
@@ -176,29 +501,166 @@ def admin_login():
 @app.route('/admin_dashboard')
 @admin_required
 def admin_dashboard():
+    page_size = app.config['ADMIN_DASHBOARD_PAGE_SIZE']
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("SELECT id, username, email, phone, created_at FROM users")
-        users = cur.fetchall()
-        cur.execute("SELECT id, location, slot_number, status, user_id FROM ParkingSlot")
-        slots = cur.fetchall()
-        cur.execute("SELECT id, user_id, plot_no, vehicle_no, vehicle_type, hours, amount, payment_type, payment_status, created_at FROM payments")
-        payments = cur.fetchall()
-        cur.execute("SELECT SUM(amount) FROM payments")
-        total_sum = cur.fetchone()[0]
-        total_amount = float(total_sum) if total_sum is not None else 0.0
-        cur.close()
+        users, _ = store.page('users', limit=page_size)
+        slots, _ = store.page('slots', sort='id', descending=False, limit=page_size)
+        payments, _ = store.page('payments', limit=page_size)
+        summary = store.dashboard_summary()
     except Exception as e:
         logging.error(f"Error fetching admin data: {e}")
-        users, slots, payments, total_amount = [], [], [], 0
+        users, slots, payments = [], [], []
+        summary = {'user_count': 0, 'slot_count': 0, 'payment_count': 0, 'total_amount': 0}
     return render_template('admin_dashboard.html',
         admin_username=session.get('admin_username'),
         users=users, slots=slots, payments=payments,
-        total_amount=total_amount
+        total_amount=summary['total_amount'], summary=summary
     )
 
+@app.route('/admin/api/<table>')
+@admin_required
+def admin_table_api(table):
+    """Keyset-paginated rows: ?sort=&order=asc|desc&limit=&after=<cursor>&<filter>="""
+    if table not in PAGINATED_TABLES:
+        return jsonify({'error': f"Unknown table '{table}'"}), 404
+    args = request.args.to_dict()
+    sort = args.pop('sort', 'id')
+    descending = args.pop('order', 'desc').lower() != 'asc'
+    limit = args.pop('limit', 20)
+    after = args.pop('after', None)
+    try:
+        rows, next_cursor = store.page(
+            table, sort=sort, descending=descending, limit=int(limit),
+            after=decode_cursor(after) if after else None, filters=args
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error paginating {table}: {e}")
+        return jsonify({'error': 'Database error'}), 500
+    columns = PAGINATED_TABLES[table]['columns']
+    return jsonify({
+        'rows': [dict(zip(columns, row)) for row in rows],
+        'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+    }), 200
+
+@app.route('/admin/api/revenue')
+@admin_required
+def admin_revenue_api():
+    """Revenue from the rollup table: ?from=YYYY-MM-DD&to=YYYY-MM-DD&group_by=day,location"""
+    group_by = [key for key in request.args.get('group_by', 'day').split(',') if key]
+    try:
+        rows = store.revenue_report(request.args.get('from'), request.args.get('to'), group_by)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error building revenue report: {e}")
+        return jsonify({'error': 'Database error'}), 500
+    return jsonify({
+        'group_by': group_by,
+        'rows': rows,
+        'payment_count': sum(row['payment_count'] for row in rows),
+        'total_amount': round(sum(row['total_amount'] for row in rows), 2),
+    }), 200
+
+@app.route('/admin/export/<table>')
+@admin_required
+def export_table(table):
+    """Stream a table in id order: ?format=csv|parquet&start_id=&end_id= (inclusive)"""
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': f"Unknown table '{table}'"}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in data_export.FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'"}), 400
+    if fmt == 'parquet' and not data_export.parquet_available():
+        return jsonify({'error': 'Parquet export needs pyarrow installed on the server'}), 501
+    try:
+        start_id = request.args.get('start_id', type=int)
+        end_id = request.args.get('end_id', type=int)
+        chunks = store.iter_export(table, start_id, end_id)
+        first = next(chunks, None)  # iter_export is lazy: run the first query here so its errors are a 500
+    except Exception as e:
+        logging.error(f"Error exporting {table}: {e}")
+        return jsonify({'error': 'Database error'}), 500
+    if first is not None:
+        chunks = itertools.chain([first], chunks)
+    progress = {}
+    stream = data_export.fail_loudly(
+        table, data_export.export_stream(table, data_export.tracked(chunks, progress), fmt), fmt, progress
+    )
+    response = app.response_class(stream_with_context(stream), mimetype=data_export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={table}.{fmt}'
+    return response
+
+@app.route('/admin/api/locations', methods=['GET', 'POST'])
+@admin_required
+def admin_locations_api():
+    """GET: every location. POST: create one with its slots, e.g.
+    {"name": "airport", "levels": 4, "slots_per_level": 2500} (layout forms in locations.py)."""
+    if request.method == 'GET':
+        try:
+            rows = store.list_locations()
+        except Exception as e:
+            logging.error(f"Error listing locations: {e}")
+            return jsonify({'error': 'Database error'}), 500
+        return jsonify({'locations': [
+            {'id': row[0], 'name': row[1], 'capacity': row[2], 'levels': row[3], 'created_at': row[4]}
+            for row in rows
+        ]}), 200
+
+    spec = request.get_json(silent=True) or {}
+    try:
+        name = locations.location_name(spec.get('name'))
+        layout = locations.parse_layout(spec, app.config['LOCATION_MAX_PROVISION'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        location_id, first, last = store.create_location(name, layout)
+        reload_slot_index()
+    except db_backend.IntegrityError:
+        return jsonify({'error': f"Location '{name}' already exists"}), 409
+    except Exception as e:
+        logging.error(f"Error creating location '{name}': {e}")
+        return jsonify({'error': 'Database error'}), 500
+    return jsonify({'id': location_id, 'name': name, 'slots_created': last - first + 1,
+                    'first_slot_number': first, 'last_slot_number': last}), 201
+
+@app.route('/admin/api/locations/<name>/slots', methods=['GET', 'POST'])
+@admin_required
+def admin_location_slots_api(name):
+    """GET: slot counts by level, type and status. POST: add slots after the
+    highest existing slot_number, same layout forms as creating a location."""
+    if request.method == 'GET':
+        try:
+            rows = store.location_layout(name)
+        except Exception as e:
+            logging.error(f"Error fetching layout of '{name}': {e}")
+            return jsonify({'error': 'Database error'}), 500
+        if not rows:
+            return jsonify({'error': f"Unknown location '{name}'"}), 404
+        return jsonify({'name': name, 'layout': [
+            {'level': level, 'slot_type': slot_type, 'status': status, 'count': count}
+            for level, slot_type, status, count in rows
+        ]}), 200
+
+    try:
+        layout = locations.parse_layout(request.get_json(silent=True) or {}, app.config['LOCATION_MAX_PROVISION'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        numbers = store.provision_slots(name, layout)
+        if numbers is None:
+            return jsonify({'error': f"Unknown location '{name}'"}), 404
+        reload_slot_index()
+    except db_backend.IntegrityError:
+        return jsonify({'error': f"Slots for '{name}' are being added by another request, try again"}), 409
+    except Exception as e:
+        logging.error(f"Error provisioning slots for '{name}': {e}")
+        return jsonify({'error': 'Database error'}), 500
+    first, last = numbers
+    return jsonify({'name': name, 'slots_created': last - first + 1,
+                    'first_slot_number': first, 'last_slot_number': last}), 201
+
 @app.route('/admin_add_features', methods=['GET', 'POST'])
 @admin_required
 def admin_add_features():
@@ -207,13 +669,8 @@ def admin_add_features():
         description = request.form.get('content', '').strip()
         icon = request.form.get('icon', '🚗')
         try:
-            cur = get_cursor()
-            if not cur:
-                raise Exception("Database not available")
-            cur.execute("INSERT INTO features (title, description, icon) VALUES (%s, %s, %s)",
-                        (title, description, icon))
-            mysql.connection.commit()
-            cur.close()
+            store.add_feature(title, description, icon)
+            invalidate_content('features', 'features')
             flash('Feature content added successfully!', 'success')
         except Exception as e:
             logging.error(f"Error adding feature content: {e}")
@@ -228,13 +685,8 @@ def admin_add_guidelines():
         content = request.form.get('content', '').strip()
         category = request.form.get('category', 'general').strip()
         try:
-            cur = get_cursor()
-            if not cur:
-                raise Exception("Database not available")
-            cur.execute("INSERT INTO guidelines (title, content, category) VALUES (%s, %s, %s)",
-                        (title, content, category))
-            mysql.connection.commit()
-            cur.close()
+            store.add_guideline(title, content, category)
+            invalidate_content('guidelines', 'guidelines')
             flash('Guideline content added successfully!', 'success')
         except Exception as e:
             logging.error(f"Error adding guideline content: {e}")
@@ -262,26 +714,19 @@ def register():
             avatar_file = request.files['avatarUpload']
             if avatar_file and allowed_file(avatar_file.filename):
                 filename = secure_filename(avatar_file.filename)
+                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
                 avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 avatar_file.save(avatar_path)
                 avatar = filename
         try:
-            cur = get_cursor()
-            if not cur:
-                raise Exception("Database not available")
-            cur.execute(
-                'INSERT INTO users (username, email, password, phone, profile_picture) VALUES (%s, %s, %s, %s, %s)',
-                (username, email, hashed_password, phone, avatar)
-            )
-            mysql.connection.commit()
-            user_id = cur.lastrowid
-            cur.close()
+            user_id = store.create_user(username, email, hashed_password, phone, avatar)
+            invalidate_content('user_count', 'users')
             flash('Registration successful!', 'success')
             session['user_id'] = user_id
             session['username'] = username
             return redirect(url_for('webpage'))
-        except MySQLdb.Error as e:
-            logging.error(f"MySQL Error during registration: {e}")
+        except db_backend.Error as e:
+            logging.error(f"Database error during registration: {e}")
             flash('Registration failed: Email or username might already exist.', 'danger')
         except Exception as e:
             logging.error(f"Error during registration: {e}")
@@ -294,17 +739,7 @@ def login():
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '')
         try:
-            cur = get_cursor()
-            if not cur:
-                raise Exception("Database connection or cursor not available")
-            cur.execute("SHOW TABLES LIKE 'users'")
-            if not cur.fetchone():
-                logging.error("Table 'users' does not exist in database.")
-                flash("Database table 'users' is missing.", 'danger')
-                return redirect(url_for('login'))
-            cur.execute("SELECT id, username, email, password FROM users WHERE email = %s", (email,))
-            user = cur.fetchone()
-            cur.close()
+            user = store.get_user_by_email(email)
             if user is None or not check_password_hash(user[3], password):
                 flash('Invalid email or password.', 'danger')
                 return redirect(url_for('login'))
@@ -314,9 +749,9 @@ def login():
             flash('Login successful!', 'success')
             logging.info(f"User {user[1]} logged in successfully.")
             return redirect(url_for('webpage'))
-        except MySQLdb.Error as e:
-            logging.error(f"MySQL Error during login: {e}")
-            flash(f"MySQL error: {e}", 'danger')
+        except db_backend.Error as e:
+            logging.error(f"Database error during login: {e}")
+            flash(f"Database error: {e}", 'danger')
         except Exception as e:
             logging.error(f"Login error: {e}")
             flash(f"Error: {e}", 'danger')
@@ -331,34 +766,27 @@ def webpage():
     return render_template('webpage.html', username=session.get('username'))
 
 @app.route('/features')
+@page_cache.page('features')
 def features():
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("SELECT title, description, icon FROM features WHERE is_active = TRUE")
-        features_content = cur.fetchall()
-        cur.close()
+        features_content = content_cache.get_or_load('features', store.list_features)
     except Exception as e:
         logging.error(f"Error fetching features content: {e}")
         features_content = []
     return render_template('features.html', features_content=features_content)
 
 @app.route('/guidelines')
+@page_cache.page('guidelines')
 def guidelines():
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("SELECT title, content, category FROM guidelines WHERE is_active = TRUE")
-        guidelines_content = cur.fetchall()
-        cur.close()
+        guidelines_content = content_cache.get_or_load('guidelines', store.list_guidelines)
     except Exception as e:
         logging.error(f"Error fetching guidelines content: {e}")
         guidelines_content = []
     return render_template('guidelines.html', guidelines_content=guidelines_content)
 
 @app.route('/contact')
+@page_cache.page()
 def contact():
     return render_template('contact.html')
 
@@ -369,14 +797,17 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/pricing1')
+@page_cache.page()
 def pricing1():
     return render_template('pricing1.html')
 
 @app.route('/pricing2')
+@page_cache.page()
 def pricing2():
     return render_template('pricing2.html')
 
 @app.route('/pricing')
+@page_cache.page()
 def pricing():
     return render_template('pricing.html')
 
@@ -386,17 +817,12 @@ def slots(location):
         flash('Please log in to access this page.', 'danger')
         return redirect(url_for('login'))
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("SELECT id, location, slot_number, status FROM ParkingSlot WHERE location = %s", (location,))
-        slots = cur.fetchall()
-        cur.close()
-        slots = list(slots)
-        if len(slots) < 20:
-            for i in range(len(slots), 20):
-                slots.append((None, location, i + 1, 'available'))
-        return render_template('slots.html', location=location, slots=slots)
+        name = find_location(location)
+        if name is None:
+            flash(f"Unknown parking location '{location}'.", 'danger')
+            return redirect(url_for('index'))
+        return render_template('slots.html', location=name, slots=get_slot_index().slots(name),
+                               rates=tariffs.rates_for(name, datetime.datetime.now().hour))
     except Exception as e:
         logging.error(f"Error fetching slots for location '{location}': {e}")
         flash('An error occurred while fetching slots. Please try again.', 'danger')
@@ -411,39 +837,244 @@ def book_slot():
     slot_number = request.form.get('slot_number')
     location = request.form.get('location')
     user_id = session.get('user_id')
-    if not slot_number or not location:
+    if not slot_id or not slot_number or not location:
         flash('Missing slot information.', 'danger')
         return redirect(url_for('index'))
     try:
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("""
-            UPDATE ParkingSlot
-            SET status = 'booked', user_id = %s, slot_number = %s
-            WHERE id = %s AND location = %s AND status = 'available'
-        """, (user_id, slot_number, slot_id, location))
-        mysql.connection.commit()
-        if cur.rowcount == 0:
+        index = get_slot_index()
+        until = hold_until()
+        if not store.book_slot(slot_id, location, slot_number, user_id, reserved_until=until):
             flash('Slot is already booked or unavailable.', 'danger')
-            cur.close()
             return redirect(url_for('slots', location=location))
         else:
+            index.set_status(int(slot_id), 'booked')
+            slot_booked(int(slot_id), location, until)
             flash('Slot booked successfully!', 'success')
-            cur.close()
             return redirect(url_for('payment', slotNumber=slot_number))
     except Exception as e:
         logging.error(f"Error booking slot: {e}")
         flash('An error occurred while booking the slot. Please try again.', 'danger')
         return redirect(url_for('slots', location=location))
 
+def slot_booked(slot_id, location, until):
+    """Remember the booking for the payment step and schedule its release."""
+    slot_release.schedule(slot_id, until)
+    session['booked_location'] = location
+    session['booked_slot_id'] = slot_id
+
+@app.route('/book_any', methods=['POST'])
+def book_any():
+    """Book whichever slot is free at a location, retrying instead of failing on a lost race."""
+    if 'user_id' not in session:
+        flash('Please log in to book a slot.', 'danger')
+        return redirect(url_for('login'))
+    location = request.form.get('location')
+    if not location:
+        flash('Missing slot information.', 'danger')
+        return redirect(url_for('index'))
+    try:
+        until = hold_until()
+        slot = booking_engine.book_any(location, session['user_id'], reserved_until=until)
+        if slot is None:
+            flash('No slots are available at this location right now.', 'danger')
+            return redirect(url_for('slots', location=location))
+        slot_booked(slot[0], location, until)
+        flash(f'Slot {slot[1]} booked successfully!', 'success')
+        return redirect(url_for('payment', slotNumber=slot[1]))
+    except BookingContention as e:
+        logging.warning(f"Booking gave up: {e}")
+        flash('Booking is very busy right now, please try again.', 'danger')
+        return redirect(url_for('slots', location=location))
+    except Exception as e:
+        logging.error(f"Error booking a slot at '{location}': {e}")
+        flash('An error occurred while booking the slot. Please try again.', 'danger')
+        return redirect(url_for('slots', location=location))
+
+@app.route('/api/bookings', methods=['POST'])
+def create_booking():
+    """{"location": ...} -> 201 {slot_id, slot_number, reserved_until}; 409 when sold out."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    location = (request.get_json(silent=True) or {}).get('location') or request.form.get('location')
+    if not location:
+        return jsonify({'error': 'location is required'}), 400
+    try:
+        until = hold_until()
+        slot = booking_engine.book_any(location, session['user_id'], reserved_until=until)
+    except BookingContention as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception as e:
+        logging.error(f"Error booking a slot at '{location}': {e}")
+        return jsonify({'error': 'Database error'}), 500
+    if slot is None:
+        return jsonify({'error': 'No slots available', 'location': location}), 409
+    slot_booked(slot[0], location, until)
+    return jsonify({'slot_id': slot[0], 'slot_number': slot[1], 'location': location,
+                    'reserved_until': until.isoformat()}), 201
+
+@app.route('/booking_stats')
+@stats_required
+def booking_stats():
+    return jsonify(booking_engine.stats()), 200
+
+@app.route('/api/slots/<location>')
+def slots_api(location):
+    try:
+        get_slot_index()
+    except Exception as e:
+        logging.error(f"Error loading slot index: {e}")
+        return jsonify({'error': 'Slot availability is temporarily unavailable'}), 503
+    return jsonify(dict(slot_snapshot(location), location=location)), 200
+
+@app.route('/api/slots/<location>/events')
+def slot_event_stream(location):
+    """Server-Sent Events: a snapshot, then coalesced status deltas as slots change."""
+    try:
+        if location not in get_slot_index().locations():
+            return jsonify({'error': f"Unknown location '{location}'"}), 404
+        stream = slot_events.stream(location, request.headers.get('Last-Event-ID'))
+    except TooManySubscribers as e:
+        logging.warning(f"Refusing slot event subscriber: {e}")
+        response = jsonify({'error': 'Too many live subscribers, poll /api/slots instead'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except Exception as e:
+        logging.error(f"Error opening slot event stream: {e}")
+        return jsonify({'error': 'Slot availability is temporarily unavailable'}), 503
+    response = app.response_class(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass events through immediately
+    return response
+
+@app.route('/api/v1/availability')
+def availability_summary():
+    """{location: {epoch, version, available, total}} for every location, from memory."""
+    try:
+        index = get_slot_index()
+    except Exception as e:
+        logging.error(f"Error loading slot index: {e}")
+        return jsonify({'error': 'Slot availability is temporarily unavailable'}), 503
+    return jsonify({
+        location: {'epoch': index.epoch, 'version': version, 'available': available, 'total': total}
+        for location, (version, available, total) in index.location_versions().items()
+    }), 200
+
+@app.route('/api/v1/availability/<location>')
+def availability_api(location):
+    """Versioned availability bitset; ?epoch=<epoch>&since=<version> returns only what changed.
+
+    ?format=binary (or Accept: application/octet-stream) for the binary
+    encoding described in availability.py. Answered from the in-memory index.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'binary' if request.accept_mimetypes.best == availability.FORMATS['binary'] else 'json'
+    if fmt not in availability.FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'"}), 400
+    since = request.args.get('since', type=int)
+    try:
+        index = get_slot_index()
+    except Exception as e:
+        logging.error(f"Error loading slot index: {e}")
+        return jsonify({'error': 'Slot availability is temporarily unavailable'}), 503
+
+    epoch = index.epoch
+    delta = index.changes_since(location, since, request.args.get('epoch', type=int)) if since is not None else None
+    if delta is not None:
+        version, set_positions, cleared_positions = delta
+        if fmt == 'json':
+            body = jsonify(availability.delta_json(location, epoch, since, version, set_positions, cleared_positions))
+        else:
+            body = availability.delta_binary(epoch, since, version, set_positions, cleared_positions)
+    else:
+        snapshot = index.availability_bits(location)
+        if snapshot is None:
+            return jsonify({'error': f"Unknown location '{location}'"}), 404
+        version, slot_numbers, bits = snapshot
+        if fmt == 'json':
+            body = jsonify(availability.full_json(location, epoch, version, slot_numbers, bits))
+        else:
+            body = availability.full_binary(epoch, version, len(slot_numbers), bits)
+
+    response = make_response(body)
+    response.mimetype = availability.FORMATS[fmt]
+    # The epoch keeps another worker's (or an earlier run's) equal version from matching
+    response.set_etag(f"{epoch}:{location}:{version}:{since if delta is not None else 'full'}:{fmt}")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def occupancy_window():
+    """(start, end, step) from ?from=&to= (ISO datetimes, default the last 24 hours) and ?step= minutes."""
+    end = request.args.get('to')
+    end = datetime.datetime.fromisoformat(end).timestamp() if end else datetime.datetime.now().timestamp()
+    start = request.args.get('from')
+    start = datetime.datetime.fromisoformat(start).timestamp() if start else end - 86400
+    return start, end, request.args.get('step', 15, type=int)
+
+@app.route('/api/v1/occupancy')
+@app.route('/api/v1/occupancy/<location>')
+def occupancy_api(location=None):
+    """Occupancy curve(s): mean occupied/total slots per ?step= minutes between ?from= and ?to=."""
+    try:
+        start, end, step = occupancy_window()
+        get_slot_index()
+        times, names, occupied, total = occupancy_series.curves(start, end, step, location=location)
+    except KeyError:
+        return jsonify({'error': f"No occupancy history for '{location}'"}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error building occupancy curves: {e}")
+        return jsonify({'error': 'Occupancy history is temporarily unavailable'}), 503
+    return jsonify(occupancy.curves_json(times, names, occupied, total, step)), 200
+
+@app.route('/api/v1/forecast')
+@app.route('/api/v1/forecast/<location>')
+def forecast_api(location=None):
+    """Predicted occupancy and available slots for each of the next ?hours= hours (1-24)."""
+    hours = request.args.get('hours', 3, type=int)
+    if not 1 <= hours <= 24:
+        return jsonify({'error': 'hours must be between 1 and 24'}), 400
+    try:
+        get_slot_index()
+        result = occupancy_series.forecast(hours, days=app.config['OCCUPANCY_FORECAST_DAYS'], location=location)
+    except KeyError:
+        return jsonify({'error': f"No occupancy history for '{location}'"}), 404
+    except Exception as e:
+        logging.error(f"Error forecasting occupancy: {e}")
+        return jsonify({'error': 'Occupancy history is temporarily unavailable'}), 503
+    return jsonify(occupancy.forecast_json(*result)), 200
+
+@app.route('/occupancy_stats')
+@stats_required
+def occupancy_stats():
+    return jsonify(occupancy_recorder.stats()), 200
+
+@app.route('/slot_events_stats')
+@stats_required
+def slot_events_stats():
+    return jsonify(slot_events.stats()), 200
+
 @app.route('/payment')
 def payment():
     slotNumber = request.args.get('slotNumber')
-    return render_template('payment.html', slotNumber=slotNumber)
+    rates = tariffs.rates_for(session.get('booked_location'), datetime.datetime.now().hour)
+    return render_template('payment.html', slotNumber=slotNumber, idempotency_key=uuid.uuid4().hex, rates=rates)
+
+def payment_response(payment_id, plot_no, amount, replayed=False):
+    return jsonify({
+        'message': 'Payment processed successfully!',
+        'payment_id': payment_id, 'plot_no': plot_no,
+        'amount': float(amount), 'date': str(datetime.date.today()),
+        'replayed': replayed,
+    }), 200
 
 @app.route('/process_payment', methods=['POST'])
 def process_payment():
+    """Idempotent when the client sends an Idempotency-Key header (or idempotencyKey field):
+    a retry returns the original payment instead of charging again."""
     try:
         plot_no = request.form.get('plotNo')
         vehicle_no = request.form.get('vehicleNo')
@@ -452,109 +1083,259 @@ def process_payment():
         amount = float(request.form.get('amount', 0))
         payment_type = request.form.get('paymentType')
         user_id = session.get('user_id')
+        idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotencyKey') or None
         if not all([plot_no, vehicle_no, vehicle_type, hours, amount, payment_type]):
             return jsonify({'error': 'All fields are required!'}), 400
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("""
-            INSERT INTO payments (user_id, plot_no, vehicle_no, vehicle_type, hours, amount, payment_type, payment_status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (user_id, plot_no, vehicle_no, vehicle_type, hours, amount, payment_type, 'completed'))
-        mysql.connection.commit()
-        payment_id = cur.lastrowid
-        cur.close()
-        return jsonify({
-            'message': 'Payment processed successfully!',
-            'payment_id': payment_id, 'plot_no': plot_no,
-            'amount': amount, 'date': str(datetime.date.today())
-        }), 200
+        if payment_type not in DataStore.PAYMENT_TYPES:
+            return jsonify({'error': f"Payment type must be one of: {', '.join(DataStore.PAYMENT_TYPES)}"}), 400
+        if max(len(plot_no), len(vehicle_no)) > DataStore.PAYMENT_TEXT_MAX_LENGTH:
+            return jsonify({'error': f"Plot and vehicle numbers are limited to "
+                                     f"{DataStore.PAYMENT_TEXT_MAX_LENGTH} characters"}), 400
+        if idempotency_key and len(idempotency_key) > 64:
+            return jsonify({'error': 'Idempotency key is too long (max 64 characters)'}), 400
+
+        if idempotency_key:
+            existing = store.find_payments_by_keys([idempotency_key]).get(idempotency_key)
+            if existing:
+                payment_ingestor.record_duplicate()
+                return replay_payment(existing, user_id)
+
+        # Never trust the posted amount: re-price on the server
+        location = session.get('booked_location')
+        try:
+            expected = tariffs.quote(vehicle_type, hours, location=location, start_hour=datetime.datetime.now().hour)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not math.isclose(amount, expected):
+            payment_ingestor.record_mismatch()
+            logging.warning(f"Payment amount {amount} does not match tariff {expected} for {vehicle_type}/{hours}h")
+            return jsonify({'error': 'The amount has changed, please review it and pay again.', 'amount': expected}), 409
+
+        payment_id, existing = payment_ingestor.submit(dict(
+            user_id=user_id, plot_no=plot_no, vehicle_no=vehicle_no, vehicle_type=vehicle_type, hours=hours,
+            amount=expected, payment_type=payment_type, location=location, idempotency_key=idempotency_key,
+        ))
+        if existing:
+            return replay_payment(existing, user_id)
+        reserve_paid_slot(payment_id, user_id, hours)
+        if bill_renderer.available:
+            # Start rendering now so the bill is usually ready when the browser asks for it
+            try:
+                fields = bill_fields(payment_id)
+                if fields:
+                    bill_renderer.submit(fields, render_bill_html)
+            except Exception as e:
+                logging.warning(f"Could not queue bill for payment {payment_id}: {e}")
+        return payment_response(payment_id, plot_no, expected)
+    except IngestTimeout as e:
+        logging.error(f"Payment writer timed out: {e}")
+        return jsonify({'error': 'Payment service is busy, please retry.'}), 503
     except Exception as e:
         logging.error(f"Error processing payment: {e}")
         return jsonify({'error': str(e)}), 500
 
+def reserve_paid_slot(payment_id, user_id, hours):
+    """Hold the slot booked in this session for the paid hours, starting now."""
+    slot_id = session.get('booked_slot_id')
+    if not slot_id:
+        return None
+    starts_at = booking_now()
+    ends_at = starts_at + datetime.timedelta(hours=hours)
+    try:
+        reservation_id = store.reserve_slot(slot_id, user_id, starts_at, ends_at, payment_id=payment_id)
+    except Exception as e:
+        logging.error(f"Could not reserve slot {slot_id} for payment {payment_id}: {e}")
+        return None
+    if reservation_id is None:
+        logging.warning(f"Slot {slot_id} was taken before payment {payment_id} could reserve it")
+        return None
+    session.pop('booked_slot_id', None)
+    get_slot_index().set_status(slot_id, 'booked')
+    slot_release.schedule(slot_id, ends_at)
+    return reservation_id
+
+def replay_payment(existing, user_id):
+    payment_id, owner_id, plot_no, amount = existing
+    if owner_id != user_id:
+        return jsonify({'error': 'Idempotency key already used'}), 409
+    return payment_response(payment_id, plot_no, amount, replayed=True)
+
+@app.route('/payment_stats')
+@stats_required
+def payment_stats():
+    return jsonify(payment_ingestor.stats()), 200
+
+@app.route('/slot_release_stats')
+@stats_required
+def slot_release_stats():
+    return jsonify(slot_release.stats()), 200
+
 @app.route('/calculate_amount', methods=['POST'])
 def calculate_amount():
     try:
         data = request.get_json() or {}
         vehicle_type = data.get('vehicleType')
         hours = int(data.get('hours', 0))
-        if vehicle_type not in ['2wheeler', '4wheeler']:
+        if vehicle_type not in tariffs.vehicle_types:
             return jsonify({'error': 'Invalid vehicle type!'}), 400
         if hours <= 0:
             return jsonify({'error': 'Invalid hours!'}), 400
-        if vehicle_type == '2wheeler':
-            amount = 20 if hours <= 2 else 20 + (hours - 2) * 10
-        else:
-            amount = 40 if hours <= 2 else 40 + (hours - 2) * 20
+        # Same location as process_payment re-prices with, so the quote is what gets charged
+        amount = tariffs.quote(vehicle_type, hours, location=session.get('booked_location'),
+                               start_hour=datetime.datetime.now().hour)
         return jsonify({'amount': amount}), 200
     except Exception as e:
         logging.error(f"Error calculating amount: {e}")
         return jsonify({'error': str(e)}), 500
 
+def bill_fields(payment_id):
+    """The bill.html context for a payment, or None if it does not exist."""
+    payment_data = store.get_bill_data(payment_id)
+    return pdf_bill.bill_fields(payment_data) if payment_data else None
+
+def render_bill_html(fields):
+    return render_template('bill.html', **fields)
+
+def send_bill_pdf(payment_id, path):
+    return send_file(os.path.abspath(path), mimetype='application/pdf', as_attachment=True,
+                     download_name=f'bill_{payment_id}.pdf', conditional=True)
+
+def wants_json():
+    best = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    return best == 'application/json' and request.accept_mimetypes[best] > request.accept_mimetypes['text/html']
+
+@app.route('/api/tariff/quote', methods=['POST'])
+def tariff_quote():
+    """Price many stays at once: {"items": [{"vehicle_type", "hours", "location"?, "start_hour"?}]}"""
+    items = (request.get_json(silent=True) or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > app.config['TARIFF_BATCH_LIMIT']:
+        return jsonify({'error': f"At most {app.config['TARIFF_BATCH_LIMIT']} items per request"}), 400
+    try:
+        start_hours = [item.get('start_hour') for item in items]
+        amounts = tariffs.price(
+            [item.get('vehicle_type') for item in items],
+            [item.get('hours') for item in items],
+            [item.get('location') for item in items],
+            None if all(hour is None for hour in start_hours) else [hour or 0 for hour in start_hours],
+        )
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'amounts': amounts.tolist()}), 200
+
 @app.route('/generate_bill', methods=['GET', 'POST'])
 def generate_bill():
     try:
         payment_id = request.args.get('paymentId') if request.method == 'GET' else request.form.get('paymentId')
         if not payment_id:
             return jsonify({'error': 'Payment ID is required'}), 400
-        cur = get_cursor()
-        if not cur:
-            raise Exception("Database not available")
-        cur.execute("""
-            SELECT p.id, p.plot_no, p.vehicle_no, p.vehicle_type, p.hours, p.amount, p.payment_type, p.created_at, u.username
-            FROM payments p
-            JOIN users u ON p.user_id = u.id
-            WHERE p.id = %s
-        """, (payment_id,))
-        payment_data = cur.fetchone()
-        cur.close()
-        if not payment_data:
+        if not payment_id.isdigit():
             return jsonify({'error': 'Payment not found'}), 404
-        (p_id, plot_no, vehicle_no, vehicle_type, hours, amount, payment_type, created_at, username) = payment_data
-        bill_id = f"BILL-{int(p_id):06d}"
-        payment_date = created_at.strftime("%Y-%m-%d") if created_at else datetime.date.today().strftime("%Y-%m-%d")
-        payment_time = created_at.strftime("%H:%M:%S") if created_at else datetime.datetime.now().strftime("%H:%M:%S")
-        rendered = render_template('bill.html',
-            bill_id=bill_id, payment_id=p_id, slot_id=plot_no, amount=amount,
-            date=payment_date, time=payment_time, username=username,
-            vehicle_no=vehicle_no, vehicle_type=vehicle_type, hours=hours, payment_type=payment_type
-        )
+        path = bill_renderer.pdf_path(payment_id)
+        if path:
+            return send_bill_pdf(payment_id, path)
+        fields = bill_fields(payment_id)
+        if not fields:
+            return jsonify({'error': 'Payment not found'}), 404
+        p_id = fields['payment_id']
+        if not bill_renderer.available:
+            logging.warning("pdfkit/wkhtmltopdf not available; returning HTML bill")
+            return render_bill_html(fields)
         try:
-            import pdfkit
-            wk_paths = [
-                '/usr/local/bin/wkhtmltopdf',
-                '/usr/bin/wkhtmltopdf',
-                'C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe',
-                os.getenv('WKHTMLTOPDF_PATH', '')
-            ]
-            config = None
-            for path in wk_paths:
-                if path and os.path.isfile(path):
-                    config = pdfkit.configuration(wkhtmltopdf=path)
-                    break
-            options = {'page-size': 'A4', 'encoding': 'UTF-8'}
-            if config:
-                pdf_content = pdfkit.from_string(rendered, False, configuration=config, options=options)
-                response = make_response(pdf_content)
-                response.headers['Content-Type'] = 'application/pdf'
-                response.headers['Content-Disposition'] = f'attachment; filename=bill_{p_id}.pdf'
-                return response
-            else:
-                logging.warning("wkhtmltopdf not found; returning HTML bill")
-                return rendered
-        except ImportError:
-            logging.warning("pdfkit not installed; returning HTML bill")
-            return rendered
-        except Exception as pdf_err:
-            logging.error(f"PDF generation error: {pdf_err}")
-            return rendered
+            job = bill_renderer.submit(fields, render_bill_html)
+        except QueueFull as e:
+            logging.warning(f"Bill queue full, returning HTML bill: {e}")
+            return render_bill_html(fields)
+        if job.wait(app.config['BILL_RENDER_WAIT']) and job.status == 'done':
+            return send_bill_pdf(p_id, bill_renderer.pdf_path(p_id))
+        if job.status == 'failed':
+            return render_bill_html(fields)
+        if wants_json():
+            return jsonify(bill_job_status(job)), 202
+        # Show the HTML bill now; the browser comes back for the PDF once it is rendered
+        response = make_response(render_bill_html(fields), 202)
+        response.headers['Refresh'] = f"2; url={url_for('generate_bill', paymentId=p_id)}"
+        return response
     except Exception as e:
         logging.error(f"Error generating bill: {e}")
         return jsonify({'error': str(e)}), 500
 
+def bill_job_status(job):
+    status = job.to_dict()
+    status['status_url'] = url_for('bill_job', job_id=job.id)
+    if job.status == 'done':
+        status['download_url'] = url_for('generate_bill', paymentId=job.payment_id)
+    return status
+
+@app.route('/api/bills', methods=['POST'])
+def submit_bill():
+    """Queue a bill render: paymentId in the form or JSON body. Poll status_url."""
+    data = request.get_json(silent=True) or request.form
+    payment_id = str(data.get('paymentId', ''))
+    if not payment_id.isdigit():
+        return jsonify({'error': 'Payment ID is required'}), 400
+    if not bill_renderer.available:
+        return jsonify({'error': 'PDF rendering is not available on this server'}), 503
+    try:
+        fields = bill_fields(payment_id)
+        if not fields:
+            return jsonify({'error': 'Payment not found'}), 404
+        job = bill_renderer.submit(fields, render_bill_html)
+    except QueueFull:
+        response = jsonify({'error': 'Bill queue is full, try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        logging.error(f"Error queueing bill: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(bill_job_status(job)), 200 if job.status == 'done' else 202
+
+@app.route('/api/bills/<job_id>')
+def bill_job(job_id):
+    job = bill_renderer.job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(bill_job_status(job)), 200
+
+@app.route('/bill_stats')
+@stats_required
+def bill_stats():
+    return jsonify(bill_renderer.stats()), 200
+
+@app.route('/admin/bills/export')
+@admin_required
+def export_bills():
+    """Stream many bills: ?from=YYYY-MM-DD&to=YYYY-MM-DD or ?ids=1,2,3, plus &format=zip|pdf"""
+    fmt = request.args.get('format', 'zip')
+    if fmt not in bill_export.FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'"}), 400
+    try:
+        selection = bill_export.selection(request.args.get('from'), request.args.get('to'), request.args.get('ids'))
+        rows = store.iter_bill_data(**selection)
+        first = next(rows, None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error exporting bills: {e}")
+        return jsonify({'error': 'Database error'}), 500
+    if first is None:
+        return jsonify({'error': 'No payments match'}), 404
+    stream = bill_export.export_stream(itertools.chain([first], rows), fmt)
+    response = app.response_class(stream_with_context(stream), mimetype=bill_export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=bills.{fmt}'
+    return response
+
 # -------------------------
 # Run
 # -------------------------
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG)
+    try:
+        ping_database()
+        print("✅ Database connection successful!")
+    except Exception as e:
+        logging.error(f"Failed to connect to database. Please check your {db_backend.name} configuration: {e}")
+        print("❌ Database connection failed!")
+        print("Please ensure:\n1. MySQL server is running\n2. Database 'parking_system1' exists\n3. User credentials are correct\n4. Run: mysql -u root -p < database_setup.sql && python setup_database.py --migrate")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,406 @@
+"""
+ASGI Entry Point
+Async serving mode for the parking app. The read-heavy pages (index,
+features, guidelines, notification) and the notifications API run as
+coroutines that reach the database through an async connection pool
+(async_storage.py), so a slow query parks a coroutine instead of a thread.
+Views that only read in-memory state (slot pages, availability, occupancy,
+the *_stats endpoints) run directly on the event loop, and so do the live
+slot event streams, which wait for events on the loop and end when the
+client disconnects. Every other route is the unchanged Flask view, run on a
+fixed pool of ASGI_WSGI_THREADS threads; no stream ever holds one of them.
+
+Usage:
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+    DB_BACKEND=sqlite SQLITE_PATH=parking_system1.db uvicorn asgi:application
+"""
+
+import asyncio
+import inspect
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import render_template, jsonify, redirect, url_for, request
+from werkzeug.exceptions import HTTPException
+
+import app as webapp  # components are rebuilt by create_app() and after a fork: look them up here
+from app import app
+from async_storage import AsyncDataStore, create_async_pool
+from http_cache import PageCache
+from storage import PAGINATED_TABLES, encode_cursor, decode_cursor
+
+async_pool = create_async_pool(app.config)  # opened on lifespan startup
+store = AsyncDataStore(webapp.instruments.wrap_async_pool(async_pool))
+wsgi_threads = ThreadPoolExecutor(max_workers=app.config['ASGI_WSGI_THREADS'], thread_name_prefix='wsgi')
+
+# Endpoints whose Flask view only reads in-memory state once the slot index is loaded
+INLINE_ENDPOINTS = {
+    'slots', 'slots_api', 'availability_summary', 'availability_api', 'occupancy_api', 'forecast_api',
+    'pool_stats', 'booking_stats', 'occupancy_stats', 'slot_events_stats', 'payment_stats',
+    'slot_release_stats', 'bill_stats',
+}
+# Endpoints whose response streams for as long as the client stays: always served on the loop
+STREAM_ENDPOINTS = {'slot_event_stream'}
+
+_served = {'async': 0, 'inline': 0, 'threaded': 0}
+_threaded_in_flight = 0
+
+
+# -------------------------
+# Async views
+# -------------------------
+ASYNC_VIEWS = {}
+
+def async_view(endpoint):
+    """Serve the Flask route of this endpoint with the decorated coroutine."""
+    def decorator(view):
+        ASYNC_VIEWS[endpoint] = view
+        return view
+    return decorator
+
+async def content_last_modified(tables):
+    return [await webapp.content_cache.get_or_load_async(f'updated_at:{table}',
+                                                         lambda table=table: store.max_updated_at(table))
+            for table in tables]
+
+page_cache = PageCache(content_last_modified, os.path.join(app.root_path, app.template_folder),
+                       max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'], generations=webapp.page_cache.generations)
+
+async def latest_notifications():
+    return await webapp.content_cache.get_or_load_async(
+        'notifications:latest', lambda: store.notifications_feed(limit=app.config['NOTIFICATIONS_PAGE_SIZE'])
+    )
+
+@async_view('index')
+@page_cache.page('users', 'notifications')
+async def index():
+    try:
+        user_count = await webapp.content_cache.get_or_load_async('user_count', store.count_users)
+        notifications, _ = await latest_notifications()
+        notifications = notifications[:app.config['HOMEPAGE_NOTIFICATIONS']]
+    except Exception as e:
+        logging.error(f"Error fetching data for index: {e}")
+        user_count = 0
+        notifications = []
+    return render_template('index.html', user_count=user_count, notifications=notifications)
+
+@async_view('notification')
+@page_cache.page('notifications')
+async def notification():
+    after = request.args.get('after')
+    try:
+        if after:
+            notifications, next_cursor = await store.notifications_feed(
+                after=decode_cursor(after), limit=app.config['NOTIFICATIONS_PAGE_SIZE']
+            )
+        else:
+            notifications, next_cursor = await latest_notifications()
+    except ValueError:
+        return redirect(url_for('notification'))
+    except Exception as e:
+        logging.error(f"Error fetching notifications: {e}")
+        notifications, next_cursor = [], None
+    return render_template('notifications.html', notifications=notifications,
+                           next_cursor=encode_cursor(next_cursor) if next_cursor else None,
+                           is_first_page=not after)
+
+@async_view('notifications_api')
+async def notifications_api():
+    after = request.args.get('after')
+    try:
+        limit = int(request.args.get('limit', app.config['NOTIFICATIONS_PAGE_SIZE']))
+        if after:
+            rows, next_cursor = await store.notifications_feed(after=decode_cursor(after), limit=limit)
+        elif limit == app.config['NOTIFICATIONS_PAGE_SIZE']:
+            rows, next_cursor = await latest_notifications()
+        else:
+            rows, next_cursor = await store.notifications_feed(limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error paginating notifications: {e}")
+        return jsonify({'error': 'Database error'}), 500
+    columns = PAGINATED_TABLES['notifications']['columns']
+    return jsonify({
+        'notifications': [dict(zip(columns, row)) for row in rows],
+        'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+    }), 200
+
+@async_view('features')
+@page_cache.page('features')
+async def features():
+    try:
+        features_content = await webapp.content_cache.get_or_load_async('features', store.list_features)
+    except Exception as e:
+        logging.error(f"Error fetching features content: {e}")
+        features_content = []
+    return render_template('features.html', features_content=features_content)
+
+@async_view('guidelines')
+@page_cache.page('guidelines')
+async def guidelines():
+    try:
+        guidelines_content = await webapp.content_cache.get_or_load_async('guidelines', store.list_guidelines)
+    except Exception as e:
+        logging.error(f"Error fetching guidelines content: {e}")
+        guidelines_content = []
+    return render_template('guidelines.html', guidelines_content=guidelines_content)
+
+@async_view('cache_stats')
+@webapp.stats_required
+async def cache_stats():
+    return jsonify(dict(webapp.content_cache.stats(), pages=page_cache.stats())), 200
+
+
+# -------------------------
+# ASGI <-> WSGI plumbing
+# -------------------------
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope (PEP 3333 field by field)."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1')
+        value = value.decode('latin1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def read_body(receive, limit):
+    """Request body, or None once it grows past limit bytes."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return b''.join(chunks)
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit is not None and size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+def _start_message(status, headers):
+    # The server sends its own Date header; Flask's (on conditional responses) would duplicate it
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers
+                    if name.lower() != 'date'],
+    }
+
+async def send_stream(stream, receive, send, stats):
+    """Send an async byte stream until it ends or the client disconnects."""
+    async def pump():
+        async for chunk in stream:
+            stats.bytes_sent += len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnect())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()  # stops the stream (its finally releases the subscriber) or the listener
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if tasks[0] in done:
+        tasks[0].result()  # re-raise a failed stream
+
+async def serve_inline(environ, send, view, receive=None):
+    """Run a view (coroutine or plain function) on the event loop inside a
+    Flask request context, the way Flask.wsgi_app would, measured the way
+    the instrumentation middleware measures the threaded routes. A response
+    whose body is an async iterable (a slot event Subscription) is streamed
+    with send_stream(), which needs receive to notice the disconnect."""
+    stats = webapp.instruments.begin(profilable=False)
+    try:
+        await _serve_inline(environ, receive, send, view, stats)
+    except Exception:
+        stats.status = stats.status or '500'
+        raise
+    finally:
+        webapp.instruments.end(stats)
+
+async def _serve_inline(environ, receive, send, view, stats):
+    with app.request_context(environ):
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = view(**(request.view_args or {}))
+                    if inspect.isawaitable(rv):
+                        rv = await rv
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+        except Exception as e:
+            response = app.handle_exception(e)
+        stream = response.response if hasattr(response.response, '__aiter__') else None
+        body, status, headers = response.get_wsgi_response(environ)
+        stats.status = status.split(' ', 1)[0]
+        await send(_start_message(status, headers))
+        try:
+            if stream is not None:
+                await send_stream(stream, receive, send, stats)
+                return
+            for chunk in body:
+                if chunk:
+                    stats.bytes_sent += len(chunk)
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        await send({'type': 'http.response.body', 'body': b''})
+
+async def serve_threaded(environ, send):
+    """Run the Flask app on a wsgi_threads worker; each chunk it yields is sent
+    from the event loop while the worker waits, so streams keep backpressure."""
+    loop = asyncio.get_running_loop()
+
+    def deliver(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started and started[0] is True:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [status, headers]
+
+        result = app(environ, start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if started[0] is not True:
+                    deliver(_start_message(*started))
+                    started[:] = [True]
+                deliver({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if started[0] is not True:
+                deliver(_start_message(*started))
+            deliver({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    await loop.run_in_executor(wsgi_threads, run)
+
+
+# -------------------------
+# Application
+# -------------------------
+def load_slot_index():
+    with app.app_context():
+        webapp.get_slot_index()
+
+async def startup():
+    await async_pool.open()
+    try:
+        # Built off the loop: until it is, the inline endpoints go to the threads
+        await asyncio.get_running_loop().run_in_executor(wsgi_threads, load_slot_index)
+    except Exception as e:
+        logging.error(f"Slot index not loaded at startup: {e}")
+
+async def shutdown():
+    await async_pool.close()
+    wsgi_threads.shutdown(wait=False)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await startup()
+            except Exception as e:
+                logging.error(f"ASGI startup failed: {e}")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+def asgi_stats():
+    return {
+        'served': dict(_served),
+        'async_pool': async_pool.stats(),
+        'wsgi_threads': app.config['ASGI_WSGI_THREADS'],
+        'threaded_in_flight': _threaded_in_flight,
+    }
+
+async def application(scope, receive, send):
+    global _threaded_in_flight
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    body = await read_body(receive, app.config['MAX_CONTENT_LENGTH'])
+    if body is None:
+        await send(_start_message('413', [('Content-Type', 'text/plain')]))
+        await send({'type': 'http.response.body', 'body': b'Request body too large'})
+        return
+    environ = build_environ(scope, body)
+    if scope['path'] == '/asgi_stats':
+        await serve_inline(environ, send, webapp.stats_required(lambda: (jsonify(asgi_stats()), 200)))
+        return
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        endpoint = None  # 404s, 405s and slash redirects are Flask's to answer
+
+    if endpoint in ASYNC_VIEWS:
+        _served['async'] += 1
+        await serve_inline(environ, send, ASYNC_VIEWS[endpoint])
+    elif endpoint in STREAM_ENDPOINTS:
+        _served['inline'] += 1
+        if not webapp.slot_index.loaded:
+            try:
+                # A one-off load on a worker thread; the stream itself never takes one
+                await asyncio.get_running_loop().run_in_executor(wsgi_threads, load_slot_index)
+            except Exception as e:
+                logging.error(f"Slot index not loaded for {scope['path']}: {e}")
+        await serve_inline(environ, send, app.view_functions[endpoint], receive)
+    elif endpoint in INLINE_ENDPOINTS and webapp.slot_index.loaded:
+        _served['inline'] += 1
+        await serve_inline(environ, send, app.view_functions[endpoint])
+    else:
+        _served['threaded'] += 1
+        _threaded_in_flight += 1
+        try:
+            await serve_threaded(environ, send)
+        finally:
+            _threaded_in_flight -= 1
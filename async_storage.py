@@ -0,0 +1,240 @@
+"""
+Async Storage
+Coroutine versions of the DataStore reads served by the ASGI entry point
+(asgi.py), over a pooled async driver: aiomysql for MySQL, aiosqlite for the
+embedded backend. Pagination SQL comes from storage.py, so both serving
+modes issue the same statements against the same indexes.
+"""
+
+import asyncio
+import contextlib
+import sqlite3
+
+from db_pool import PoolTimeout
+from storage import DataStore, page_query, page_result, timestamp_value
+
+
+# -------------------------
+# Pools
+# -------------------------
+class AsyncMySQLPool:
+    """aiomysql pool; min_size connections are opened on open(), at most max_size exist at once."""
+
+    name = 'mysql'
+
+    def __init__(self, host, user, password, db, port=3306, min_size=1, max_size=10,
+                 timeout=5.0, max_lifetime=3600.0):
+        import aiomysql
+        self._driver = aiomysql
+        self.params = dict(host=host, user=user, password=password, db=db, port=port, charset='utf8mb4')
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._pool = None
+        self._checkouts = 0
+        self._timeouts = 0
+
+    async def open(self):
+        # autocommit: a pooled connection left inside a REPEATABLE READ
+        # transaction would keep serving the snapshot it first read
+        self._pool = await self._driver.create_pool(
+            minsize=self.min_size, maxsize=self.max_size, pool_recycle=int(self.max_lifetime),
+            autocommit=True, **self.params
+        )
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(f"No connection available within {self.timeout}s (max_size={self.max_size})")
+        self._checkouts += 1
+        try:
+            yield conn
+        finally:
+            self._pool.release(conn)
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+
+    def stats(self):
+        size = self._pool.size if self._pool is not None else 0
+        idle = self._pool.freesize if self._pool is not None else 0
+        return {
+            'name': self.name,
+            'size': size,
+            'in_use': size - idle,
+            'idle': idle,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'checkouts': self._checkouts,
+            'timeouts': self._timeouts,
+        }
+
+
+class _SQLiteCursor:
+    """Cursor over an aiosqlite connection that accepts MySQLdb-style %s
+    placeholders and runs each statement in one hop to the connection's
+    thread (execute and fetch together) instead of one per call."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    async def execute(self, sql, params=()):
+        self._rows = list(await self._conn.execute_fetchall(sql.replace('%s', '?'), params))
+
+    async def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    async def close(self):
+        self._rows = []
+
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def cursor(self):
+        return _SQLiteCursor(self._conn)
+
+
+class AsyncSQLitePool:
+    """Fixed set of aiosqlite connections handed out through an asyncio queue.
+
+    aiosqlite runs each connection's statements on a thread of its own, so
+    size is also the number of threads reading the database.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, size=4, timeout=5.0, busy_timeout=5.0):
+        import aiosqlite
+        self._driver = aiosqlite
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self._connections = []
+        self._idle = None
+        self._checkouts = 0
+        self._timeouts = 0
+
+    async def open(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await self._driver.connect(self.path, timeout=self.busy_timeout,
+                                              detect_types=sqlite3.PARSE_DECLTYPES)
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.append(conn)
+            self._idle.put_nowait(_SQLiteConnection(conn))
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        try:
+            conn = await asyncio.wait_for(self._idle.get(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(f"No connection available within {self.timeout}s (size={self.size})")
+        self._checkouts += 1
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        connections, self._connections = self._connections, []
+        for conn in connections:
+            await conn.close()
+
+    def stats(self):
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            'name': self.name,
+            'size': len(self._connections),
+            'in_use': len(self._connections) - idle,
+            'idle': idle,
+            'min_size': self.size,
+            'max_size': self.size,
+            'checkouts': self._checkouts,
+            'timeouts': self._timeouts,
+        }
+
+
+def create_async_pool(config):
+    """Unopened pool for config['DB_BACKEND'] (same settings create_backend() reads);
+    call await pool.open() from inside the event loop."""
+    kind = (config.get('DB_BACKEND') or 'mysql').lower()
+    max_size = int(config.get('ASYNC_POOL_MAX_SIZE', 20))
+    timeout = float(config.get('MYSQL_POOL_TIMEOUT', 5))
+    if kind == 'sqlite':
+        return AsyncSQLitePool(config.get('SQLITE_PATH', 'parking_system1.db'), size=max_size, timeout=timeout)
+    if kind == 'mysql':
+        return AsyncMySQLPool(
+            host=config['MYSQL_HOST'],
+            user=config['MYSQL_USER'],
+            password=config['MYSQL_PASSWORD'],
+            db=config['MYSQL_DB'],
+            port=config['MYSQL_PORT'],
+            min_size=min(int(config.get('MYSQL_POOL_MIN_SIZE', 2)), max_size),
+            max_size=max_size,
+            timeout=timeout,
+            max_lifetime=float(config.get('MYSQL_POOL_MAX_LIFETIME', 3600)),
+        )
+    raise ValueError(f"Unknown DB_BACKEND '{kind}' (expected 'mysql' or 'sqlite')")
+
+
+# -------------------------
+# Data store
+# -------------------------
+class AsyncDataStore:
+    """The read queries of the public pages; same SQL and results as the
+    DataStore methods of the same name."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def _fetchall(self, sql, params=()):
+        async with self.pool.acquire() as conn:
+            cur = await conn.cursor()
+            try:
+                await cur.execute(sql, params)
+                return await cur.fetchall()
+            finally:
+                await cur.close()
+
+    async def _fetchone(self, sql, params=()):
+        rows = await self._fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def page(self, name, sort='id', descending=True, after=None, limit=20, filters=None):
+        sql, params, limit = page_query(name, sort, descending, after, limit, filters)
+        return page_result(name, sort, limit, await self._fetchall(sql, params))
+
+    async def max_updated_at(self, table):
+        if table not in DataStore.VERSIONED_TABLES:
+            raise ValueError(f"No content version for table '{table}'")
+        return timestamp_value((await self._fetchone(f"SELECT MAX(updated_at) FROM {table}"))[0])
+
+    # ----------------- Users -----------------
+    async def count_users(self):
+        return (await self._fetchone("SELECT COUNT(*) FROM users"))[0] or 0
+
+    # ----------------- Notifications -----------------
+    async def notifications_feed(self, after=None, limit=10):
+        return await self.page('notifications', sort='created_at', after=after, limit=limit,
+                               filters={'is_active': True})
+
+    # ----------------- Features -----------------
+    async def list_features(self):
+        return await self._fetchall("SELECT title, description, icon FROM features WHERE is_active = TRUE")
+
+    # ----------------- Guidelines -----------------
+    async def list_guidelines(self):
+        return await self._fetchall("SELECT title, content, category FROM guidelines WHERE is_active = TRUE")
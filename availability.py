@@ -0,0 +1,76 @@
+"""
+Availability Encoding
+Compact, versioned availability payloads for entrance displays, kiosks and
+mobile clients, built from the in-memory slot index.
+
+A location's availability is a bitset over its slots in slot_number order
+(bit i, MSB first, is slot_numbers[i]; 1 = available) plus the location's
+version and the index epoch that version belongs to. A client that already
+holds version N of epoch E asks for changes since N in E and gets the
+positions whose bit flipped to 1 ('set') or to 0 ('cleared'); for any other
+epoch it gets the full bitset.
+
+Binary format (big-endian), for clients that would rather not parse JSON:
+
+    full:  b'SLA2' epoch:u32 version:u64 count:u32 bitset[ceil(count / 8)]
+    delta: b'SLD2' epoch:u32 since:u64 version:u64 n_set:u32 n_cleared:u32
+           set[n_set]:u32 cleared[n_cleared]:u32
+
+The full form omits slot numbers; fetch them once from the JSON form.
+"""
+
+import base64
+import struct
+
+FORMATS = {
+    'json': 'application/json',
+    'binary': 'application/octet-stream',
+}
+
+_FULL = struct.Struct('>4sIQI')
+_DELTA = struct.Struct('>4sIQQII')
+
+
+def full_json(location, epoch, version, slot_numbers, bits):
+    return {
+        'location': location,
+        'epoch': epoch,
+        'version': version,
+        'full': True,
+        'total': len(slot_numbers),
+        'available': sum(bin(byte).count('1') for byte in bits),
+        'slot_numbers': list(slot_numbers),
+        'bitset': base64.b64encode(bits).decode('ascii'),
+    }
+
+
+def delta_json(location, epoch, since, version, set_positions, cleared_positions):
+    return {
+        'location': location,
+        'epoch': epoch,
+        'version': version,
+        'since': since,
+        'full': False,
+        'set': set_positions,
+        'cleared': cleared_positions,
+    }
+
+
+def full_binary(epoch, version, count, bits):
+    return _FULL.pack(b'SLA2', epoch, version, count) + bits
+
+
+def delta_binary(epoch, since, version, set_positions, cleared_positions):
+    positions = set_positions + cleared_positions
+    return (_DELTA.pack(b'SLD2', epoch, since, version, len(set_positions), len(cleared_positions))
+            + struct.pack(f'>{len(positions)}I', *positions))
+
+
+def apply_delta(bits, set_positions, cleared_positions):
+    """Client-side helper: the bitset after a delta (bytes in, bytes out)."""
+    bits = bytearray(bits)
+    for pos in set_positions:
+        bits[pos // 8] |= 0x80 >> (pos % 8)
+    for pos in cleared_positions:
+        bits[pos // 8] &= ~(0x80 >> (pos % 8)) & 0xFF
+    return bytes(bits)
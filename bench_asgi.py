@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+WSGI vs ASGI Concurrency Benchmark
+Drives the read-heavy pages through both serving paths in-process (no
+sockets, so only the serving model differs) and reports throughput, latency
+and peak memory for each:
+
+    wsgi  --threads     one request in flight per thread, the way the
+                        Flask app is served today
+    wsgi  --concurrency a thread per in-flight request: same concurrency as
+                        the ASGI run, paid for in thread stacks
+    asgi  --concurrency coroutines on one event loop, DB reads through the
+                        async pool, still only --threads OS threads
+
+Each run is a fresh process so peak RSS is its own. The content cache is off
+by default so every request reaches the database; --db-latency adds a
+simulated network round trip to each query (use 0 against a real MySQL
+server). On SQLite aiosqlite runs a thread per pooled connection, so compare
+memory on MySQL.
+
+Usage:
+    DB_BACKEND=sqlite SQLITE_PATH=parking_system1.db python bench_asgi.py
+    python bench_asgi.py --seconds 20 --threads 8 --concurrency 500 --pool-size 32 --db-latency 0
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_PATHS = '/,/features,/guidelines,/notification,/api/notifications'
+
+
+# -------------------------
+# Simulated network latency
+# -------------------------
+class _SlowCursor:
+    def __init__(self, cur, latency):
+        self._cur = cur
+        self._latency = latency
+
+    def execute(self, sql, params=()):
+        time.sleep(self._latency)
+        return self._cur.execute(sql, params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cur, attr)
+
+
+class _SlowBackend:
+    def __init__(self, backend, latency):
+        self._backend = backend
+        self._latency = latency
+
+    def cursor(self, conn):
+        return _SlowCursor(self._backend.cursor(conn), self._latency)
+
+    def __getattr__(self, attr):
+        return getattr(self._backend, attr)
+
+
+class _SlowAsyncCursor:
+    def __init__(self, cur, latency):
+        self._cur = cur
+        self._latency = latency
+
+    async def execute(self, sql, params=()):
+        await asyncio.sleep(self._latency)
+        return await self._cur.execute(sql, params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cur, attr)
+
+
+class _SlowAsyncConnection:
+    def __init__(self, conn, latency):
+        self._conn = conn
+        self._latency = latency
+
+    async def cursor(self):
+        return _SlowAsyncCursor(await self._conn.cursor(), self._latency)
+
+
+class _SlowAsyncPool:
+    def __init__(self, pool, latency):
+        self._pool = pool
+        self._latency = latency
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        async with self._pool.acquire() as conn:
+            yield _SlowAsyncConnection(conn, self._latency)
+
+
+# -------------------------
+# Runs (one per child process)
+# -------------------------
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+def run_wsgi(args, workers):
+    from werkzeug.test import EnvironBuilder
+    import app as web
+
+    with web.app.app_context():
+        web.get_slot_index()  # asgi.startup() loads it too; keep the memory comparable
+    if args.db_latency:
+        web.store.backend = _SlowBackend(web.store.backend, args.db_latency / 1000)
+    paths = args.paths.split(',')
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            environ = EnvironBuilder(path=paths[i % len(paths)]).get_environ()
+            status = []
+            started = time.perf_counter()
+            body = web.app.wsgi_app(environ, lambda s, h, exc_info=None: status.append(s))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                body.close()
+            latencies.append(time.perf_counter() - started)
+            if not status[0].startswith(('200', '304')):
+                errors.append(status[0])
+            i += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for t in threads:
+        t.start()
+    peak_threads = threading.active_count()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, latencies, errors, peak_threads
+
+
+def run_asgi(args, concurrency):
+    import asgi
+
+    async def main():
+        await asgi.startup()
+        if args.db_latency:
+            asgi.store.pool = _SlowAsyncPool(asgi.store.pool, args.db_latency / 1000)
+        paths = args.paths.split(',')
+        latencies, errors = [], []
+        deadline = time.perf_counter() + args.seconds
+
+        async def client(offset):
+            i = offset
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                scope = {
+                    'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                    'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                    'headers': [(b'host', b'localhost')], 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+                }
+                sent = []
+
+                async def receive():
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+                async def send(message):
+                    sent.append(message)
+
+                started = time.perf_counter()
+                await asgi.application(scope, receive, send)
+                latencies.append(time.perf_counter() - started)
+                if sent[0]['status'] not in (200, 304):
+                    errors.append(sent[0]['status'])
+                i += 1
+
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(client(n)) for n in range(concurrency)]
+        await asyncio.sleep(0)
+        peak_threads = threading.active_count()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        await asgi.shutdown()
+        return elapsed, latencies, errors, peak_threads
+
+    return asyncio.run(main())
+
+
+def child(args):
+    logging.disable(logging.INFO)
+    if args.mode == 'asgi':
+        elapsed, latencies, errors, peak_threads = run_asgi(args, args.concurrency)
+    else:
+        elapsed, latencies, errors, peak_threads = run_wsgi(args, args.workers)
+    done = len(latencies)
+    print("RESULT " + json.dumps({
+        'requests': done,
+        'rps': done / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': len(errors),
+        'threads': peak_threads,
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def spawn(args, mode, workers, pool_size):
+    env = dict(os.environ, CONTENT_CACHE_BACKEND='none' if not args.cache else os.getenv('CONTENT_CACHE_BACKEND', 'lru'),
+               MYSQL_POOL_MIN_SIZE=str(min(2, pool_size)), MYSQL_POOL_MAX_SIZE=str(pool_size),
+               ASYNC_POOL_MAX_SIZE=str(pool_size), ASGI_WSGI_THREADS=str(args.threads))
+    command = [sys.executable, os.path.abspath(__file__), '--mode', mode, '--workers', str(workers),
+               '--seconds', str(args.seconds), '--concurrency', str(args.concurrency),
+               '--threads', str(args.threads), '--db-latency', str(args.db_latency), '--paths', args.paths]
+    output = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in output.stdout.splitlines():
+        if line.startswith('RESULT '):
+            return json.loads(line[len('RESULT '):])
+    print(output.stdout[-2000:], output.stderr[-2000:])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10, help="length of each run")
+    parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads (the fixed-memory budget)")
+    parser.add_argument('--concurrency', type=int, default=200, help="requests in flight for the ASGI run")
+    parser.add_argument('--pool-size', type=int, default=32, help="DB connections for the async pool")
+    parser.add_argument('--db-latency', type=float, default=5, help="simulated ms of network per query")
+    parser.add_argument('--cache', action='store_true', help="keep the content cache on")
+    parser.add_argument('--paths', default=DEFAULT_PATHS)
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        child(args)
+        return True
+
+    print("🚀 WSGI vs ASGI benchmark")
+    print(f"   seconds={args.seconds} threads={args.threads} concurrency={args.concurrency} "
+          f"pool_size={args.pool_size} db_latency={args.db_latency}ms cache={'on' if args.cache else 'off'}")
+    print("-" * 86)
+    print(f"{'mode':<26} {'in flight':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'threads':>8} {'peak RSS':>9} {'errors':>6}")
+    runs = [
+        (f"wsgi, {args.threads} threads", 'wsgi', args.threads, args.threads, min(args.pool_size, args.threads)),
+        (f"wsgi, {args.concurrency} threads", 'wsgi', args.concurrency, args.concurrency,
+         min(args.pool_size, args.concurrency)),
+        (f"asgi, {args.threads} threads", 'asgi', args.threads, args.concurrency, args.pool_size),
+    ]
+    results = {}
+    for label, mode, workers, in_flight, pool_size in runs:
+        result = spawn(args, mode, workers, pool_size)
+        if result is None:
+            print(f"❌ {label} failed")
+            return False
+        results[label] = result
+        print(f"{label:<26} {in_flight:>9} {result['rps']:>9.1f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+              f"{result['threads']:>8} {result['rss_mb']:>7.1f}MB {result['errors']:>6}")
+    print("-" * 86)
+    wsgi, asgi = results[runs[0][0]], results[runs[2][0]]
+    print(f"📊 At {args.threads} threads: ASGI serves {asgi['rps'] / wsgi['rps']:.2f}x the requests/s "
+          f"with {asgi['rss_mb'] - wsgi['rss_mb']:+.1f}MB peak RSS")
+    return True
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
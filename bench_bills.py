@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Bill Rendering Benchmark
+Compares bills/sec for the native PDF generator (pdf_bill.py) against the
+pdfkit/wkhtmltopdf path (bill.html rendered by Jinja, then wkhtmltopdf).
+
+Usage:
+    python bench_bills.py [--bills 2000] [--pdfkit-bills 20]
+"""
+
+import argparse
+import os
+import time
+
+from jinja2 import Environment, FileSystemLoader
+
+import pdf_bill
+from bill_renderer import find_wkhtmltopdf, PDF_OPTIONS
+
+def sample_fields(i):
+    return dict(
+        bill_id=f"BILL-{i:06d}", payment_id=i, slot_id=str(i % 20 + 1), amount=40 + i % 5 * 20,
+        date='2024-06-01', time='10:30:00', username=f'user{i}', vehicle_no=f'KA01AB{i:04d}',
+        vehicle_type='4wheeler' if i % 2 else '2wheeler', hours=2 + i % 4, payment_type='upi'
+    )
+
+def report(label, count, elapsed, size):
+    print(f"{label:<28} {elapsed / count * 1000:9.2f} ms/bill  {count / elapsed:10.1f} bills/s  {size:7d} bytes")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bills', type=int, default=2000, help="bills for the native generator")
+    parser.add_argument('--pdfkit-bills', type=int, default=20, help="bills for pdfkit (each spawns wkhtmltopdf)")
+    args = parser.parse_args()
+
+    print("🚀 Benchmarking bill PDF generation")
+    print("-" * 75)
+
+    started = time.perf_counter()
+    for i in range(args.bills):
+        pdf = pdf_bill.render_bill(sample_fields(i))
+    report('native (pdf_bill)', args.bills, time.perf_counter() - started, len(pdf))
+
+    wkhtmltopdf = find_wkhtmltopdf()
+    if not wkhtmltopdf:
+        print("⚠️ pdfkit or wkhtmltopdf not installed; skipping the pdfkit path")
+        return
+    import pdfkit
+    config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf)
+    template = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
+                           autoescape=True).get_template('bill.html')
+    started = time.perf_counter()
+    for i in range(args.pdfkit_bills):
+        html = template.render(**sample_fields(i))
+        pdf = pdfkit.from_string(html, False, configuration=config, options=PDF_OPTIONS)
+    report('pdfkit (wkhtmltopdf)', args.pdfkit_bills, time.perf_counter() - started, len(pdf))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Booking Load Test
+Many threads book slots at one location at the same time, first the way
+book_slot used to (read the slot list, try the first free slot once) and
+then through booking_engine.BookingEngine. Checks that no slot was handed
+to two requests and reports bookings/sec, lost races and retries.
+
+Creates a 'loadtest' location (and user) in the configured database and
+removes the location's slots afterwards unless --keep is given.
+
+Usage:
+    python bench_booking.py --backend sqlite --sqlite-path parking_system1.db
+    python bench_booking.py --backend mysql --threads 64 --slots 500 --requests 1000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+from db_pool import ConnectionPool
+from storage import create_backend, config_from_env, DataStore
+from slot_index import SlotIndex
+from booking_engine import BookingEngine, BookingContention, STRATEGIES
+
+LOCATION = 'loadtest'
+USER_EMAIL = 'loadtest@example.com'
+
+def prepare(store, slots):
+    """Fresh LOCATION with `slots` available slots; returns the load-test user id."""
+    user = store.get_user_by_email(USER_EMAIL)
+    user_id = user[0] if user else store.create_user('loadtest', USER_EMAIL, generate_password_hash('loadtest'))
+    cur = store.cursor()
+    try:
+        cur.execute("DELETE FROM ParkingSlot WHERE location = %s", (LOCATION,))
+        cur.executemany("INSERT INTO ParkingSlot (location, slot_number, status) VALUES (%s, %s, 'available')",
+                        [(LOCATION, number) for number in range(1, slots + 1)])
+        store.commit()
+    finally:
+        cur.close()
+    return user_id
+
+def booked_in_db(store):
+    return store._fetchone("SELECT COUNT(*) FROM ParkingSlot WHERE location = %s AND status = 'booked'",
+                           (LOCATION,))[0]
+
+def run(label, requests, threads, book_one):
+    """Call book_one() `requests` times from `threads` threads; returns (slot ids won, failures, seconds)."""
+    won, failures = [], []
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            try:
+                slot = book_one()
+            except Exception as e:
+                failures.append(e)
+                continue
+            if slot is not None:
+                won.append(slot)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<26} {len(won):>6} booked  {len(failures):>5} failed  in {elapsed:6.2f}s "
+          f"-> {len(won) / elapsed:8.1f} bookings/s")
+    return won, failures, elapsed
+
+def check(store, won, slots):
+    """True if every slot was won at most once and the database agrees."""
+    unique = len(set(won))
+    in_db = booked_in_db(store)
+    ok = unique == len(won) and in_db == len(won) and len(won) <= slots
+    mark = '✅' if ok else '❌'
+    print(f"   {mark} {len(won)} bookings, {unique} distinct slots, {in_db} booked in the database")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=os.getenv('DB_BACKEND', 'sqlite'))
+    parser.add_argument('--sqlite-path', default=os.getenv('SQLITE_PATH', 'parking_system1.db'))
+    parser.add_argument('--strategy', choices=['auto'] + list(STRATEGIES), default='auto')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--slots', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=300, help="booking attempts (more than --slots sells out)")
+    parser.add_argument('--pool-size', type=int, default=16)
+    parser.add_argument('--keep', action='store_true', help="leave the load-test slots in place")
+    args = parser.parse_args()
+
+    config = config_from_env()
+    config.update(DB_BACKEND=args.backend, SQLITE_PATH=args.sqlite_path)
+    backend = create_backend(config)
+    strategy = args.strategy
+    if strategy == 'auto':
+        strategy = 'skip_locked' if backend.name == 'mysql' else 'allocator'
+    print(f"🔗 Connecting to {backend.name} database...")
+    conn = backend.connect()
+    backend.init_schema(conn)
+    store = DataStore(backend, lambda: conn)
+    pool = ConnectionPool(backend.connect, ping=backend.ping, min_size=1, max_size=args.pool_size,
+                          timeout=30, name=backend.name)
+
+    print(f"🚀 Booking load test: {args.requests} requests, {args.threads} threads, {args.slots} slots at '{LOCATION}'")
+    print("-" * 75)
+    ok = True
+    try:
+        # Baseline: what book_slot did before -- read the list, try the first free slot once
+        user_id = prepare(store, args.slots)
+
+        def naive():
+            pooled = pool.acquire()
+            try:
+                local = DataStore(backend, lambda: pooled.raw)
+                free = [row for row in local.list_slots(LOCATION) if row[3] == 'available']
+                if not free:
+                    return None
+                slot_id, _, number, _ = min(free, key=lambda row: row[2])
+                if not local.book_slot(slot_id, LOCATION, number, user_id):
+                    raise BookingContention(f"lost slot {number}")
+                return slot_id
+            finally:
+                pool.release(pooled)
+
+        won, _, _ = run('single try (old book_slot)', args.requests, args.threads, naive)
+        ok &= check(store, won, args.slots)
+
+        # Booking engine
+        user_id = prepare(store, args.slots)
+        index = SlotIndex()
+        index.rebuild(store.list_all_slots())
+        engine = BookingEngine(backend, lambda: pool, lambda: index, strategy=strategy)
+        won, _, _ = run(f'booking engine ({strategy})', args.requests, args.threads,
+                        lambda: (engine.book_any(LOCATION, user_id) or (None,))[0])
+        ok &= check(store, won, args.slots)
+        print(f"   📊 {engine.stats()}")
+    finally:
+        if not args.keep:
+            cur = store.cursor()
+            cur.execute("DELETE FROM ParkingSlot WHERE location = %s", (LOCATION,))
+            store.commit()
+            cur.close()
+        pool.close()
+        conn.close()
+
+    print("-" * 75)
+    print("🎉 No slot was booked twice" if ok else "❌ Double booking detected")
+    return ok
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Occupancy History Benchmark
+Fills occupancy.OccupancySeries with a synthetic year of history for many
+locations (a daily and weekly pattern plus noise, one change every few
+minutes) and times the queries the API serves: curves over a day, a week and
+a year, for one location and for all of them, and the forecast. Needs no
+database.
+
+Usage:
+    python bench_occupancy.py
+    python bench_occupancy.py --locations 300 --days 365 --repeat 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from occupancy import OccupancySeries
+
+
+def synthetic_events(locations, days, now, seed=7):
+    """(names, codes, epochs, occupied, total) in time order, one change every ~5 minutes per location."""
+    rng = np.random.default_rng(seed)
+    per_location = days * 288
+    epochs = now - days * 86400 + np.sort(rng.uniform(0, days * 86400, (locations, per_location)), axis=1)
+    total = rng.integers(50, 5000, locations)[:, None]
+    hour = (epochs % 86400) / 3600
+    weekday = (epochs // 86400) % 7
+    level = 0.55 + 0.35 * np.sin((hour - 9) / 24 * 2 * np.pi) - 0.15 * (weekday >= 5)
+    occupied = np.clip(level + rng.normal(0, 0.05, level.shape), 0, 1) * total
+    order = np.argsort(epochs, axis=None, kind='stable')
+    codes = np.repeat(np.arange(locations), per_location)[order]
+    return ([f"location-{i}" for i in range(locations)], codes, epochs.ravel()[order],
+            occupied.astype(np.int64).ravel()[order], np.broadcast_to(total, epochs.shape).ravel()[order])
+
+
+def timed(label, repeat, call):
+    call()  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"   {label:<44} {elapsed * 1000:9.2f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365, help="history to generate and retain")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    now = time.time()
+    print(f"🧮 Generating {args.days} days of changes for {args.locations} locations...")
+    names, codes, epochs, occupied, total = synthetic_events(args.locations, args.days, now)
+    series = OccupancySeries(retention_days=args.days)
+    started = time.perf_counter()
+    series.load(names, codes, epochs, occupied, total, now=now)
+    print(f"✅ Loaded {len(codes):,} events in {time.perf_counter() - started:.2f}s "
+          f"({series.stats()['memory_mb']} MB of rollups)")
+
+    one = names[0]
+    print("🚀 Query latency (mean of --repeat runs):")
+    print("-" * 60)
+    timed("one location, last day, 1-minute steps", args.repeat,
+          lambda: series.curves(now - 86400, now, 1, location=one, now=now))
+    timed("one location, last week, 15-minute steps", args.repeat,
+          lambda: series.curves(now - 7 * 86400, now, 15, location=one, now=now))
+    timed("one location, whole history, hourly", args.repeat,
+          lambda: series.curves(now - args.days * 86400, now, 60, location=one, now=now))
+    timed(f"all {args.locations} locations, last day, 15-minute steps", args.repeat,
+          lambda: series.curves(now - 86400, now, 15, now=now))
+    timed(f"all {args.locations} locations, whole history, daily", args.repeat,
+          lambda: series.curves(now - args.days * 86400, now, 1440, now=now))
+    timed(f"all {args.locations} locations, whole history, hourly", args.repeat,
+          lambda: series.curves(now - args.days * 86400, now, 60, now=now, max_buckets=args.days * 24 + 1))
+    timed(f"forecast, next 3 hours, all {args.locations} locations", args.repeat,
+          lambda: series.forecast(3, now=now))
+    print("-" * 60)
+    print("🎉 Done")
+
+
+if __name__ == "__main__":
+    main()
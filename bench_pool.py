@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Connection Pool Benchmark
+Compares requests/sec for a connect-per-request pattern (what Flask-MySQLdb did)
+against checking connections out of db_pool.ConnectionPool.
+
+Usage: python bench_pool.py [--requests 2000] [--threads 16] [--pool-size 10]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+try:
+    import MySQLdb
+except ImportError:
+    print("❌ mysqlclient not installed! Please install it: pip install mysqlclient")
+    sys.exit(1)
+
+from db_pool import ConnectionPool
+
+def connect():
+    return MySQLdb.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'root'),
+        passwd=os.getenv('MYSQL_PASSWORD', 'kane@22*'),
+        db=os.getenv('MYSQL_DB', 'parking_system1'),
+        port=int(os.getenv('MYSQL_PORT', 3306)),
+    )
+
+def simulated_request(conn):
+    """Roughly what index() does: a couple of small reads."""
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM users")
+    cur.fetchone()
+    cur.execute("SELECT title, message, created_at FROM notifications ORDER BY created_at DESC LIMIT 10")
+    cur.fetchall()
+    cur.close()
+
+def run(label, total, threads, handle_one):
+    per_thread = total // threads
+    errors = []
+
+    def worker():
+        for _ in range(per_thread):
+            try:
+                handle_one()
+            except Exception as e:
+                errors.append(e)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    done = per_thread * threads - len(errors)
+    print(f"{label:<22} {done:>7} requests in {elapsed:6.2f}s  -> {done / elapsed:9.1f} req/s  ({len(errors)} errors)")
+    return done / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=10)
+    args = parser.parse_args()
+
+    print("🚀 Connection pool benchmark")
+    print(f"   requests={args.requests} threads={args.threads} pool_size={args.pool_size}")
+    print("-" * 50)
+
+    def per_request():
+        conn = connect()
+        try:
+            simulated_request(conn)
+        finally:
+            conn.close()
+
+    pool = ConnectionPool(connect, ping=lambda c: c.ping(),
+                          min_size=args.pool_size, max_size=args.pool_size, timeout=30)
+
+    def pooled():
+        pooled_conn = pool.acquire()
+        try:
+            simulated_request(pooled_conn.raw)
+        finally:
+            pool.release(pooled_conn)
+
+    before = run("connect per request", args.requests, args.threads, per_request)
+    after = run("connection pool", args.requests, args.threads, pooled)
+    print("-" * 50)
+    print(f"📊 Speedup: {after / before:.2f}x")
+    print(f"📊 Pool stats: {pool.stats()}")
+    pool.close()
+
+if __name__ == "__main__":
+    main()
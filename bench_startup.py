@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Times what a freshly booted worker pays before it serves traffic: the cold
+import of app.py, then the first requests (/healthz, /readyz which opens the
+pool and loads the slot index, and the homepage twice). Each repeat is a new
+interpreter, so nothing is warm but the OS file cache.
+
+Fails (exit code 1) if importing app.py opens a database connection or
+starts a thread, which would make the module unsafe to preload in a pre-fork
+server.
+
+Usage:
+    python bench_startup.py
+    DB_BACKEND=sqlite SQLITE_PATH=parking_system1.db python bench_startup.py --repeat 10 --imports 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+FIRST_REQUESTS = ['/healthz', '/readyz', '/', '/']
+
+
+def child():
+    import logging
+    import threading
+    started = time.perf_counter()
+    import app as web
+    result = {
+        'import_ms': (time.perf_counter() - started) * 1000,
+        'threads_after_import': threading.active_count(),
+        'pool_after_import': web._pool is not None,
+        'requests': [],
+    }
+    logging.disable(logging.WARNING)
+    client = web.app.test_client()
+    for path in FIRST_REQUESTS:
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        result['requests'].append((path, status, (time.perf_counter() - started) * 1000))
+    print("RESULT " + json.dumps(result))
+
+
+def slowest_imports(count):
+    """(cumulative ms, module) of the slowest imports under app, from -X importtime."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        depth = (len(module) - len(module.lstrip())) // 2
+        if depth == 1 or module.strip() == 'app':  # app and what it imports directly
+            timings.append((int(cumulative) / 1000, module.strip()))
+    return sorted(timings, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument('--imports', type=int, default=8, help="slowest imports to list (0 to skip)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return True
+
+    print(f"🚀 Startup benchmark ({args.repeat} fresh interpreters)")
+    runs = []
+    for _ in range(args.repeat):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith('RESULT ')]
+        if not lines:
+            print(f"❌ Child failed:\n{output.stderr[-2000:]}")
+            return False
+        runs.append(json.loads(lines[-1][len('RESULT '):]))
+
+    print("-" * 60)
+    imports = [run['import_ms'] for run in runs]
+    print(f"   {'cold import of app.py':<34} {statistics.median(imports):8.1f} ms (min {min(imports):.1f})")
+    for i, path in enumerate(FIRST_REQUESTS):
+        times = [run['requests'][i][2] for run in runs]
+        statuses = sorted({run['requests'][i][1] for run in runs})
+        label = f"{'first' if FIRST_REQUESTS.index(path) == i else 'second'} GET {path}"
+        print(f"   {label:<34} {statistics.median(times):8.1f} ms (status {', '.join(map(str, statuses))})")
+    if args.imports:
+        print("-" * 60)
+        print("📊 Slowest imports (cumulative):")
+        for ms, module in slowest_imports(args.imports):
+            print(f"   {module:<34} {ms:8.1f} ms")
+    print("-" * 60)
+
+    leaks = [run for run in runs if run['pool_after_import'] or run['threads_after_import'] > 1]
+    if leaks:
+        print(f"❌ Importing app.py opened the connection pool or started threads "
+              f"({leaks[0]['threads_after_import']} threads running) -- not safe to preload")
+        return False
+    print("✅ Import opens no connections and starts no threads (safe to preload)")
+    return True
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Storage Query Path Benchmark
+Times the DataStore read paths used by the web app against either backend.
+
+Usage:
+    python bench_storage.py --backend sqlite --sqlite-path parking_system1.db
+    python bench_storage.py --backend mysql
+"""
+
+import argparse
+import os
+import time
+
+from storage import create_backend, config_from_env, DataStore
+
+QUERY_PATHS = [
+    ('count_users', lambda store: store.count_users()),
+    ('notifications_feed', lambda store: store.notifications_feed()),
+    ('list_features', lambda store: store.list_features()),
+    ('list_guidelines', lambda store: store.list_guidelines()),
+    ('list_slots(mall)', lambda store: store.list_slots('mall')),
+    ('get_user_by_email', lambda store: store.get_user_by_email('john@example.com')),
+    ('dashboard_summary', lambda store: store.dashboard_summary()),
+    ('revenue_report(day)', lambda store: store.revenue_report()),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=os.getenv('DB_BACKEND', 'sqlite'))
+    parser.add_argument('--sqlite-path', default=os.getenv('SQLITE_PATH', 'parking_system1.db'))
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    config = config_from_env()
+    config.update(DB_BACKEND=args.backend, SQLITE_PATH=args.sqlite_path)
+    backend = create_backend(config)
+    conn = backend.connect()
+    backend.init_schema(conn)
+    store = DataStore(backend, lambda: conn)
+
+    print(f"🚀 Benchmarking {backend.name} query paths ({args.iterations} iterations each)")
+    print("-" * 60)
+    for label, query in QUERY_PATHS:
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            query(store)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<22} {elapsed / args.iterations * 1e6:9.1f} µs/query  {args.iterations / elapsed:10.0f} q/s")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
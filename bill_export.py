@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Batch Bill Export
+Streams many bills at once, either as a ZIP of per-payment PDFs or as one
+multi-page PDF, for month-end reconciliation. Rows come from
+DataStore.iter_bill_data in chunks and PDFs from the native generator, so
+memory stays bounded by one chunk plus one bill.
+
+Usage:
+    python bill_export.py --from 2024-06-01 --to 2024-06-30 -o june.zip
+    python bill_export.py --ids 12,15,19 --format pdf -o bills.pdf
+"""
+
+import argparse
+import datetime
+import sys
+import zipfile
+
+import pdf_bill
+
+FORMATS = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+}
+
+
+def selection(date_from=None, date_to=None, ids=None):
+    """iter_bill_data kwargs from request/CLI strings (dates inclusive, ids comma separated).
+
+    Raises ValueError for malformed input or an empty selection.
+    """
+    if ids:
+        try:
+            payment_ids = [int(part) for part in ids.split(',') if part.strip()]
+        except ValueError:
+            raise ValueError("ids must be a comma separated list of payment ids")
+        return {'payment_ids': payment_ids}
+    if not date_from or not date_to:
+        raise ValueError("Give either ids or both from and to dates (YYYY-MM-DD)")
+    start = datetime.date.fromisoformat(date_from)
+    end = datetime.date.fromisoformat(date_to)
+    if end < start:
+        raise ValueError("to date is before from date")
+    return {'date_from': start, 'date_to': end + datetime.timedelta(days=1)}
+
+
+class _StreamSink:
+    """Write-only file object for zipfile that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(rows):
+    """ZIP archive bytes, one bill_<id>.pdf per row, yielded a file at a time."""
+    sink = _StreamSink()
+    # zipfile falls back to data descriptors on a non-seekable sink, so
+    # nothing is ever rewritten and each chunk can go straight out
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for row in rows:
+            fields = pdf_bill.bill_fields(row)
+            info = zipfile.ZipInfo(f"bill_{fields['payment_id']}.pdf", date_time=_zip_time(row[7]))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, pdf_bill.render_bill(fields))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _zip_time(created_at):
+    if not isinstance(created_at, datetime.datetime) or created_at.year < 1980:
+        created_at = datetime.datetime.now()
+    return created_at.timetuple()[:6]
+
+
+def pdf_stream(rows):
+    """One multi-page PDF, one bill per page."""
+    return pdf_bill.render_bills(pdf_bill.bill_fields(row) for row in rows)
+
+
+def export_stream(rows, fmt):
+    if fmt == 'zip':
+        return zip_stream(rows)
+    if fmt == 'pdf':
+        return pdf_stream(rows)
+    raise ValueError(f"Unknown export format '{fmt}' (expected zip or pdf)")
+
+
+def main():
+    from storage import create_backend, config_from_env, DataStore
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from', dest='date_from', help="first day (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='date_to', help="last day, inclusive (YYYY-MM-DD)")
+    parser.add_argument('--ids', help="comma separated payment ids instead of a date range")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='zip')
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+
+    try:
+        kwargs = selection(args.date_from, args.date_to, args.ids)
+    except ValueError as e:
+        parser.error(str(e))
+
+    backend = create_backend(config_from_env())
+    print(f"🔗 Connecting to {backend.name} database...")
+    conn = backend.connect()
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    try:
+        backend.init_schema(conn)
+        store = DataStore(backend, lambda: conn)
+        with open(args.output, 'wb') as f:
+            for chunk in export_stream(counted(store.iter_bill_data(**kwargs)), args.format):
+                f.write(chunk)
+        print(f"✅ Exported {count} bills to {args.output}")
+        return True
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
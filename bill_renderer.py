@@ -0,0 +1,275 @@
+"""
+Bill Renderer
+Renders bill PDFs off the request path in a bounded process pool and keeps
+them content-addressed on disk:
+
+    <storage_dir>/<aa>/<sha256 of bill html>.pdf   the PDF
+    <storage_dir>/payments/<payment id>            digest of that payment's bill
+
+Repeat downloads of a payment's bill are served straight from the file.
+
+Engines:
+    wkhtmltopdf - renders bill.html; each run happens in a worker process,
+                  so a slow render only occupies a pool slot, never a web worker
+    native      - pdf_bill.render_bill, fast enough to run inline in the request
+"""
+
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pdf_bill
+
+WKHTMLTOPDF_PATHS = [
+    '/usr/local/bin/wkhtmltopdf',
+    '/usr/bin/wkhtmltopdf',
+    'C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe',
+]
+
+PDF_OPTIONS = {'page-size': 'A4', 'encoding': 'UTF-8'}
+
+ENGINES = ('wkhtmltopdf', 'native')
+
+
+class QueueFull(Exception):
+    """Raised when the render queue already holds max_pending jobs."""
+
+
+def find_wkhtmltopdf():
+    """Path of the wkhtmltopdf binary, or None if pdfkit or the binary is missing."""
+    try:
+        import pdfkit  # noqa: F401
+    except ImportError:
+        return None
+    for path in [os.getenv('WKHTMLTOPDF_PATH', '')] + WKHTMLTOPDF_PATHS:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def render_with_wkhtmltopdf(html, target, wkhtmltopdf):
+    """Worker entry point: render html to the PDF file at target. Returns its size."""
+    import pdfkit
+    config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf)
+    pdf = pdfkit.from_string(html, False, configuration=config, options=PDF_OPTIONS)
+    _write_atomic(target, pdf)
+    return len(pdf)
+
+
+class BillJob:
+    def __init__(self, job_id, payment_id, digest):
+        self.id = job_id
+        self.payment_id = payment_id
+        self.digest = digest
+        self.status = 'queued'  # queued -> done | failed
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'payment_id': self.payment_id,
+            'status': self.status,
+            'error': self.error,
+            'render_ms': round((self.finished_at - self.submitted_at) * 1000, 1) if self.finished_at else None,
+        }
+
+
+class BillRenderer:
+    """Bounded render queue in front of a process pool.
+
+    workers: render processes; max_pending: jobs queued or rendering before
+    submit() raises QueueFull. The pool is started on the first wkhtmltopdf
+    submit; the native engine never needs it.
+    """
+
+    def __init__(self, storage_dir, engine='wkhtmltopdf', workers=2, max_pending=32, wkhtmltopdf=None,
+                 keep_jobs=1024):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown bill engine '{engine}' (expected one of {', '.join(ENGINES)})")
+        self.storage_dir = storage_dir
+        self.engine = engine
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wkhtmltopdf = wkhtmltopdf
+        self.keep_jobs = keep_jobs
+        self._executor = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = OrderedDict()
+        self._pending = {}  # digest -> job currently queued or rendering
+        self._rendered = 0
+        self._failed = 0
+        self._rejected = 0
+        self._reused = 0
+
+    @property
+    def available(self):
+        return self.engine == 'native' or self.wkhtmltopdf is not None
+
+    # ----------------- Storage -----------------
+    def _pdf_path(self, digest):
+        return os.path.join(self.storage_dir, digest[:2], digest + '.pdf')
+
+    def _pointer_path(self, payment_id):
+        return os.path.join(self.storage_dir, 'payments', str(int(payment_id)))
+
+    def pdf_path(self, payment_id):
+        """Stored PDF for a payment, or None if it has not been rendered yet."""
+        try:
+            with open(self._pointer_path(payment_id)) as f:
+                digest = f.read().strip()
+        except (FileNotFoundError, ValueError):
+            return None
+        path = self._pdf_path(digest)
+        return path if os.path.isfile(path) else None
+
+    # ----------------- Jobs -----------------
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: forking a threaded web worker can copy held locks into the child
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep_jobs:
+            self._jobs.popitem(last=False)
+
+    def submit(self, fields, render_html):
+        """Render the bill for fields (the bill.html context) and return its BillJob.
+
+        render_html(fields) is only called by the wkhtmltopdf engine. Native
+        bills are finished when this returns; wkhtmltopdf bills are queued,
+        and identical bills share one PDF file and one in-flight job.
+        """
+        payment_id = fields['payment_id']
+        if self.engine == 'native':
+            return self._render_native(payment_id, fields)
+        html = render_html(fields)
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        target = self._pdf_path(digest)
+        with self._lock:
+            job = BillJob(str(next(self._ids)), int(payment_id), digest)
+            if os.path.isfile(target):
+                self._reused += 1
+                self._finish(job, None)
+                self._remember(job)
+                return job
+            if digest in self._pending:
+                return self._pending[digest]
+            if len(self._pending) >= self.max_pending:
+                self._rejected += 1
+                raise QueueFull(f"{len(self._pending)} bills already queued")
+            self._pending[digest] = job
+            self._remember(job)
+            try:
+                future = self._get_executor().submit(render_with_wkhtmltopdf, html, target, self.wkhtmltopdf)
+            except Exception:
+                del self._pending[digest]
+                raise
+        future.add_done_callback(lambda f: self._on_rendered(job, f))
+        return job
+
+    def _render_native(self, payment_id, fields):
+        pdf = pdf_bill.render_bill(fields)
+        digest = hashlib.sha256(pdf).hexdigest()
+        target = self._pdf_path(digest)
+        job = BillJob(None, int(payment_id), digest)
+        error = None
+        if os.path.isfile(target):
+            reused = True
+        else:
+            reused = False
+            try:
+                _write_atomic(target, pdf)
+            except OSError as e:
+                error = e
+        with self._lock:
+            job.id = str(next(self._ids))
+            if error is not None:
+                self._failed += 1
+            elif reused:
+                self._reused += 1
+            else:
+                self._rendered += 1
+            self._finish(job, error)
+            self._remember(job)
+        return job
+
+    def _on_rendered(self, job, future):
+        error = future.exception()
+        with self._lock:
+            self._pending.pop(job.digest, None)
+            if error is None:
+                self._rendered += 1
+            else:
+                self._failed += 1
+                logging.error(f"Bill render for payment {job.payment_id} failed: {error}")
+            self._finish(job, error)
+
+    def _finish(self, job, error):
+        if error is None:
+            try:
+                _write_atomic(self._pointer_path(job.payment_id), job.digest.encode())
+                job.status = 'done'
+            except OSError as e:
+                error = e
+        if error is not None:
+            job.status = 'failed'
+            job.error = str(error)
+        job.finished_at = time.time()
+        job._done.set()
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': self.available,
+                'engine': self.engine,
+                'workers': self.workers,
+                'pending': len(self._pending),
+                'max_pending': self.max_pending,
+                'rendered': self._rendered,
+                'reused': self._reused,
+                'failed': self._failed,
+                'rejected': self._rejected,
+            }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
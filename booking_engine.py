@@ -0,0 +1,197 @@
+"""
+Booking Engine
+"Book any available slot at a location" under contention.
+
+Two ways to pick the slot:
+
+- skip_locked (MySQL 8+): the database chooses. SELECT ... FOR UPDATE SKIP
+  LOCKED hands each concurrent transaction a different available row, so a
+  burst for one location books different slots in parallel instead of
+  queueing on (and then losing) the same one.
+- allocator (SQLite, older MySQL): this process chooses. Candidates come
+  from the in-memory slot index, starting at a random position so other
+  processes rarely pick the same slot, and a slot another request thread
+  is already claiming is never handed out twice. The booking itself is the
+  usual guarded UPDATE ... WHERE status = 'available', so other processes
+  can still only ever lose a race, never double-book.
+
+The index is only a hint: after a lost race, or when it has nothing left,
+the database picks (DataStore.claim_any_slot) and has the final word on
+whether the location is sold out. A lost race is retried straight away; a
+lock error (lock wait timeout, deadlock, SQLite busy) is retried with
+jittered exponential backoff. Conflict, retry and lock-wait counters are
+exported through stats().
+"""
+
+import logging
+import random
+import threading
+import time
+
+from storage import DataStore
+
+STRATEGIES = ('skip_locked', 'allocator')
+
+_LOCK_ERROR = object()
+
+
+class BookingContention(Exception):
+    """Raised when a slot could not be booked within max_attempts."""
+
+
+class BookingEngine:
+    """Books any available slot at a location.
+
+    get_pool: callable returning the db_pool.ConnectionPool to book through.
+    get_index: callable returning a loaded slot_index.SlotIndex (required for
+    the allocator strategy; kept in sync with successful bookings either way).
+    """
+
+    def __init__(self, backend, get_pool, get_index, strategy='allocator', max_attempts=5,
+                 backoff=0.005, max_backoff=0.2):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown booking strategy '{strategy}' (expected one of {', '.join(STRATEGIES)})")
+        self.backend = backend
+        self._get_pool = get_pool
+        self._get_index = get_index
+        self.strategy = strategy
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)  # an in-flight claim finished
+        self._inflight = {}  # location -> slot ids being claimed by threads of this process
+        self._requests = 0
+        self._booked = 0
+        self._sold_out = 0
+        self._conflicts = 0
+        self._lock_errors = 0
+        self._retries = 0
+        self._failures = 0
+        self._attempts_max = 0
+        self._claims = 0
+        self._lock_wait_total = 0.0
+        self._lock_wait_max = 0.0
+
+    def book_any(self, location, user_id, reserved_until=None):
+        """Book one available slot at location for user_id.
+
+        Returns (slot_id, slot_number), or None when the location has no
+        available slot. Raises BookingContention after max_attempts lost races
+        or lock errors.
+        """
+        with self._lock:
+            self._requests += 1
+        use_index = self.strategy == 'allocator'
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                slot = self._claim_allocated(location, user_id, reserved_until) if use_index else None
+                if slot is None:
+                    slot = self._claim_from_db(location, user_id, reserved_until)
+            except self.backend.OperationalError as e:
+                logging.warning(f"Booking at '{location}' hit a lock error (attempt {attempt}): {e}")
+                slot = _LOCK_ERROR
+
+            if slot is None or (slot and slot is not _LOCK_ERROR):
+                with self._lock:
+                    self._attempts_max = max(self._attempts_max, attempt)
+                    if slot is None:
+                        self._sold_out += 1
+                    else:
+                        self._booked += 1
+                if slot is not None:
+                    self._get_index().set_status(slot[0], 'booked')
+                return slot
+
+            with self._lock:
+                if slot is _LOCK_ERROR:
+                    self._lock_errors += 1
+                else:
+                    self._conflicts += 1
+                if attempt < self.max_attempts:
+                    self._retries += 1
+            if attempt < self.max_attempts and slot is _LOCK_ERROR:
+                # Full jitter: losers of the same race spread out instead of colliding again
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+            # Our view was stale or contended; let the database pick from here on
+            use_index = False
+        with self._lock:
+            self._failures += 1
+            self._attempts_max = max(self._attempts_max, self.max_attempts)
+        raise BookingContention(f"No slot at '{location}' could be booked after {self.max_attempts} attempts")
+
+    # ----------------- Strategies -----------------
+    def _with_store(self, work):
+        pool = self._get_pool()
+        pooled = pool.acquire()
+        broken = False
+        try:
+            return work(DataStore(self.backend, lambda: pooled.raw))
+        except self.backend.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.release(pooled, broken=broken)
+
+    def _timed(self, call):
+        """Run a claiming statement and record how long it waited on locks."""
+        started = time.perf_counter()
+        try:
+            return call()
+        finally:
+            waited = time.perf_counter() - started
+            with self._lock:
+                self._claims += 1
+                self._lock_wait_total += waited
+                self._lock_wait_max = max(self._lock_wait_max, waited)
+
+    def _claim_from_db(self, location, user_id, reserved_until):
+        """(slot_id, slot_number), None when sold out, False when the picked slot was taken first."""
+        return self._with_store(lambda store: self._timed(
+            lambda: store.claim_any_slot(location, user_id, reserved_until)))
+
+    def _claim_allocated(self, location, user_id, reserved_until):
+        """Book a slot picked from the index: (slot_id, slot_number), None if the
+        index has nothing free, False if the slot was booked elsewhere."""
+        index = self._get_index()
+        start = random.getrandbits(32)
+        with self._lock:
+            inflight = self._inflight.setdefault(location, set())
+            while True:
+                candidate = index.first_available(location, exclude=inflight, start=start)
+                if candidate is not None:
+                    break
+                if not inflight:
+                    return None
+                # The last free slots are being claimed; one may yet fail and come back
+                self._settled.wait()
+            inflight.add(candidate[0])
+        slot_id, slot_number = candidate
+        try:
+            won = self._with_store(lambda store: self._timed(
+                lambda: store.book_slot(slot_id, location, slot_number, user_id, reserved_until=reserved_until)))
+            # Either we hold it now or it was booked elsewhere (another process, or the
+            # index was stale); mark it before other threads may pick it again
+            index.set_status(slot_id, 'booked')
+        finally:
+            with self._lock:
+                inflight.discard(slot_id)
+                self._settled.notify_all()
+        return candidate if won else False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'strategy': self.strategy,
+                'requests': self._requests,
+                'booked': self._booked,
+                'sold_out': self._sold_out,
+                'conflicts': self._conflicts,
+                'lock_errors': self._lock_errors,
+                'retries': self._retries,
+                'failures': self._failures,
+                'attempts_max': self._attempts_max,
+                'lock_wait_avg_ms': round(self._lock_wait_total / self._claims * 1000, 3) if self._claims else 0.0,
+                'lock_wait_max_ms': round(self._lock_wait_max * 1000, 3),
+                'inflight': sum(len(ids) for ids in self._inflight.values()),
+            }
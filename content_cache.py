@@ -0,0 +1,209 @@
+"""
+Content Cache
+Read-through TTL cache for admin-managed content (features, guidelines,
+notifications) with explicit invalidation on the admin write paths.
+
+Backends:
+    LRUCache  - in-process, per worker
+    FileCache - shared directory of pickled entries; every worker on the host
+                sees the same entries and the same invalidations
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    name = 'lru'
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache:
+    """Entries stored as pickles in a shared directory (atomic replace on write)."""
+
+    name = 'file'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            logging.warning(f"Discarding unreadable cache entry '{key}': {e}")
+            self.delete(key)
+            return _MISSING
+        if expires_at < time.time():
+            self.delete(key)
+            return _MISSING
+        return value
+
+    def set(self, key, value, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((time.time() + ttl, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.cache'):
+                try:
+                    os.unlink(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+
+
+class ContentCache:
+    """Read-through cache with hit/miss counters.
+
+    A backend of None disables caching (every call goes to the loader).
+    """
+
+    def __init__(self, backend, default_ttl=300):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._errors = 0
+
+    def get_or_load(self, key, loader, ttl=None):
+        value = self._get(key)
+        if value is _MISSING:
+            value = loader()
+            self._set(key, value, ttl)
+        return value
+
+    async def get_or_load_async(self, key, loader, ttl=None):
+        """get_or_load() for the ASGI entry point: loader is a coroutine function."""
+        value = self._get(key)
+        if value is _MISSING:
+            value = await loader()
+            self._set(key, value, ttl)
+        return value
+
+    def _get(self, key):
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                logging.error(f"Content cache read failed for '{key}': {e}")
+                value = _MISSING
+                self._count('_errors')
+            if value is not _MISSING:
+                self._count('_hits')
+                return value
+        self._count('_misses')
+        return _MISSING
+
+    def _set(self, key, value, ttl):
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, self.default_ttl if ttl is None else ttl)
+            except Exception as e:
+                logging.error(f"Content cache write failed for '{key}': {e}")
+                self._count('_errors')
+
+    def invalidate(self, *keys):
+        if self.backend is None:
+            return
+        for key in keys:
+            try:
+                self.backend.delete(key)
+            except Exception as e:
+                logging.error(f"Content cache invalidation failed for '{key}': {e}")
+                self._count('_errors')
+        self._count('_invalidations', len(keys))
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': self.backend.name if self.backend is not None else 'none',
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self._invalidations,
+                'errors': self._errors,
+            }
+
+
+def create_content_cache(config):
+    """Build the cache selected by config['CONTENT_CACHE_BACKEND'] ('lru', 'file' or 'none')."""
+    kind = (config.get('CONTENT_CACHE_BACKEND') or 'lru').lower()
+    ttl = float(config.get('CONTENT_CACHE_TTL', 300))
+    if kind == 'none':
+        backend = None
+    elif kind == 'lru':
+        backend = LRUCache(int(config.get('CONTENT_CACHE_MAX_ENTRIES', 256)))
+    elif kind == 'file':
+        backend = FileCache(config.get('CONTENT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'parking_content_cache'))
+    else:
+        raise ValueError(f"Unknown CONTENT_CACHE_BACKEND '{kind}' (expected 'lru', 'file' or 'none')")
+    return ContentCache(backend, default_ttl=ttl)
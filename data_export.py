@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Table Export
+Streams payments, ParkingSlot and users rows out as CSV or Parquet without
+loading a table into memory: rows arrive in chunks from a server-side cursor
+(DataStore.iter_export) and each chunk is encoded and written on its own.
+Parquet needs the optional pyarrow package; every chunk becomes a row group.
+
+Exports are resumable by id range: rows are written in id order, so an
+interrupted export continues from the last id it wrote.
+
+Usage:
+    python data_export.py payments -o payments.csv
+    python data_export.py payments -o payments.csv --resume
+    python data_export.py slots --format parquet -o slots.parquet --start-id 1 --end-id 5000
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import logging
+import os
+import sys
+
+from storage import EXPORT_TABLES
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Parquet column types by column name; anything not listed is a string
+_INT_COLUMNS = {'id', 'user_id', 'slot_number', 'level', 'hours'}
+_FLOAT_COLUMNS = {'amount'}
+_TIMESTAMP_COLUMNS = {'created_at', 'updated_at'}
+
+
+def csv_stream(columns, chunks, header=True):
+    """CSV text (utf-8 bytes), one yield per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _StreamSink:
+    """Write-only, position-tracking file object that hands bytes back to a generator."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(pa, columns):
+    fields = []
+    for column in columns:
+        if column in _INT_COLUMNS:
+            fields.append(pa.field(column, pa.int64()))
+        elif column in _FLOAT_COLUMNS:
+            fields.append(pa.field(column, pa.float64()))
+        elif column in _TIMESTAMP_COLUMNS:
+            fields.append(pa.field(column, pa.timestamp('s')))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _arrow_value(column, value):
+    if value is None:
+        return None
+    if column in _FLOAT_COLUMNS:
+        return float(value)  # Decimal from MySQL
+    if column in _TIMESTAMP_COLUMNS:
+        return value if isinstance(value, datetime.datetime) else None
+    if column not in _INT_COLUMNS and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_stream(columns, chunks):
+    """Parquet file bytes, one row group (and one yield) per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = _arrow_schema(pa, columns)
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in chunks:
+            data = {column: [_arrow_value(column, row[i]) for row in rows] for i, column in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_stream(name, chunks, fmt, header=True):
+    columns = EXPORT_TABLES[name]['columns']
+    if fmt == 'csv':
+        return csv_stream(columns, chunks, header=header)
+    if fmt == 'parquet':
+        return parquet_stream(columns, chunks)
+    raise ValueError(f"Unknown export format '{fmt}' (expected csv or parquet)")
+
+
+def tracked(chunks, progress):
+    """Pass chunks through, recording the id of the last row handed on in progress['last_id']."""
+    for rows in chunks:
+        if rows:
+            progress['last_id'] = rows[-1][0]
+        yield rows
+
+
+def fail_loudly(name, stream, fmt, progress):
+    """Pass an HTTP export stream through. If it fails part way, a CSV gets a
+    last line saying where to resume, and the error is re-raised so the
+    server aborts the response rather than ending it like a complete file
+    (a Parquet file is left without its footer, so readers reject it)."""
+    try:
+        yield from stream
+    except Exception as e:
+        last_id = progress.get('last_id')
+        logging.error(f"Export of {name} failed after id {last_id}: {e}")
+        if fmt == 'csv':
+            resume = f"start_id={last_id + 1}" if last_id is not None else "the same range"
+            yield f"# EXPORT FAILED: rows after id {last_id} are missing; export again from {resume}\n".encode('utf-8')
+        raise
+
+
+def last_exported_id(path):
+    """Id in the last complete row of a CSV export, or None if it has no rows."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        f.seek(max(0, end - 64 * 1024))
+        tail = f.read().decode('utf-8', errors='replace')
+    if not tail.endswith('\n'):
+        raise ValueError(f"{path} ends with a partial row; truncate it to the last full line first")
+    for line in reversed(tail.splitlines()):
+        first = line.split(',', 1)[0]
+        if first.isdigit():
+            return int(first)
+    return None
+
+
+def main():
+    from storage import create_backend, config_from_env, DataStore
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('table', choices=sorted(EXPORT_TABLES))
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--start-id', type=int)
+    parser.add_argument('--end-id', type=int)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--resume', action='store_true', help="append to an existing CSV after its last id")
+    args = parser.parse_args()
+
+    start_id, mode, header = args.start_id, 'wb', True
+    if args.resume:
+        if args.format != 'csv':
+            parser.error("--resume works on CSV exports; for Parquet export the remaining range with --start-id")
+        if os.path.exists(args.output):
+            try:
+                last_id = last_exported_id(args.output)
+            except ValueError as e:
+                parser.error(str(e))
+            if last_id is not None:
+                start_id = last_id + 1
+            mode, header = 'ab', os.path.getsize(args.output) == 0
+
+    backend = create_backend(config_from_env())
+    print(f"🔗 Connecting to {backend.name} database...")
+    conn = backend.connect()
+    count = 0
+
+    def counted(chunks):
+        nonlocal count
+        for rows in chunks:
+            count += len(rows)
+            yield rows
+
+    try:
+        backend.init_schema(conn)
+        store = DataStore(backend, lambda: conn)
+        chunks = store.iter_export(args.table, start_id, args.end_id, args.chunk_size)
+        print(f"📤 Exporting {args.table} from id {start_id or 'start'} to {args.end_id or 'end'}...")
+        with open(args.output, mode) as f:
+            for data in export_stream(args.table, counted(chunks), args.format, header=header):
+                f.write(data)
+                f.flush()
+        print(f"✅ Exported {count} rows to {args.output}")
+        return True
+    except Exception as e:
+        print(f"❌ Export failed after {count} rows: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
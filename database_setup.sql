@@ -1,11 +1,22 @@
 -- Parking Management System Database Setup
--- Run this script in MySQL to create all necessary tables
+-- Run this script in MySQL to create the base tables, then apply the schema
+-- migrations (newer tables, columns and indexes) on top of it:
+--     mysql -u root -p < database_setup.sql
+--     python setup_database.py --migrate
+-- The app does not migrate on startup; without the second step payments,
+-- reservations, locations and occupancy history fail at runtime.
 
 -- Create database if not exists
 CREATE DATABASE IF NOT EXISTS parking_system1;
 USE parking_system1;
 
--- Drop existing tables if they exist (for clean setup)
+-- Drop existing tables if they exist (for clean setup); schema_migrations
+-- goes too, so --migrate re-applies every migration to the fresh tables
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS occupancy_events;
+DROP TABLE IF EXISTS reservations;
+DROP TABLE IF EXISTS locations;
+DROP TABLE IF EXISTS revenue_rollup;
 DROP TABLE IF EXISTS payments;
 DROP TABLE IF EXISTS ParkingSlot;
 DROP TABLE IF EXISTS notifications;
@@ -62,11 +73,23 @@ CREATE TABLE payments (
     amount DECIMAL(10,2) NOT NULL,
     payment_type ENUM('cash', 'card', 'online') NOT NULL,
     payment_status ENUM('pending', 'completed', 'failed') DEFAULT 'completed',
+    location VARCHAR(100) NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Create Revenue Rollup Table (maintained by process_payment, rebuilt by: python revenue.py backfill)
+CREATE TABLE revenue_rollup (
+    day DATE NOT NULL,
+    location VARCHAR(100) NOT NULL,
+    vehicle_type VARCHAR(20) NOT NULL,
+    payment_type VARCHAR(20) NOT NULL,
+    payment_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, location, vehicle_type, payment_type)
+);
+
 -- Create Notifications Table
 CREATE TABLE notifications (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -135,6 +158,18 @@ INSERT INTO ParkingSlot (location, slot_number, status) VALUES
 ('office', 9, 'available'),
 ('office', 10, 'available'),
 
+-- Airport Parking
+('airport', 1, 'available'),
+('airport', 2, 'available'),
+('airport', 3, 'available'),
+('airport', 4, 'available'),
+('airport', 5, 'available'),
+('airport', 6, 'available'),
+('airport', 7, 'available'),
+('airport', 8, 'available'),
+('airport', 9, 'available'),
+('airport', 10, 'available'),
+
 -- Hospital Parking
 ('hospital', 1, 'available'),
 ('hospital', 2, 'available'),
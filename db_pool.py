@@ -0,0 +1,205 @@
+"""
+Database Connection Pool
+A bounded, thread-safe pool of DB-API connections used behind get_db().
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class _PooledConnection:
+    """Bookkeeping wrapper around a raw DB-API connection."""
+
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Bounded connection pool.
+
+    connect: zero-argument callable returning a new DB-API connection.
+    ping: callable(conn) that raises if the connection is no longer usable.
+    min_size connections are opened eagerly; at most max_size exist at once.
+    Connections older than max_lifetime seconds are closed and replaced on
+    checkout, and idle connections are health-checked before being handed out.
+    """
+
+    def __init__(self, connect, ping=None, min_size=1, max_size=10,
+                 timeout=5.0, max_lifetime=3600.0, name='mysql'):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (min_size, max_size))
+        self._connect = connect
+        self._ping = ping
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.name = name
+
+        self._idle = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._closed = False
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(min_size):
+            try:
+                self._idle.append(self._open())
+            except Exception as e:
+                logging.error(f"Pool '{name}' could not open initial connection: {e}")
+                break
+
+    # -------------------------
+    # Internal helpers
+    # -------------------------
+    def _open(self):
+        raw = self._connect()
+        with self._lock:
+            self._size += 1
+        return _PooledConnection(raw)
+
+    def _discard(self, pooled):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._available.notify()
+
+    def _expired(self, pooled, now):
+        return self.max_lifetime and now - pooled.created_at > self.max_lifetime
+
+    def _healthy(self, pooled):
+        if self._ping is None:
+            return True
+        try:
+            self._ping(pooled.raw)
+            return True
+        except Exception as e:
+            logging.warning(f"Pool '{self.name}' dropped unhealthy connection: {e}")
+            return False
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def acquire(self, timeout=None):
+        """Check out a connection, waiting up to timeout seconds for one."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            pooled = None
+            create = False
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout(f"Pool '{self.name}' is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {timeout}s waiting for a connection from pool '{self.name}'"
+                        )
+                    self._available.wait(remaining)
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+                pooled = _PooledConnection(raw)
+            else:
+                now = time.monotonic()
+                if self._expired(pooled, now):
+                    with self._lock:
+                        self._recycled += 1
+                    self._discard(pooled)
+                    continue
+                if not self._healthy(pooled):
+                    with self._lock:
+                        self._failed_health_checks += 1
+                    self._discard(pooled)
+                    continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            pooled.last_used = time.monotonic()
+            return pooled
+
+    def release(self, pooled, broken=False):
+        """Return a checked-out connection to the pool."""
+        if pooled is None:
+            return
+        if not broken:
+            try:
+                # Never hand out a connection with a half-finished transaction
+                pooled.raw.rollback()
+            except Exception:
+                broken = True
+        if broken or self._closed or self._expired(pooled, time.monotonic()):
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._available.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        """Snapshot of pool metrics."""
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'name': self.name,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'failed_health_checks': self._failed_health_checks,
+                'wait_avg_ms': round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Runs every DataStore query the web app issues, EXPLAINs each statement and
+fails (exit code 1) if any of them does a full table scan.
+
+Reads are executed for real so multi-step methods see real rows; writes are
+only captured and EXPLAINed, never executed. Run it against a database with
+realistic row counts -- on near-empty tables MySQL may legitimately prefer
+a scan over an index.
+
+Usage:
+    python explain_check.py                      # backend from DB_BACKEND etc.
+    DB_BACKEND=sqlite SQLITE_PATH=parking_system1.db python explain_check.py
+"""
+
+import datetime
+import sys
+
+from storage import create_backend, config_from_env, DataStore
+
+# Statements that scan on purpose, matched by substring -> reason
+ALLOWED_SCANS = {
+    'SELECT id, location, slot_number, status, user_id FROM ParkingSlot': "slot index rebuild reads every slot by design",
+    'FROM revenue_rollup': "rollup table is small by construction (days x dimensions)",
+}
+
+# (label, DataStore call) pairs covering every route's queries
+def store_calls():
+    return [
+        ('index/count_users', lambda s: s.count_users()),
+        ('notifications/feed', lambda s: s.notifications_feed()),
+        ('notifications/feed_next', lambda s: s.notifications_feed(after=['2024-01-01 00:00:00', 1])),
+        ('login/get_user_by_email', lambda s: s.get_user_by_email('john@example.com')),
+        ('admin_login/get_admin_by_email', lambda s: s.get_admin_by_email('admin@parking.com')),
+        ('admin_dashboard/users', lambda s: s.page('users', limit=10)),
+        ('admin_dashboard/slots', lambda s: s.page('slots', descending=False, limit=10)),
+        ('admin_dashboard/payments', lambda s: s.page('payments', limit=10)),
+        ('admin_api/payments_by_created', lambda s: s.page('payments', sort='created_at', limit=10)),
+        ('admin_api/payments_by_user', lambda s: s.page('payments', limit=10, filters={'user_id': 1})),
+        ('admin_dashboard/summary', lambda s: s.dashboard_summary()),
+        ('admin_api/revenue', lambda s: s.revenue_report('2024-01-01', '2024-12-31')),
+        ('features', lambda s: s.list_features()),
+        ('guidelines', lambda s: s.list_guidelines()),
+        ('slots/list_slots', lambda s: s.list_slots('mall')),
+        ('slot_index/list_all_slots', lambda s: s.list_all_slots()),
+        ('book_slot', lambda s: s.book_slot(1, 'mall', 1, 1)),
+        ('book_any/claim_any_slot', lambda s: s.claim_any_slot('mall', 1)),
+        ('admin_api/list_locations', lambda s: s.list_locations()),
+        ('admin_api/location_layout', lambda s: s.location_layout('mall')),
+        ('admin_api/create_location', lambda s: s.create_location('explain-check', [(1, '4wheeler', 3)])),
+        ('admin_api/provision_slots', lambda s: s.provision_slots('mall', [(2, 'ev', 3)])),
+        ('process_payment', lambda s: s.create_payment(1, '1', 'KA01', '2wheeler', 2, 20, 'cash', location='mall')),
+        ('process_payment/idempotency', lambda s: s.find_payments_by_keys(['0123456789abcdef'])),
+        ('process_payment/reserve_slot', lambda s: s.reserve_slot(1, 1, datetime.datetime(2024, 1, 1, 9),
+                                                                  datetime.datetime(2024, 1, 1, 11), payment_id=1)),
+        ('slot_release/reserved_slots', lambda s: s.reserved_slots()),
+        ('slot_release/expired_slots', lambda s: s.expired_slots(datetime.datetime(2024, 1, 1))),
+        ('slot_release/release_slots', lambda s: s.release_slots([1, 2, 3], datetime.datetime(2024, 1, 1))),
+        ('occupancy/log_occupancy', lambda s: s.log_occupancy([('mall', 1, 'booked', 1, 10,
+                                                                  datetime.datetime(2024, 1, 1))])),
+        ('occupancy/iter_occupancy', lambda s: list(s.iter_occupancy(datetime.datetime(2024, 1, 1)))),
+        ('generate_bill', lambda s: s.get_bill_data(1)),
+        ('bill_export/by_date', lambda s: list(s.iter_bill_data(datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)))),
+        ('bill_export/by_ids', lambda s: list(s.iter_bill_data(payment_ids=[1, 2, 3]))),
+        ('page_cache/users_version', lambda s: s.max_updated_at('users')),
+        ('page_cache/notifications_version', lambda s: s.max_updated_at('notifications')),
+        ('page_cache/features_version', lambda s: s.max_updated_at('features')),
+        ('page_cache/guidelines_version', lambda s: s.max_updated_at('guidelines')),
+    ]
+
+
+class _CapturingCursor:
+    """Records every statement; runs SELECTs, swallows writes."""
+
+    def __init__(self, cur, captured, label):
+        self._cur = cur
+        self._captured = captured
+        self._label = label
+        self._ran = False
+
+    def execute(self, sql, params=()):
+        self._captured.append((self._label, sql, tuple(params)))
+        self._ran = sql.lstrip().upper().startswith('SELECT')
+        if self._ran:
+            return self._cur.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        # One plan covers every row of a batch
+        for params in seq_of_params[:1]:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self._cur.fetchone() if self._ran else None
+
+    def fetchall(self):
+        return self._cur.fetchall() if self._ran else []
+
+    @property
+    def lastrowid(self):
+        return None
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount if self._ran else 0
+
+    def close(self):
+        self._cur.close()
+
+
+class _CapturingBackend:
+    def __init__(self, backend, captured):
+        self._backend = backend
+        self._captured = captured
+        self.label = None
+
+    def cursor(self, conn):
+        return _CapturingCursor(self._backend.cursor(conn), self._captured, self.label)
+
+    def __getattr__(self, attr):
+        return getattr(self._backend, attr)
+
+
+def capture_queries(backend, conn):
+    captured = []
+    capturing = _CapturingBackend(backend, captured)
+    store = DataStore(capturing, lambda: conn)
+    for label, call in store_calls():
+        capturing.label = label
+        try:
+            call(store)
+        except Exception as e:
+            print(f"⚠️ {label}: {e}")
+        conn.rollback()
+    return captured
+
+
+def full_scans(backend, conn, sql, params):
+    """Tables the plan scans in full (empty list if the plan is index-driven)."""
+    cur = backend.cursor(conn)
+    try:
+        if backend.name == 'sqlite':
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            details = [row[-1] for row in cur.fetchall()]
+            bounded = ' LIMIT ' in ' '.join(sql.upper().split()) and not any('TEMP B-TREE' in d for d in details)
+            scans = []
+            for detail in details:
+                words = detail.split()
+                if words[:1] == ['SCAN'] and 'INDEX' not in detail and not bounded:
+                    scans.append(words[1])
+            return scans
+        cur.execute("EXPLAIN " + sql, params)
+        columns = [d[0].lower() for d in cur.description]
+        return [row[columns.index('table')] for row in cur.fetchall()
+                if row[columns.index('type')] == 'ALL']
+    finally:
+        cur.close()
+
+
+def allowed_reason(sql):
+    flat = ' '.join(sql.split())
+    for pattern, reason in ALLOWED_SCANS.items():
+        if pattern in flat:
+            return reason
+    return None
+
+
+def main():
+    backend = create_backend(config_from_env())
+    print(f"🔍 Checking query plans on {backend.name}...")
+    conn = backend.connect()
+    failures = 0
+    try:
+        backend.init_schema(conn)
+        seen = set()
+        for label, sql, params in capture_queries(backend, conn):
+            flat = ' '.join(sql.split())
+            if flat in seen:
+                continue
+            seen.add(flat)
+            scans = full_scans(backend, conn, sql, params)
+            if not scans:
+                print(f"✅ {label}: {flat[:90]}")
+                continue
+            reason = allowed_reason(sql)
+            if reason:
+                print(f"ℹ️ {label}: full scan of {', '.join(scans)} allowed ({reason})")
+            else:
+                failures += 1
+                print(f"❌ {label}: full scan of {', '.join(scans)}\n     {flat}")
+    finally:
+        conn.rollback()
+        conn.close()
+    print("-" * 50)
+    if failures:
+        print(f"❌ {failures} quer{'y' if failures == 1 else 'ies'} doing full table scans")
+        return False
+    print("🎉 No unexpected full table scans")
+    return True
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
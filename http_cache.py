@@ -0,0 +1,207 @@
+"""
+HTTP Page Cache
+Full-response cache for public pages with strong ETags, Last-Modified and
+304 handling for conditional GETs.
+
+Entries are keyed on endpoint, query args, session variant (anonymous, user
+or admin -- the nav bar differs) and the content version of the tables the
+page renders, so a content change simply produces a new key. The version is
+the tables' newest updated_at plus a per-table write counter bumped by
+invalidate(): updated_at has one-second resolution, so two writes in the same
+second would otherwise leave the first one's page in place.
+"""
+
+import collections
+import datetime
+import hashlib
+import inspect
+import logging
+import os
+import threading
+from functools import wraps
+
+from flask import request, session, make_response
+
+from content_cache import LRUCache
+
+
+def session_variant():
+    if session.get('is_admin'):
+        return 'admin'
+    if session.get('user_id'):
+        return 'user'
+    return 'anon'
+
+
+def _templates_mtime(folder):
+    latest = 0.0
+    for root, _, files in os.walk(folder):
+        for filename in files:
+            latest = max(latest, os.path.getmtime(os.path.join(root, filename)))
+    return datetime.datetime.fromtimestamp(int(latest), tz=datetime.timezone.utc)
+
+
+class PageCache:
+    """Decorator factory: @page_cache.page('features') caches a GET view.
+
+    last_modified_for: callable(tables) -> list of datetimes (None allowed)
+    giving the newest updated_at of each backing table; a coroutine function
+    when the cache wraps coroutine views.
+    generations: write counters to share with another PageCache over the
+    same tables (asgi.py shares the Flask app's), so invalidate() on either
+    reaches both.
+    """
+
+    def __init__(self, last_modified_for, template_folder, max_entries=512, ttl=3600, generations=None):
+        self._backend = LRUCache(max_entries)
+        self._last_modified_for = last_modified_for
+        self.generations = collections.Counter() if generations is None else generations
+        self._templates_modified = _templates_mtime(template_folder)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._bypassed = 0
+
+    def reset(self, max_entries=None):
+        """Drop every entry and counter (the app was reconfigured)."""
+        self._backend = LRUCache(max_entries or self._backend.max_entries)
+        with self._lock:
+            self._hits = self._misses = self._not_modified = self._bypassed = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def invalidate(self, *tables):
+        """Retire the cached pages of these tables (call after writing to them)."""
+        with self._lock:
+            for table in tables:
+                self.generations[table] += 1
+
+    def _newest(self, table_stamps):
+        stamps = [self._templates_modified]
+        for stamp in table_stamps:
+            if isinstance(stamp, datetime.datetime):
+                if stamp.tzinfo is None:
+                    stamp = stamp.replace(tzinfo=datetime.timezone.utc)
+                stamps.append(stamp)
+        return max(stamps).replace(microsecond=0)
+
+    def last_modified(self, tables):
+        return self._newest(self._last_modified_for(tables))
+
+    async def last_modified_async(self, tables):
+        return self._newest(await self._last_modified_for(tables))
+
+    def page(self, *tables):
+        def decorator(view):
+            if inspect.iscoroutinefunction(view):
+                return self._async_page(view, tables)
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self._bypass():
+                    return view(*args, **kwargs)
+                try:
+                    last_modified = self.last_modified(tables)
+                except Exception as e:
+                    self._unversioned(e)
+                    return view(*args, **kwargs)
+                key = self._key(kwargs, tables, last_modified)
+                entry = self._lookup(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    entry = self._store(key, response)
+                    if entry is None:
+                        return response
+                return self._serve(entry, last_modified)
+            return wrapper
+        return decorator
+
+    def _async_page(self, view, tables):
+        """page() for coroutine views (asgi.py); last_modified_for is then a
+        coroutine function too."""
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            if self._bypass():
+                return await view(*args, **kwargs)
+            try:
+                last_modified = await self.last_modified_async(tables)
+            except Exception as e:
+                self._unversioned(e)
+                return await view(*args, **kwargs)
+            key = self._key(kwargs, tables, last_modified)
+            entry = self._lookup(key)
+            if entry is None:
+                response = make_response(await view(*args, **kwargs))
+                entry = self._store(key, response)
+                if entry is None:
+                    return response
+            return self._serve(entry, last_modified)
+        return wrapper
+
+    def _bypass(self):
+        # Flashed messages are per-visitor and one-shot: never cache them
+        if request.method != 'GET' or session.get('_flashes'):
+            self._count('_bypassed')
+            return True
+        return False
+
+    def _unversioned(self, error):
+        # Without a content version we cannot key the entry safely
+        logging.error(f"Page cache could not version {request.endpoint}: {error}")
+        self._count('_bypassed')
+
+    def _key(self, kwargs, tables, last_modified):
+        return '|'.join([
+            request.endpoint,
+            repr(sorted(kwargs.items())),
+            repr(sorted(request.args.items(multi=True))),
+            session_variant(),
+            last_modified.isoformat(),
+            ','.join(str(self.generations[table]) for table in tables),
+        ])
+
+    def _lookup(self, key):
+        entry = self._backend.get(key)
+        if not isinstance(entry, tuple):  # cache miss
+            self._count('_misses')
+            return None
+        self._count('_hits')
+        return entry
+
+    def _store(self, key, response):
+        """Cache a freshly rendered page; None when the response must not be cached."""
+        if response.status_code != 200:
+            return None
+        body = response.get_data()
+        entry = (body, response.mimetype, hashlib.sha1(body).hexdigest())
+        self._backend.set(key, entry, self.ttl)
+        return entry
+
+    def _serve(self, entry, last_modified):
+        body, mimetype, etag = entry
+        response = make_response(body)
+        response.mimetype = mimetype
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        if session_variant() == 'anon':
+            response.cache_control.public = True
+        else:
+            response.cache_control.private = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            self._count('_not_modified')
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'not_modified': self._not_modified,
+                'bypassed': self._bypassed,
+            }
@@ -0,0 +1,560 @@
+"""
+Request Instrumentation
+Per-route accounting of where request time goes: wall time, time in the
+database (queries and rows fetched), template rendering and bytes sent.
+
+    Instrumentation.middleware(wsgi_app)  wraps the WSGI app; a request is
+                                          finished when the server closes its
+                                          body, so streamed responses count in
+                                          full
+    Instrumentation.begin() / end()       the same for requests served some
+                                          other way (asgi.py's event loop)
+    Instrumentation.wrap_backend(backend) times every cursor the backend
+                                          hands out and charges it to the
+                                          request running on that thread
+    Instrumentation.wrap_async_pool(pool) the same for async_storage.py pools,
+                                          per asyncio task
+    Instrumentation.prometheus()          text exposition for GET /metrics
+
+Latencies go into HDR-style histograms (LatencyHistogram) so percentiles
+stay accurate from microseconds to minutes in a fixed amount of memory.
+Listeners added with add_query_listener() / add_request_listener() see
+each statement and each finished request (query_log.py builds on them).
+SlowRequestProfiler optionally samples the stacks of requests on chosen
+endpoints and writes a profile for each one that turns out slow.
+"""
+
+import collections
+import contextlib
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+# -------------------------
+# Histograms
+# -------------------------
+class LatencyHistogram:
+    """HDR-style log-linear histogram of durations in microseconds.
+
+    Each power of two is split into SUB_BUCKETS linear buckets, so every
+    recorded value is known to within 1/SUB_BUCKETS (6%) of itself from 1 us
+    up to MAX_US. Recording is O(1) into a fixed array and powers of two are
+    exact bucket edges, which is what the Prometheus buckets are cut at.
+    """
+
+    SUB_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BITS
+    MAX_US = 1 << 36  # ~19 hours
+
+    def __init__(self):
+        self.counts = [0] * (self.index(self.MAX_US) + 1)
+        self.total = 0
+        self.sum_us = 0
+
+    @classmethod
+    def index(cls, us):
+        if us < cls.SUB_BUCKETS:
+            return us
+        shift = us.bit_length() - cls.SUB_BITS - 1
+        return cls.SUB_BUCKETS * (shift + 1) + (us >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def upper_bound(cls, index):
+        """Largest value (in us) recorded into bucket index."""
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        return ((index % cls.SUB_BUCKETS + cls.SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, seconds):
+        us = min(max(int(seconds * 1e6), 0), self.MAX_US)
+        self.counts[self.index(us)] += 1
+        self.total += 1
+        self.sum_us += us
+
+    def percentile(self, q):
+        """Upper bound in seconds of the bucket holding the q-quantile (0 when empty)."""
+        if not self.total:
+            return 0.0
+        target = max(1, int(q * self.total + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.upper_bound(index) / 1e6
+        return self.MAX_US / 1e6
+
+    def cumulative(self, bounds_us):
+        """Counts of values below each bound (ascending powers of two, so bucket edges)."""
+        out, seen, start = [], 0, 0
+        for bound in bounds_us:
+            stop = self.index(bound)
+            seen += sum(self.counts[start:stop])
+            start = stop
+            out.append(seen)
+        return out
+
+
+# -------------------------
+# Per-request accounting
+# -------------------------
+class RequestStats:
+    __slots__ = ('endpoint', 'status', 'started', 'db_seconds', 'queries', 'rows', 'template_seconds',
+                 'bytes_sent', 'template_started', 'profilable', 'profile', 'statements')
+
+    def __init__(self, profilable=True):
+        self.endpoint = None
+        self.status = None
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.template_seconds = 0.0
+        self.bytes_sent = 0
+        self.template_started = None
+        self.profilable = profilable  # False when the thread is shared (event loop): samples would mix requests
+        self.profile = None
+        self.statements = None  # fingerprint -> executions, kept by query_log.QueryLog
+
+
+def current():
+    """RequestStats of the request running in this context, or None (e.g. background threads)."""
+    return _current.get()
+
+
+class _TimedCursor:
+    """Cursor proxy charging execute/fetch time and fetched rows to the current request."""
+
+    def __init__(self, cur, listeners):
+        self._cur = cur
+        self._listeners = listeners
+
+    def _timed(self, call, *args):
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.db_seconds += time.perf_counter() - started
+
+    def _count_query(self, sql):
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            for listener in self._listeners:
+                listener(stats, sql)
+
+    def execute(self, sql, params=()):
+        self._count_query(sql)
+        return self._timed(self._cur.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        self._count_query(sql)
+        return self._timed(self._cur.executemany, sql, seq_of_params)
+
+    def _count(self, rows):
+        stats = _current.get()
+        if stats is not None:
+            stats.rows += rows
+        return rows
+
+    def fetchone(self):
+        row = self._timed(self._cur.fetchone)
+        self._count(1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed(self._cur.fetchmany, *args)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cur.fetchall)
+        self._count(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cur:
+            self._count(1)
+            yield row
+
+    def __getattr__(self, attr):
+        return getattr(self._cur, attr)
+
+
+class _TimedBackend:
+    def __init__(self, backend, listeners):
+        self._backend = backend
+        self._listeners = listeners
+
+    def cursor(self, conn):
+        return _TimedCursor(self._backend.cursor(conn), self._listeners)
+
+    def stream_cursor(self, conn):
+        return _TimedCursor(self._backend.stream_cursor(conn), self._listeners)
+
+    def __getattr__(self, attr):
+        return getattr(self._backend, attr)
+
+
+class _TimedAsyncCursor:
+    """Async counterpart of _TimedCursor for the async_storage.py pools."""
+
+    def __init__(self, cur, listeners):
+        self._cur = cur
+        self._listeners = listeners
+
+    async def execute(self, sql, params=()):
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            for listener in self._listeners:
+                listener(stats, sql)
+        started = time.perf_counter()
+        try:
+            return await self._cur.execute(sql, params)
+        finally:
+            if stats is not None:
+                stats.db_seconds += time.perf_counter() - started
+
+    async def fetchall(self):
+        started = time.perf_counter()
+        rows = await self._cur.fetchall()
+        stats = _current.get()
+        if stats is not None:
+            stats.db_seconds += time.perf_counter() - started
+            stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, attr):
+        return getattr(self._cur, attr)
+
+
+class _TimedAsyncConnection:
+    def __init__(self, conn, listeners):
+        self._conn = conn
+        self._listeners = listeners
+
+    async def cursor(self):
+        return _TimedAsyncCursor(await self._conn.cursor(), self._listeners)
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+
+class _TimedAsyncPool:
+    def __init__(self, pool, listeners):
+        self._pool = pool
+        self._listeners = listeners
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        async with self._pool.acquire() as conn:
+            yield _TimedAsyncConnection(conn, self._listeners)
+
+    def __getattr__(self, attr):
+        return getattr(self._pool, attr)
+
+
+class _RouteMetrics:
+    __slots__ = ('statuses', 'wall', 'db', 'queries', 'rows', 'template_seconds', 'bytes_sent')
+
+    def __init__(self):
+        self.statuses = collections.Counter()
+        self.wall = LatencyHistogram()
+        self.db = LatencyHistogram()
+        self.queries = 0
+        self.rows = 0
+        self.template_seconds = 0.0
+        self.bytes_sent = 0
+
+
+class _ClosingBody:
+    """Response iterable that counts bytes and finishes the request on close()."""
+
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+        self._sent = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            if on_close is not None:
+                on_close(self._sent)
+
+
+# -------------------------
+# Slow request profiler
+# -------------------------
+class _Profile:
+    __slots__ = ('thread_id', 'samples')
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.samples = collections.Counter()  # collapsed stack -> samples
+
+
+class SlowRequestProfiler:
+    """Samples the stack of every in-flight request on the chosen endpoints
+    every `interval` seconds and, for those slower than threshold_ms, writes
+    the samples in collapsed-stack format (flamegraph.pl, speedscope) to
+    directory. The sampler thread starts with the first profiled request.
+    """
+
+    def __init__(self, directory, threshold_ms=500, endpoints=None, interval=0.005, max_dumps=1000):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.endpoints = set(endpoints) if endpoints else None  # None: every endpoint
+        self.interval = interval
+        self.max_dumps = max_dumps
+        self._lock = threading.Lock()
+        self._active = {}  # id(profile) -> profile
+        self._thread = None
+        self._dumped = 0
+        self._discarded = 0
+
+    def wants(self, endpoint):
+        return self.endpoints is None or endpoint in self.endpoints
+
+    def begin(self):
+        profile = _Profile(threading.get_ident())
+        with self._lock:
+            self._active[id(profile)] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile, endpoint, wall_ms):
+        with self._lock:
+            self._active.pop(id(profile), None)
+            if wall_ms < self.threshold_ms or self._dumped >= self.max_dumps:
+                self._discarded += 1
+                return None
+            self._dumped += 1
+        path = os.path.join(self.directory, f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                            f"{int(wall_ms)}ms-{id(profile):x}.folded")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, 'w') as f:
+                for stack, count in profile.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logging.error(f"Could not write request profile {path}: {e}")
+            return None
+        return path
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    profile.samples[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+# -------------------------
+# Registry
+# -------------------------
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation:
+    """Per-endpoint request metrics, fed by middleware() and wrap_backend().
+
+    slow_ms: requests at least this slow are logged with their breakdown.
+    profiler: optional SlowRequestProfiler (set by the app from its config).
+    """
+
+    # Prometheus histogram buckets: 128 us .. ~34 s, powers of two (exact HDR bucket edges)
+    BUCKETS_US = [1 << k for k in range(7, 26)]
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, slow_ms=500, profiler=None, prefix='parking'):
+        self.slow_ms = slow_ms
+        self.profiler = profiler
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._routes = collections.defaultdict(_RouteMetrics)
+        self._query_listeners = []
+        self._request_listeners = []
+
+    def reset(self, slow_ms, profiler):
+        """Drop the recorded metrics and apply new settings."""
+        self._lock = threading.Lock()
+        self._routes = collections.defaultdict(_RouteMetrics)
+        self.slow_ms = slow_ms
+        self.profiler = profiler
+
+    def add_query_listener(self, listener):
+        """listener(stats, sql) is called for every statement a request executes."""
+        self._query_listeners.append(listener)
+
+    def add_request_listener(self, listener):
+        """listener(stats) is called as each request finishes."""
+        self._request_listeners.append(listener)
+
+    # ----------------- Hooks -----------------
+    def begin(self, profilable=True):
+        """Start tracking a request in the current context (thread, or asyncio task).
+        The caller sets status and bytes_sent on the result and calls end() once."""
+        stats = RequestStats(profilable)
+        _current.set(stats)
+        return stats
+
+    def end(self, stats):
+        try:
+            self.finish(stats, time.perf_counter() - stats.started)
+        finally:
+            _current.set(None)
+
+    def middleware(self, wsgi_app):
+        def instrumented(environ, start_response):
+            stats = self.begin()
+
+            def start(status, headers, exc_info=None):
+                stats.status = status.split(' ', 1)[0]
+                return start_response(status, headers, exc_info)
+
+            def finish(sent):
+                stats.bytes_sent = sent
+                self.end(stats)
+
+            try:
+                body = wsgi_app(environ, start)
+            except Exception:
+                stats.status = '500'
+                finish(0)
+                raise
+            return _ClosingBody(body, finish)
+        return instrumented
+
+    def wrap_backend(self, backend):
+        return _TimedBackend(backend, self._query_listeners)
+
+    def wrap_async_pool(self, pool):
+        """Charge queries through an async_storage.py pool to the request running in the current task."""
+        return _TimedAsyncPool(pool, self._query_listeners)
+
+    def route_matched(self, endpoint):
+        """Called once the request is routed (before_request)."""
+        stats = _current.get()
+        if stats is None:
+            return
+        stats.endpoint = endpoint
+        if self.profiler is not None and stats.profilable and self.profiler.wants(endpoint):
+            stats.profile = self.profiler.begin()
+
+    def template_started(self):
+        stats = _current.get()
+        if stats is not None:
+            stats.template_started = time.perf_counter()
+
+    def template_finished(self):
+        stats = _current.get()
+        if stats is not None and stats.template_started is not None:
+            stats.template_seconds += time.perf_counter() - stats.template_started
+            stats.template_started = None
+
+    def finish(self, stats, wall):
+        endpoint = stats.endpoint or 'unmatched'
+        with self._lock:
+            route = self._routes[endpoint]
+            route.statuses[stats.status or '500'] += 1
+            route.wall.record(wall)
+            route.db.record(stats.db_seconds)
+            route.queries += stats.queries
+            route.rows += stats.rows
+            route.template_seconds += stats.template_seconds
+            route.bytes_sent += stats.bytes_sent
+        for listener in self._request_listeners:
+            listener(stats)
+        wall_ms = wall * 1000
+        profile_path = None
+        if stats.profile is not None:
+            profile_path = self.profiler.end(stats.profile, endpoint, wall_ms)
+        if self.slow_ms and wall_ms >= self.slow_ms:
+            logging.warning(
+                f"Slow request {endpoint}: {wall_ms:.0f} ms (db {stats.db_seconds * 1000:.0f} ms in "
+                f"{stats.queries} queries, {stats.rows} rows; templates {stats.template_seconds * 1000:.0f} ms; "
+                f"{stats.bytes_sent} bytes)" + (f", profile: {profile_path}" if profile_path else "")
+            )
+
+    # ----------------- Export -----------------
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format (version 0.0.4)."""
+        p = self.prefix
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                f"# HELP {p}_http_requests_total Requests served, by endpoint and status code.",
+                f"# TYPE {p}_http_requests_total counter",
+            ]
+            for endpoint, route in routes:
+                for status, count in sorted(route.statuses.items()):
+                    lines.append(f'{p}_http_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} {count}')
+            for name, attr, help_text in (
+                ('http_request_duration_seconds', 'wall', "Wall time from request start to last byte sent."),
+                ('db_duration_seconds', 'db', "Time per request spent executing queries and fetching rows."),
+            ):
+                lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} histogram"]
+                for endpoint, route in routes:
+                    histogram = getattr(route, attr)
+                    label = f'endpoint="{_label(endpoint)}"'
+                    for bound, count in zip(self.BUCKETS_US, histogram.cumulative(self.BUCKETS_US)):
+                        lines.append(f'{p}_{name}_bucket{{{label},le="{bound / 1e6:g}"}} {count}')
+                    lines.append(f'{p}_{name}_bucket{{{label},le="+Inf"}} {histogram.total}')
+                    lines.append(f'{p}_{name}_sum{{{label}}} {histogram.sum_us / 1e6:.6f}')
+                    lines.append(f'{p}_{name}_count{{{label}}} {histogram.total}')
+            lines += [
+                f"# HELP {p}_http_request_latency_seconds Wall time quantiles from the HDR histogram.",
+                f"# TYPE {p}_http_request_latency_seconds summary",
+            ]
+            for endpoint, route in routes:
+                label = f'endpoint="{_label(endpoint)}"'
+                for q in self.QUANTILES:
+                    lines.append(f'{p}_http_request_latency_seconds{{{label},quantile="{q}"}} '
+                                 f'{route.wall.percentile(q):.6f}')
+                lines.append(f'{p}_http_request_latency_seconds_sum{{{label}}} {route.wall.sum_us / 1e6:.6f}')
+                lines.append(f'{p}_http_request_latency_seconds_count{{{label}}} {route.wall.total}')
+            for name, attr, help_text, fmt in (
+                ('db_queries_total', 'queries', "Queries executed.", '{}'),
+                ('db_rows_total', 'rows', "Rows fetched.", '{}'),
+                ('template_render_seconds_total', 'template_seconds', "Time spent rendering templates.", '{:.6f}'),
+                ('http_response_bytes_total', 'bytes_sent', "Response body bytes sent.", '{}'),
+            ):
+                lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} counter"]
+                for endpoint, route in routes:
+                    lines.append(f'{p}_{name}{{endpoint="{_label(endpoint)}"}} ' + fmt.format(getattr(route, attr)))
+        return '\n'.join(lines) + '\n'
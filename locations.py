@@ -0,0 +1,68 @@
+"""
+Parking Locations
+Layout specs for creating a location (lot) and adding slots to it.
+
+A layout is a list of (level, slot_type, count) blocks; slots are numbered
+consecutively across the blocks in the order given, continuing after the
+location's highest existing slot_number. A spec is either the short form
+
+    {"levels": 4, "slots_per_level": 2500, "slot_type": "4wheeler"}
+
+or an explicit list of blocks
+
+    {"layout": [{"level": 1, "slot_type": "2wheeler", "count": 300},
+                {"level": 1, "slot_type": "ev", "count": 20}, ...]}
+"""
+
+SLOT_TYPES = ('2wheeler', '4wheeler', 'ev', 'accessible')
+DEFAULT_SLOT_TYPE = '4wheeler'
+MAX_NAME_LENGTH = 100
+
+
+def _positive_int(value, field):
+    try:
+        if isinstance(value, (bool, float)):
+            raise ValueError
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        raise ValueError(f"'{field}' must be a positive whole number")
+    return number
+
+
+def parse_layout(spec, max_slots):
+    """[(level, slot_type, count), ...] from a spec dict; raises ValueError."""
+    if not isinstance(spec, dict):
+        raise ValueError("Expected a JSON object")
+    if 'layout' in spec:
+        blocks = spec['layout']
+        if not isinstance(blocks, list) or not blocks:
+            raise ValueError("'layout' must be a non-empty list")
+    else:
+        per_level = _positive_int(spec.get('slots_per_level'), 'slots_per_level')
+        levels = _positive_int(spec.get('levels', 1), 'levels')
+        blocks = [{'level': level, 'slot_type': spec.get('slot_type', DEFAULT_SLOT_TYPE), 'count': per_level}
+                  for level in range(1, levels + 1)]
+
+    layout = []
+    for block in blocks:
+        if not isinstance(block, dict):
+            raise ValueError("Each layout entry must be an object")
+        slot_type = block.get('slot_type', DEFAULT_SLOT_TYPE)
+        if slot_type not in SLOT_TYPES:
+            raise ValueError(f"Unknown slot_type '{slot_type}' (expected one of {', '.join(SLOT_TYPES)})")
+        layout.append((_positive_int(block.get('level', 1), 'level'), slot_type,
+                       _positive_int(block.get('count'), 'count')))
+    total = sum(count for _, _, count in layout)
+    if total > max_slots:
+        raise ValueError(f"{total} slots requested, at most {max_slots} per request")
+    return layout
+
+
+def location_name(value):
+    """Validated location name; raises ValueError."""
+    name = value.strip() if isinstance(value, str) else ''
+    if not name or len(name) > MAX_NAME_LENGTH or '/' in name:
+        raise ValueError(f"'name' must be 1-{MAX_NAME_LENGTH} characters without '/'")
+    return name
@@ -0,0 +1,283 @@
+"""
+Schema Migrations
+Versioned, forward-only schema changes applied on top of the base schema
+from database_setup.sql / setup_database.py. Applied versions are recorded
+in the schema_migrations table.
+
+    python setup_database.py --migrate          # MySQL
+    python setup_database.py --sqlite PATH      # SQLite (runs migrations too)
+"""
+
+import logging
+
+
+def _param(dialect, sql):
+    return sql.replace('%s', '?') if dialect == 'sqlite' else sql
+
+
+def _fetchone(cur, dialect, sql, params=()):
+    # fetchall: unbuffered mysql.connector cursors refuse to run the next
+    # statement while rows (e.g. one per indexed column) are left unread
+    cur.execute(_param(dialect, sql), params)
+    rows = cur.fetchall()
+    return rows[0] if rows else None
+
+
+def column_exists(cur, dialect, table, column):
+    if dialect == 'sqlite':
+        cur.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cur.fetchall())
+    return _fetchone(cur, dialect, f"SHOW COLUMNS FROM {table} LIKE %s", (column,)) is not None
+
+
+def index_exists(cur, dialect, table, name):
+    if dialect == 'sqlite':
+        return _fetchone(cur, dialect, "SELECT name FROM sqlite_master WHERE type = 'index' AND name = %s",
+                         (name,)) is not None
+    return _fetchone(cur, dialect, f"SHOW INDEX FROM {table} WHERE Key_name = %s", (name,)) is not None
+
+
+def table_exists(cur, dialect, table):
+    if dialect == 'sqlite':
+        return _fetchone(cur, dialect, "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s",
+                         (table,)) is not None
+    return _fetchone(cur, dialect, "SHOW TABLES LIKE %s", (table,)) is not None
+
+
+# -------------------------
+# Migration steps
+# -------------------------
+class AddColumn:
+    def __init__(self, table, column, definition):
+        self.table, self.column, self.definition = table, column, definition
+
+    def apply(self, cur, dialect):
+        if not column_exists(cur, dialect, self.table, self.column):
+            cur.execute(f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}")
+
+    def __str__(self):
+        return f"add column {self.table}.{self.column}"
+
+
+class CreateIndex:
+    def __init__(self, table, name, columns, unique=False):
+        self.table, self.name, self.columns, self.unique = table, name, columns, unique
+
+    def apply(self, cur, dialect):
+        if not index_exists(cur, dialect, self.table, self.name):
+            kind = 'UNIQUE INDEX' if self.unique else 'INDEX'
+            cur.execute(f"CREATE {kind} {self.name} ON {self.table} ({', '.join(self.columns)})")
+
+    def __str__(self):
+        return f"index {self.name} on {self.table}({', '.join(self.columns)})"
+
+
+class CreateTable:
+    def __init__(self, table, ddl):
+        self.table, self.ddl = table, ddl
+
+    def apply(self, cur, dialect):
+        if not table_exists(cur, dialect, self.table):
+            cur.execute(self.ddl[dialect] if isinstance(self.ddl, dict) else self.ddl)
+
+    def __str__(self):
+        return f"create table {self.table}"
+
+
+class Backfill:
+    """Data fix-up; the statement must be a no-op when run a second time."""
+
+    def __init__(self, description, sql):
+        self.description, self.sql = description, sql
+
+    def apply(self, cur, dialect):
+        cur.execute(self.sql)
+
+    def __str__(self):
+        return f"backfill {self.description}"
+
+
+# Also run by setup_database.py after it inserts sample slots into a migrated schema
+BACKFILL_LOCATIONS = Backfill('locations from existing slots', """
+    INSERT INTO locations (name, capacity, levels)
+    SELECT location, COUNT(*), 1 FROM ParkingSlot
+    WHERE location NOT IN (SELECT name FROM locations)
+    GROUP BY location
+""")
+
+# (version, name, steps) -- append only, never edit an applied migration
+MIGRATIONS = [
+    (1, 'revenue rollups', [
+        AddColumn('payments', 'location', 'VARCHAR(100) NULL'),
+        CreateTable('revenue_rollup', """
+            CREATE TABLE revenue_rollup (
+                day DATE NOT NULL,
+                location VARCHAR(100) NOT NULL,
+                vehicle_type VARCHAR(20) NOT NULL,
+                payment_type VARCHAR(20) NOT NULL,
+                payment_count INT NOT NULL DEFAULT 0,
+                total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, location, vehicle_type, payment_type)
+            )
+        """),
+    ]),
+    (2, 'hot path indexes', [
+        CreateIndex('payments', 'idx_payments_user_created', ['user_id', 'created_at']),
+        CreateIndex('payments', 'idx_payments_created', ['created_at']),
+        CreateIndex('notifications', 'idx_notifications_active_created', ['is_active', 'created_at']),
+        CreateIndex('ParkingSlot', 'idx_slot_location_status', ['location', 'status']),
+        CreateIndex('features', 'idx_features_active', ['is_active']),
+        CreateIndex('guidelines', 'idx_guidelines_active', ['is_active']),
+    ]),
+    (3, 'content version indexes', [
+        CreateIndex('users', 'idx_users_updated', ['updated_at']),
+        CreateIndex('notifications', 'idx_notifications_updated', ['updated_at']),
+        CreateIndex('features', 'idx_features_updated', ['updated_at']),
+        CreateIndex('guidelines', 'idx_guidelines_updated', ['updated_at']),
+    ]),
+    (4, 'payment idempotency keys', [
+        AddColumn('payments', 'idempotency_key', 'VARCHAR(64) NULL'),
+        CreateIndex('payments', 'idx_payments_idempotency', ['idempotency_key'], unique=True),
+    ]),
+    (5, 'slot reservations', [
+        AddColumn('ParkingSlot', 'reserved_until', 'TIMESTAMP NULL DEFAULT NULL'),
+        CreateIndex('ParkingSlot', 'idx_slot_status_reserved', ['status', 'reserved_until']),
+        CreateTable('reservations', {
+            'mysql': """
+                CREATE TABLE reservations (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    slot_id INT NOT NULL,
+                    user_id INT NOT NULL,
+                    payment_id INT NULL,
+                    starts_at TIMESTAMP NULL DEFAULT NULL,
+                    ends_at TIMESTAMP NULL DEFAULT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            'sqlite': """
+                CREATE TABLE reservations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    slot_id INT NOT NULL,
+                    user_id INT NOT NULL,
+                    payment_id INT NULL,
+                    starts_at TIMESTAMP NULL DEFAULT NULL,
+                    ends_at TIMESTAMP NULL DEFAULT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+        }),
+        CreateIndex('reservations', 'idx_reservations_slot_ends', ['slot_id', 'ends_at']),
+        CreateIndex('reservations', 'idx_reservations_user', ['user_id']),
+    ]),
+    (6, 'parking locations', [
+        CreateTable('locations', {
+            'mysql': """
+                CREATE TABLE locations (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    name VARCHAR(100) NOT NULL UNIQUE,
+                    capacity INT NOT NULL DEFAULT 0,
+                    levels INT NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            'sqlite': """
+                CREATE TABLE locations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name VARCHAR(100) NOT NULL UNIQUE,
+                    capacity INT NOT NULL DEFAULT 0,
+                    levels INT NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+        }),
+        AddColumn('ParkingSlot', 'level', 'INT NOT NULL DEFAULT 1'),
+        AddColumn('ParkingSlot', 'slot_type', "VARCHAR(20) NOT NULL DEFAULT '4wheeler'"),
+        BACKFILL_LOCATIONS,
+    ]),
+    (7, 'occupancy event log', [
+        CreateTable('occupancy_events', {
+            'mysql': """
+                CREATE TABLE occupancy_events (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    location VARCHAR(100) NOT NULL,
+                    slot_id INT NULL,
+                    status VARCHAR(20) NOT NULL,
+                    occupied INT NOT NULL,
+                    total INT NOT NULL,
+                    occurred_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+            'sqlite': """
+                CREATE TABLE occupancy_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    location VARCHAR(100) NOT NULL,
+                    slot_id INT NULL,
+                    status VARCHAR(20) NOT NULL,
+                    occupied INT NOT NULL,
+                    total INT NOT NULL,
+                    occurred_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """,
+        }),
+        CreateIndex('occupancy_events', 'idx_occupancy_events_occurred', ['occurred_at']),
+    ]),
+]
+
+_VERSION_TABLE = {
+    'mysql': """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    'sqlite': """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+}
+
+
+def current_version(conn, dialect):
+    cur = conn.cursor()
+    try:
+        cur.execute(_VERSION_TABLE[dialect])
+        cur.execute("SELECT MAX(version) FROM schema_migrations")
+        return cur.fetchone()[0] or 0
+    finally:
+        cur.close()
+
+
+def migrate(conn, dialect, verbose=False):
+    """Apply pending migrations in order. Returns the list of applied versions.
+
+    MySQL commits DDL implicitly, so each step is written to be re-runnable
+    and a failed migration can simply be retried.
+    """
+    applied = []
+    version = current_version(conn, dialect)
+    for number, name, steps in MIGRATIONS:
+        if number <= version:
+            continue
+        cur = conn.cursor()
+        try:
+            for step in steps:
+                if verbose:
+                    print(f"   - {step}")
+                step.apply(cur, dialect)
+            cur.execute(_param(dialect, "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)"),
+                        (number, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logging.error(f"Migration {number} ({name}) failed")
+            raise
+        finally:
+            cur.close()
+        applied.append(number)
+        if verbose:
+            print(f"✅ Applied migration {number}: {name}")
+    return applied
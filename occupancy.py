@@ -0,0 +1,475 @@
+"""
+Occupancy History
+Records how full each location is over time and forecasts the next hours.
+
+Every slot status change seen by the slot index is folded, with the
+location's occupied/total counts after the change, into in-memory
+per-minute rollups. Changes this process made are also appended to the
+occupancy_events table (an append-only log, written in batches by a
+background thread); changes a reconcile picked up were logged by the worker
+that made them, so each change is logged once however many workers run.
+
+The rollups are ring buffers -- one row per location, one column per minute
+of the retention window -- holding the occupied and total count at the end
+of each minute, plus hourly sums of completed minutes so long windows and
+the forecaster never touch minute data. Between changes the last counts are
+carried forward in bulk, so a quiet location costs nothing per minute.
+Curves over any window are reduced with numpy (np.add.reduceat over at most
+two contiguous slices of the ring), so a year of hourly history for hundreds
+of locations is a few milliseconds of arithmetic.
+
+Memory: 4 bytes per location per retained minute -- counts are uint16, so
+up to 65535 slots per location -- about 2.2 MB per location for a year with
+the hourly sums. On restart the rollups are rebuilt from the event log.
+
+Slots in maintenance count as occupied: the curves describe what a driver
+could not book.
+"""
+
+import datetime
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+
+from storage import DataStore
+
+COUNT_MAX = np.iinfo(np.uint16).max  # counts are clipped to what the minute rings hold
+
+
+def _epoch_minute(epoch):
+    return int(epoch // 60)
+
+
+def _reduce(ring, rows, first, last, bucket_start, step, buckets):
+    """Per-bucket sums of ring values for absolute indices first..last (inclusive).
+
+    Bucket k covers absolute indices [bucket_start + k * step, bucket_start + (k + 1) * step).
+    The range is read as at most two contiguous slices of the ring (it may wrap).
+    """
+    out = np.zeros((rows.stop - rows.start, buckets))
+    size = ring.shape[1]
+    t = first
+    while t <= last:
+        pos = t % size
+        end = min(last, t + size - pos - 1)
+        k0 = (t - bucket_start) // step
+        k1 = (end - bucket_start) // step
+        values = ring[rows, pos:pos + end - t + 1]
+        if step == 1:
+            out[:, k0:k1 + 1] += values
+        else:
+            offsets = np.maximum(bucket_start + np.arange(k0, k1 + 1) * step, t) - t
+            out[:, k0:k1 + 1] += np.add.reduceat(values, offsets, axis=1, dtype=np.float64)
+        t = end + 1
+    return out
+
+
+class OccupancySeries:
+    """Per-minute occupancy rollups in ring buffers, one row per location."""
+
+    def __init__(self, retention_days=365):
+        self.hours = max(int(retention_days * 24), 24)
+        self.minutes = self.hours * 60
+        self._lock = threading.Lock()
+        self._rows = {}  # location -> row
+        self._names = []
+        self._head = None  # latest minute materialized, in epoch minutes
+        self._capacity = 0
+        self._grow(8)
+
+    # ----------------- Storage -----------------
+    def _grow(self, capacity):
+        n = len(self._names)
+
+        def resized(name, shape, dtype):
+            new = np.zeros(shape, dtype=dtype)
+            if n:
+                new[:n] = getattr(self, name)[:n]
+            setattr(self, name, new)
+
+        resized('_occupied', (capacity, self.minutes), np.uint16)
+        resized('_total', (capacity, self.minutes), np.uint16)
+        resized('_hour_occupied', (capacity, self.hours), np.float64)  # sums over completed minutes
+        resized('_hour_total', (capacity, self.hours), np.float64)
+        resized('_hour_minutes', (capacity, self.hours), np.uint8)
+        resized('_current_occupied', capacity, np.int64)
+        resized('_current_total', capacity, np.int64)
+        resized('_since', capacity, np.int64)  # first minute with data
+        self._capacity = capacity
+
+    def _add(self, location, since):
+        if len(self._names) == self._capacity:
+            self._grow(self._capacity * 2)
+        row = len(self._names)
+        self._rows[location] = row
+        self._names.append(location)
+        self._since[row] = since
+        return row
+
+    def _advance(self, minute):
+        """Complete every minute before `minute` and carry the current counts into it."""
+        if self._head is None:
+            self._head = minute
+            return
+        head = self._head
+        if minute <= head:
+            return
+        n = len(self._names)
+        if n:
+            occupied = self._current_occupied[:n, None]
+            total = self._current_total[:n, None]
+            # Minutes head..minute-1 are now complete and all hold the current counts
+            first = max(head, (minute // 60 - self.hours + 1) * 60)
+            hours = np.arange(first // 60, minute // 60 + 1)
+            counts = np.clip(np.minimum(hours * 60 + 60, minute) - np.maximum(hours * 60, first), 0, None)
+            fresh = hours[hours * 60 >= head] % self.hours  # no completed minute yet: clear last cycle's sums
+            self._hour_occupied[:n, fresh] = 0
+            self._hour_total[:n, fresh] = 0
+            self._hour_minutes[:n, fresh] = 0
+            positions = hours % self.hours
+            self._hour_occupied[:n, positions] += occupied * counts
+            self._hour_total[:n, positions] += total * counts
+            self._hour_minutes[:n, positions] += counts.astype(np.uint8)
+            # ... and so does the new minute, until a change overwrites it
+            columns = np.arange(max(head + 1, minute - self.minutes + 1), minute + 1) % self.minutes
+            self._occupied[:n, columns] = occupied
+            self._total[:n, columns] = total
+        self._head = minute
+
+    def record(self, location, occupied, total, when=None):
+        """Counts for location as of `when` (epoch seconds, default now)."""
+        minute = _epoch_minute(time.time() if when is None else when)
+        occupied, total = min(occupied, COUNT_MAX), min(total, COUNT_MAX)
+        with self._lock:
+            self._advance(minute)
+            minute = self._head  # a late report lands in the current minute
+            row = self._rows.get(location)
+            if row is None:
+                row = self._add(location, minute)
+            self._current_occupied[row] = occupied
+            self._current_total[row] = total
+            self._occupied[row, minute % self.minutes] = occupied
+            self._total[row, minute % self.minutes] = total
+
+    def load(self, names, codes, epochs, occupied, total, now=None):
+        """Rebuild history from logged events: codes index names; all arrays in time order.
+
+        Locations already recorded live keep their live data and only gain
+        the minutes before it.
+        """
+        now_minute = _epoch_minute(time.time() if now is None else now)
+        codes = np.asarray(codes)
+        minutes = np.asarray(epochs, dtype=np.float64) // 60
+        minutes = minutes.astype(np.int64)
+        occupied = np.minimum(np.asarray(occupied, dtype=np.int64), COUNT_MAX)
+        total = np.minimum(np.asarray(total, dtype=np.int64), COUNT_MAX)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        with self._lock:
+            self._advance(now_minute)
+            oldest = (self._head // 60 - self.hours + 1) * 60  # start of the oldest retained hour
+            if len(self._names) + len(names) > self._capacity:
+                self._grow(max(self._capacity * 2, 1 << (len(self._names) + len(names) - 1).bit_length()))
+            for code, location in enumerate(names):
+                events = order[bounds[code]:bounds[code + 1]]
+                if not len(events):
+                    continue
+                row = self._rows.get(location)
+                live = row is not None
+                start = max(int(minutes[events[0]]), oldest)
+                end = int(self._since[row]) - 1 if live else self._head  # inclusive
+                if live and end < start:
+                    continue
+                if not live:
+                    row = self._add(location, start)
+                span = np.arange(start, end + 1)
+                # Counts at the end of each minute: the last event at or before it
+                last = np.searchsorted(minutes[events], span, side='right') - 1
+                valid = last >= 0
+                span, last = span[valid], events[last[valid]]
+                if not len(span):
+                    continue
+                self._occupied[row, span % self.minutes] = occupied[last]
+                self._total[row, span % self.minutes] = total[last]
+                done = span < self._head if not live else np.ones(len(span), dtype=bool)
+                hours = span[done] // 60
+                first_hour = int(hours[0]) if len(hours) else 0
+                if len(hours):
+                    positions = np.arange(first_hour, int(hours[-1]) + 1)
+                    occ = np.bincount(hours - first_hour, weights=occupied[last[done]])
+                    tot = np.bincount(hours - first_hour, weights=total[last[done]])
+                    cnt = np.bincount(hours - first_hour)
+                    self._hour_occupied[row, positions % self.hours] += occ
+                    self._hour_total[row, positions % self.hours] += tot
+                    self._hour_minutes[row, positions % self.hours] += cnt.astype(np.uint8)
+                self._since[row] = span[0]
+                if not live:
+                    self._current_occupied[row] = occupied[last[-1]]
+                    self._current_total[row] = total[last[-1]]
+
+    # ----------------- Queries -----------------
+    def _select(self, location):
+        if location is None:
+            return slice(0, len(self._names)), list(self._names)
+        row = self._rows.get(location)
+        if row is None:
+            raise KeyError(location)
+        return slice(row, row + 1), [location]
+
+    def curves(self, start, end, step=60, location=None, now=None, max_buckets=10000):
+        """Mean occupied and total counts per `step` minutes over [start, end) (epoch seconds).
+
+        Steps that are whole hours are answered from the hourly sums.
+        Returns (bucket start times, location names, occupied, total) with
+        one row per location; buckets without data are NaN. Raises KeyError
+        for an unknown location and ValueError for a bad window.
+        """
+        if step < 1 or end <= start:
+            raise ValueError("Need step >= 1 minute and end after start")
+        hourly = step % 60 == 0
+        unit = 3600 if hourly else 60
+        step_units = step // 60 if hourly else step
+        first = int(start // unit)
+        last = int(math.ceil(end / unit)) - 1
+        buckets = (last - first) // step_units + 1
+        if buckets > max_buckets:
+            raise ValueError(f"{buckets} buckets requested, at most {max_buckets}: use a larger step")
+        with self._lock:
+            self._advance(_epoch_minute(time.time() if now is None else now))
+            rows, names = self._select(location)
+            head = self._head
+            if hourly:
+                # Hourly sums hold completed minutes only, so the current hour may be partial
+                lo = max(first, head // 60 - self.hours + 1)
+                hi = min(last, head // 60)
+                rings = (self._hour_occupied, self._hour_total, self._hour_minutes)
+                occupied, total, minutes = (
+                    _reduce(ring, rows, lo, hi, first, step_units, buckets) if lo <= hi
+                    else np.zeros((rows.stop - rows.start, buckets)) for ring in rings)
+            else:
+                lo = max(first, head - self.minutes + 1)
+                hi = min(last, head)
+                occupied, total = (
+                    _reduce(ring, rows, lo, hi, first, step_units, buckets) if lo <= hi
+                    else np.zeros((rows.stop - rows.start, buckets)) for ring in (self._occupied, self._total))
+                # Minutes with data in each bucket: [max(bucket start, since, lo), min(bucket end, hi)]
+                bucket_lo = first + np.arange(buckets) * step_units
+                since = self._since[rows][:, None]
+                minutes = np.clip(np.minimum(bucket_lo + step_units - 1, hi) + 1
+                                  - np.maximum(np.maximum(bucket_lo, lo), since), 0, None)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            occupied = np.where(minutes > 0, occupied / minutes, np.nan)
+            total = np.where(minutes > 0, total / minutes, np.nan)
+        times = (first + np.arange(buckets) * step_units) * unit
+        return times, names, occupied, total
+
+    def forecast(self, hours=3, days=28, decay_hours=2.0, location=None, now=None):
+        """Predicted occupancy ratio for each of the next `hours` hours.
+
+        Seasonal average of the same hour over the last `days` days (the same
+        weekday weighted 3x), shifted by how far the location is from its
+        usual level right now, with that deviation fading over decay_hours.
+        Locations without history fall back to their current occupancy.
+        Returns (hour start times, location names, current ratio, predicted
+        ratios, current total slots).
+        """
+        with self._lock:
+            self._advance(_epoch_minute(time.time() if now is None else now))
+            rows, names = self._select(location)
+            now_hour = self._head // 60
+            oldest = now_hour - self.hours + 1
+            ahead = np.arange(0, hours + 1)
+            back = np.arange(1, days + 1)
+            absolute = now_hour + ahead[None, :] - 24 * back[:, None]  # (days, hours + 1)
+            positions = absolute % self.hours
+            occupied = self._hour_occupied[rows][:, positions]  # (locations, days, hours + 1)
+            total = self._hour_total[rows][:, positions]
+            current_occupied = self._current_occupied[rows].astype(np.float64)
+            current_total = self._current_total[rows].astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.where((total > 0) & (absolute >= oldest)[None], occupied / total, np.nan)
+            current = np.where(current_total > 0, current_occupied / current_total, 0.0)
+        weights = np.where(back % 7 == 0, 3.0, 1.0)[None, :, None] * ~np.isnan(ratio)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            seasonal = np.nansum(ratio * weights, axis=1) / weights.sum(axis=1)  # (locations, hours + 1)
+        deviation = np.where(np.isnan(seasonal[:, :1]), 0.0, current[:, None] - seasonal[:, :1])
+        fade = np.exp(-ahead[1:] / decay_hours)[None, :]
+        predicted = np.where(np.isnan(seasonal[:, 1:]), current[:, None], seasonal[:, 1:] + deviation * fade)
+        times = (now_hour + ahead[1:]) * 3600
+        return times, names, current, np.clip(predicted, 0.0, 1.0), current_total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'locations': len(self._names),
+                'retention_days': self.hours // 24,
+                'latest_minute': None if self._head is None else
+                    datetime.datetime.fromtimestamp(self._head * 60).isoformat(),
+                'memory_mb': round(sum(a.nbytes for a in (
+                    self._occupied, self._total, self._hour_occupied, self._hour_total, self._hour_minutes
+                )) / 2 ** 20, 1),
+            }
+
+
+class OccupancyRecorder:
+    """Slot index listener feeding an OccupancySeries and the occupancy_events log.
+
+    counts: callable(location) -> slot_index.SlotIndex.counts() dict.
+    get_pool: callable returning the db_pool.ConnectionPool to write through.
+    """
+
+    MAX_PENDING = 100000  # events kept while the database is unreachable
+
+    def __init__(self, backend, get_pool, series, counts, flush_interval=1.0):
+        self.backend = backend
+        self._get_pool = get_pool
+        self.series = series
+        self._counts = counts
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._logged = 0
+        self._flushes = 0
+        self._dropped = 0
+        self._errors = 0
+        self._loaded = 0
+
+    def on_change(self, location, slots, local=True):
+        """SlotIndex listener: record the location's counts after a change, and log
+        the change if this process made it."""
+        counts = self._counts(location)
+        occupied = counts['total'] - counts['available']
+        now = time.time()
+        self.series.record(location, occupied, counts['total'], now)
+        if not local:
+            return
+        when = _db_time(now)
+        with self._lock:
+            self._pending.extend((location, slot_id, status, occupied, counts['total'], when)
+                                 for slot_id, _, status in slots)
+            overflow = len(self._pending) - self.MAX_PENDING
+            if overflow > 0:
+                del self._pending[:overflow]
+                self._dropped += overflow
+
+    def snapshot(self, locations):
+        """Record every location's current counts (e.g. at startup, when nothing changed yet)."""
+        for location in locations:
+            self.on_change(location, [(None, None, 'snapshot')])
+
+    # ----------------- Worker -----------------
+    def start(self, locations):
+        """Snapshot the current counts, then rebuild history from the log and start flushing."""
+        if self._thread is not None:
+            return
+        self.snapshot(locations)
+        self._thread = threading.Thread(target=self._run, name='occupancy-log', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._load_history()
+        except Exception as e:
+            logging.error(f"Loading occupancy history failed: {e}")
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _with_store(self, work):
+        pool = self._get_pool()
+        pooled = pool.acquire()
+        broken = False
+        try:
+            return work(DataStore(self.backend, lambda: pooled.raw))
+        except self.backend.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.release(pooled, broken=broken)
+
+    def flush(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return
+        try:
+            self._with_store(lambda store: store.log_occupancy(events))
+        except Exception as e:
+            logging.error(f"Writing {len(events)} occupancy events failed: {e}")
+            with self._lock:
+                self._errors += 1
+                self._pending[:0] = events
+            return
+        with self._lock:
+            self._logged += len(events)
+            self._flushes += 1
+
+    def _load_history(self):
+        since = _db_time(time.time() - self.series.minutes * 60)
+        names, codes, epochs, occupied, total = {}, [], [], [], []
+
+        def work(store):
+            for chunk in store.iter_occupancy(since):
+                for location, occ, tot, occurred_at in chunk:
+                    codes.append(names.setdefault(location, len(names)))
+                    epochs.append(occurred_at.timestamp())
+                    occupied.append(occ)
+                    total.append(tot)
+
+        self._with_store(work)
+        self.series.load(list(names), codes, epochs, occupied, total)
+        with self._lock:
+            self._loaded = len(codes)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.series.stats(), **{
+                'events_logged': self._logged,
+                'events_pending': len(self._pending),
+                'events_dropped': self._dropped,
+                'flushes': self._flushes,
+                'errors': self._errors,
+                'history_events_loaded': self._loaded,
+                'running': self._thread is not None,
+            })
+
+
+def _points(values, digits=2):
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def curves_json(times, names, occupied, total, step):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = occupied / total
+    return {
+        'step_minutes': step,
+        'times': [datetime.datetime.fromtimestamp(int(t)).isoformat() for t in times],
+        'locations': {
+            name: {'occupied': _points(occupied[i]), 'total': _points(total[i]), 'occupancy': _points(ratio[i], 4)}
+            for i, name in enumerate(names)
+        },
+    }
+
+
+def forecast_json(times, names, current, predicted, total):
+    return {
+        'times': [datetime.datetime.fromtimestamp(int(t)).isoformat() for t in times],
+        'locations': {
+            name: {
+                'total': int(total[i]),
+                'occupancy_now': round(float(current[i]), 4),
+                'occupancy': _points(predicted[i], 4),
+                'available': [int(round(total[i] * (1 - p))) for p in predicted[i]],
+            }
+            for i, name in enumerate(names)
+        },
+    }
+
+
+def _db_time(epoch):
+    """Naive local datetime, like the other timestamps the app stores."""
+    return datetime.datetime.fromtimestamp(int(epoch))
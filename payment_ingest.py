@@ -0,0 +1,210 @@
+"""
+Payment Ingestion
+Idempotent, group-committed payment inserts.
+
+Request threads hand payments to a single writer thread and wait. The
+writer takes everything that queued up while it was busy (up to
+max_batch), drops payments whose idempotency key is already stored, and
+inserts the rest in one transaction -- one commit, and so one fsync, per
+batch instead of per payment. Under light load a batch is a single payment
+and nothing waits.
+
+The unique index on payments.idempotency_key is the final arbiter: if
+another process wins a race for a key, the batch is retried one payment
+per transaction and the loser is reported as a duplicate.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from storage import DataStore
+
+
+class IngestTimeout(Exception):
+    """Raised when the writer did not finish a payment within the timeout."""
+
+
+class _Pending:
+    def __init__(self, payment):
+        self.payment = payment
+        self.key = payment.get('idempotency_key')
+        self.result = None  # (payment_id, existing) -- existing is None for a new payment
+        self.error = None
+        self.done = threading.Event()
+
+    def resolve(self, payment_id, existing=None):
+        self.result = (payment_id, existing)
+        self.done.set()
+
+    def fail(self, error):
+        self.error = error
+        self.done.set()
+
+
+class PaymentIngestor:
+    """Single-writer, group-committing front end to DataStore.create_payments.
+
+    get_pool: callable returning the db_pool.ConnectionPool to write through.
+    """
+
+    def __init__(self, backend, get_pool, max_batch=32, max_delay=0.0):
+        self.backend = backend
+        self._get_pool = get_pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._inserted = 0
+        self._duplicates = 0
+        self._mismatches = 0
+        self._batches = 0
+        self._max_batch_seen = 0
+        self._fallbacks = 0
+        self._errors = 0
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_duplicate(self):
+        """Count a retry answered before it reached the writer."""
+        self._count('_duplicates')
+
+    def record_mismatch(self):
+        """Count a payment rejected because its amount disagreed with the tariff."""
+        self._count('_mismatches')
+
+    def submit(self, payment, timeout=10.0):
+        """Store one payment (dict for DataStore.create_payments).
+
+        Returns (payment_id, existing): existing is None for a new payment, or
+        the stored (id, user_id, plot_no, amount) when the idempotency key was
+        already used.
+        """
+        self._ensure_writer()
+        pending = _Pending(payment)
+        self._count('_submitted')
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise IngestTimeout(f"payment not stored within {timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='payment-writer', daemon=True)
+                    self._thread.start()
+
+    # ----------------- Writer -----------------
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception as e:
+                logging.error(f"Payment batch of {len(batch)} failed: {e}")
+                self._count('_errors')
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.fail(e)
+
+    def _write(self, batch):
+        pool = self._get_pool()
+        pooled = pool.acquire()
+        broken = False
+        try:
+            store = DataStore(self.backend, lambda: pooled.raw)
+            existing = store.find_payments_by_keys({p.key for p in batch if p.key})
+            fresh, first_by_key, repeats = [], {}, []
+            for pending in batch:
+                if pending.key in existing:
+                    self._count('_duplicates')
+                    pending.resolve(existing[pending.key][0], existing[pending.key])
+                elif pending.key and pending.key in first_by_key:
+                    repeats.append(pending)  # same key twice in one batch
+                else:
+                    fresh.append(pending)
+                    if pending.key:
+                        first_by_key[pending.key] = pending
+
+            if fresh:
+                try:
+                    payment_ids = store.create_payments([pending.payment for pending in fresh])
+                    for pending, payment_id in zip(fresh, payment_ids):
+                        pending.resolve(payment_id)
+                except self.backend.OperationalError:
+                    raise
+                except self.backend.Error:
+                    # Another worker stored one of these keys first, or one row is bad
+                    # (e.g. a DataError): go one at a time so only that payment fails
+                    self._count('_fallbacks')
+                    for pending in fresh:
+                        self._write_one(store, pending)
+                with self._lock:
+                    self._inserted += sum(1 for p in fresh if p.result and p.result[1] is None)
+                    self._batches += 1
+                    self._max_batch_seen = max(self._max_batch_seen, len(fresh))
+
+            for pending in repeats:
+                first = first_by_key[pending.key]
+                if first.error is not None:
+                    pending.fail(first.error)
+                else:
+                    self._count('_duplicates')
+                    payment_id = first.result[0]
+                    pending.resolve(payment_id, (payment_id, first.payment['user_id'], first.payment['plot_no'],
+                                                 first.payment['amount']))
+        except self.backend.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.release(pooled, broken=broken)
+
+    def _write_one(self, store, pending):
+        try:
+            pending.resolve(store.create_payments([pending.payment])[0])
+        except self.backend.IntegrityError as e:
+            existing = store.find_payments_by_keys([pending.key]).get(pending.key) if pending.key else None
+            if existing is None:
+                pending.fail(e)
+            else:
+                self._count('_duplicates')
+                pending.resolve(existing[0], existing)
+        except self.backend.OperationalError:
+            raise
+        except Exception as e:
+            pending.fail(e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'submitted': self._submitted,
+                'inserted': self._inserted,
+                'duplicates': self._duplicates,
+                'price_mismatches': self._mismatches,
+                'batches': self._batches,
+                'avg_batch': round(self._inserted / self._batches, 2) if self._batches else 0.0,
+                'max_batch': self._max_batch_seen,
+                'fallbacks': self._fallbacks,
+                'errors': self._errors,
+                'queued': self._queue.qsize(),
+            }
@@ -0,0 +1,216 @@
+"""
+Native Bill PDF
+Builds the bill PDF directly in Python -- no wkhtmltopdf, no HTML layout
+pass. The page layout is compiled once at import into fixed byte segments
+with slots for the bill fields, so rendering a bill is a join of
+pre-encoded bytes plus a handful of escaped strings.
+
+Fields are the ones passed to templates/bill.html: bill_id, payment_id,
+slot_id, vehicle_no, vehicle_type, hours, amount, payment_type, username,
+date, time. Text uses the PDF standard Helvetica fonts (WinAnsi), so
+characters outside Latin-1 are replaced and the rupee sign is written "Rs.".
+"""
+
+import datetime
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+
+_FONTS = {'regular': b'F1', 'bold': b'F2'}
+
+
+def _escape(value):
+    raw = str(value).encode('latin-1', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _title(value):
+    return str(value).title()
+
+
+# -------------------------
+# Layout
+# -------------------------
+# Each entry is either raw content-stream bytes or a text item
+# (x, y, size, font, gray, template); template is a str.format pattern over
+# the bill fields, or plain text when it has no braces.
+_HEADER_FILL = b"0.18 0.49 0.73 rg 40 730 515 80 re f\n"
+_AMOUNT_FILL = b"0.91 0.97 0.92 rg 40 330 515 90 re f\n"
+_TABLE_HEAD_FILL = b"0.94 0.95 0.96 rg 40 606 515 24 re f\n"
+
+_ROWS = [
+    ('Slot Number', '{slot_id}'),
+    ('Vehicle Number', '{vehicle_no}'),
+    ('Vehicle Type', '{vehicle_type_title}'),
+    ('Parking Hours', '{hours} hour(s)'),
+    ('Payment Method', '{payment_type_title}'),
+    ('Transaction Status', 'Completed'),
+    ('Generated On', '{date} at {time}'),
+]
+
+_TERMS = [
+    'This bill serves as proof of payment for parking services',
+    'Please keep this bill for your records',
+    'Parking duration is calculated from entry to exit time',
+    'Additional charges may apply for extended parking',
+    'For any queries, please contact our support team',
+]
+
+
+def _layout():
+    items = [_HEADER_FILL]
+    items.append((60, 780, 22, 'bold', 1, 'Parking Payment Bill'))
+    items.append((60, 758, 11, 'regular', 1, 'Thank you for using our parking service'))
+    items.append((60, 740, 12, 'bold', 1, 'Bill #{bill_id}'))
+
+    for i, (label, value) in enumerate([('Customer', '{username}'), ('Payment ID', '#{payment_id}'),
+                                        ('Date', '{date}'), ('Time', '{time}')]):
+        x = 60 + i * 125
+        items.append((x, 700, 9, 'bold', 0.4, label.upper()))
+        items.append((x, 684, 11, 'regular', 0.1, value))
+
+    items.append(_TABLE_HEAD_FILL)
+    items.append((60, 614, 11, 'bold', 0.2, 'Description'))
+    items.append((260, 614, 11, 'bold', 0.2, 'Details'))
+    y = 606
+    for label, value in _ROWS:
+        y -= 26
+        items.append((60, y + 8, 11, 'bold', 0.1, label))
+        items.append((260, y + 8, 11, 'regular', 0.1, value))
+        items.append(f"0.85 G 0.5 w 40 {y} m 555 {y} l S\n".encode())
+
+    items.append(_AMOUNT_FILL)
+    items.append((60, 396, 12, 'regular', 0.3, 'Total Amount Paid'))
+    items.append((60, 360, 26, 'bold', 0.1, 'Rs. {amount}'))
+    items.append((60, 340, 10, 'regular', 0.4, 'Payment completed successfully'))
+
+    for i, (label, value) in enumerate([('Contact', '+91 9740108901'), ('Email', 'spvinayaka901@gmail.com'),
+                                        ('Website', 'www.parking.com'), ('Address', 'Parking Management System')]):
+        x = 60 + i * 125
+        items.append((x, 290, 9, 'bold', 0.4, label.upper()))
+        items.append((x, 276, 8, 'regular', 0.1, value))
+
+    items.append((60, 236, 11, 'bold', 0.1, 'Terms & Conditions'))
+    for i, term in enumerate(_TERMS):
+        items.append((66, 218 - i * 15, 9, 'regular', 0.3, '- ' + term))
+    return items
+
+
+def _compile(items):
+    """Merge the layout into alternating static bytes and (prefix, pattern, suffix) slots."""
+    segments, static = [], b''
+    for item in items:
+        if isinstance(item, bytes):
+            static += item
+            continue
+        x, y, size, font, gray, template = item
+        prefix = b"BT /%s %d Tf %.2f g %d %d Td (" % (_FONTS[font], size, gray, x, y)
+        suffix = b") Tj ET\n"
+        if '{' not in template:
+            static += prefix + _escape(template) + suffix
+        else:
+            segments.append(static + prefix)
+            segments.append(template)
+            static = suffix
+    segments.append(static)
+    return segments
+
+
+_SEGMENTS = _compile(_layout())
+
+
+def _objects():
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+        b"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(head))
+        head += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    offsets.append(len(head))  # content stream, always the last object
+    xref = b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+    xref += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    xref += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n" % (len(offsets) + 1)
+    return head + b"6 0 obj\n<< /Length ", xref
+
+
+_HEAD, _XREF = _objects()
+
+
+def bill_fields(row):
+    """bill.html fields from a (id, plot_no, vehicle_no, vehicle_type, hours, amount,
+    payment_type, created_at, username) row as returned by DataStore.get_bill_data."""
+    (p_id, plot_no, vehicle_no, vehicle_type, hours, amount, payment_type, created_at, username) = row
+    if created_at is None:
+        created_at = datetime.datetime.now()
+    return dict(
+        bill_id=f"BILL-{int(p_id):06d}", payment_id=p_id, slot_id=plot_no, amount=amount,
+        date=created_at.strftime("%Y-%m-%d"), time=created_at.strftime("%H:%M:%S"),
+        username=username, vehicle_no=vehicle_no, vehicle_type=vehicle_type, hours=hours,
+        payment_type=payment_type
+    )
+
+
+def _content(fields):
+    values = dict(fields)
+    values['vehicle_type_title'] = _title(values.get('vehicle_type', ''))
+    values['payment_type_title'] = _title(values.get('payment_type', ''))
+    parts = []
+    for i, segment in enumerate(_SEGMENTS):
+        parts.append(_escape(segment.format_map(values)) if i % 2 else segment)
+    return b''.join(parts)
+
+
+def render_bill(fields):
+    """PDF bytes for one bill."""
+    content = _content(fields)
+    body = _HEAD + b"%d >>\nstream\n" % len(content) + content + b"\nendstream\nendobj\n"
+    return body + _XREF + b"%d\n%%%%EOF\n" % len(body)
+
+
+def render_bills(fields_iter):
+    """One multi-page PDF, one bill per page, yielded as byte chunks.
+
+    Pages are written as they arrive; only their object offsets are kept, so
+    memory stays flat however many bills are streamed. The page tree (object
+    2) is written last, once every page is known.
+    """
+    offset = 0
+    offsets = {}
+
+    def emit(number, body):
+        nonlocal offset
+        offsets[number] = offset
+        chunk = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        offset += len(chunk)
+        return chunk
+
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    offset = len(head)
+    yield head + emit(1, b"<< /Type /Catalog /Pages 2 0 R >>") \
+        + emit(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>") \
+        + emit(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    pages = []
+    number = 5
+    for fields in fields_iter:
+        content = _content(fields)
+        page = emit(number, b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        page += emit(number + 1, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                                 b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                     % (PAGE_WIDTH, PAGE_HEIGHT, number))
+        pages.append(number + 1)
+        number += 2
+        yield page
+
+    kids = b' '.join(b"%d 0 R" % page for page in pages)
+    tail = emit(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(pages)))
+    xref = b"xref\n0 %d\n0000000000 65535 f \n" % number
+    xref += b''.join(b"%010d 00000 n \n" % offsets[n] for n in range(1, number))
+    xref += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (number, offset)
+    yield tail + xref
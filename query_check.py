@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Query Count Check
+Requests every read-only page and API of the web app once (signed in as a
+user and as an admin, content cache off so each view reaches the database),
+prints the statements each endpoint executed, and fails (exit code 1) if
+any endpoint runs the same statement repeatedly in one request or probes the
+schema, unless it is listed in ALLOWED below. Meant for CI against a SQLite
+copy of the schema; no request writes to the database.
+
+Usage:
+    python query_check.py                        # backend from DB_BACKEND etc.
+    DB_BACKEND=sqlite SQLITE_PATH=parking_system1.db python query_check.py --verbose
+"""
+
+import argparse
+import logging
+import sys
+
+# (endpoint, statement substring) -> reason
+ALLOWED = {}
+
+REQUESTS = [
+    ('GET', '/'),
+    ('GET', '/notification'),
+    ('GET', '/api/notifications'),
+    ('GET', '/features'),
+    ('GET', '/guidelines'),
+    ('GET', '/readyz'),
+    ('POST', '/login', {'email': 'john@example.com', 'password': 'not-the-password'}),
+    ('POST', '/admin_login', {'email': 'admin@parking.com', 'password': 'not-the-password'}),
+    ('GET', '/webpage'),
+    ('GET', '/slots/mall'),
+    ('GET', '/api/slots/mall'),
+    ('GET', '/api/v1/availability'),
+    ('GET', '/api/v1/occupancy/mall'),
+    ('GET', '/api/v1/forecast/mall'),
+    ('GET', '/payment'),
+    ('GET', '/admin_dashboard'),
+    ('GET', '/admin/api/users'),
+    ('GET', '/admin/api/payments?sort=created_at'),
+    ('GET', '/admin/api/revenue'),
+    ('GET', '/admin/api/locations'),
+    ('GET', '/admin/api/locations/mall/slots'),
+    ('GET', '/admin/export/users'),
+    ('GET', '/admin/bills/export'),
+    ('GET', '/generate_bill?paymentId=1'),
+]
+
+
+def allowed(endpoint, sql):
+    return next((reason for (name, fragment), reason in ALLOWED.items()
+                 if name == endpoint and fragment in sql), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true', help="list every statement, not only flagged ones")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    import app as web
+    web.create_app({'CONTENT_CACHE_BACKEND': 'none', 'PROFILE_ENDPOINTS': ''})
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'query-check'
+        session['is_admin'] = True
+
+    print(f"🔗 Requesting {len(REQUESTS)} pages ({web.db_backend.name})")
+    for method, path, *form in REQUESTS:
+        response = client.open(path, method=method, data=form[0] if form else None)
+        response.get_data()
+        response.close()  # the request is recorded when its body is closed
+        if response.status_code >= 500:
+            print(f"⚠️ {method} {path}: {response.status_code}")
+
+    print("-" * 60)
+    problems = 0
+    for endpoint, entry in web.query_log.report().items():
+        print(f"🧮 {endpoint}: {entry['queries_per_request']:g} queries/request")
+        for statement in entry['statements']:
+            flags = []
+            if statement['schema_probe']:
+                flags.append('schema probe')
+            if statement['repeated_requests']:
+                flags.append(f"{statement['max_per_request']}x in one request")
+            if not flags and not args.verbose:
+                continue
+            reason = allowed(endpoint, statement['sql']) if flags else None
+            if flags and reason is None:
+                problems += 1
+                print(f"   ❌ {statement['sql']} ({', '.join(flags)})")
+            elif flags:
+                print(f"   ✅ {statement['sql']} (allowed: {reason})")
+            else:
+                print(f"      {statement['sql']} x{statement['per_request']:g}")
+    print("-" * 60)
+
+    if problems:
+        print(f"❌ {problems} repeated or schema-probe statement(s); remove them or add them to ALLOWED")
+        return False
+    print("🎉 No repeated queries or schema probes")
+    return True
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,158 @@
+"""
+Query Log
+Counts, per endpoint, which statements each request executes, keyed by
+fingerprint: the SQL with literals and placeholders replaced by ? and
+IN / VALUES lists collapsed, so the same query with different arguments (or
+a different number of them) counts as one.
+
+Two things are flagged:
+    repeated      a fingerprint executed repeat_threshold or more times in
+                  one request -- a query in a loop (N+1) or a lookup that
+                  should be done once
+    schema probe  SHOW TABLES / information_schema / sqlite_master style
+                  queries, which ask the same question on every request
+
+Statements arrive through Instrumentation.add_query_listener(), so every
+cursor the DataStore, the async store and the background components open
+is seen; only queries run while a request is being served are counted.
+"""
+
+import collections
+import functools
+import logging
+import re
+import threading
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\?[^()]*\)(?:\s*,\s*\(\?[^()]*\))+")
+_SPACE = re.compile(r"\s+")
+_SCHEMA_PROBE = re.compile(
+    r"^\s*(?:SHOW\s+(?:FULL\s+)?(?:TABLES|COLUMNS|FIELDS|INDEX|INDEXES|KEYS|CREATE)\b|DESCRIBE\b|DESC\s+\w+\s*$"
+    r"|PRAGMA\s+(?:table_info|table_xinfo|index_list)\b)|\binformation_schema\.|\bsqlite_master\b",
+    re.IGNORECASE,
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normalized form of sql: literals -> ?, lists of ? and VALUES rows -> one (...), single spaces."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _ROWS.sub(lambda m: m.group(0).split(')', 1)[0] + ')', sql)
+    sql = _LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip().rstrip(';')
+
+
+@functools.lru_cache(maxsize=1024)
+def is_schema_probe(sql):
+    return _SCHEMA_PROBE.search(sql) is not None
+
+
+class _Statement:
+    __slots__ = ('executions', 'requests', 'max_per_request', 'repeated_requests', 'schema_probe')
+
+    def __init__(self, schema_probe):
+        self.executions = 0
+        self.requests = 0
+        self.max_per_request = 0
+        self.repeated_requests = 0
+        self.schema_probe = schema_probe
+
+
+class _EndpointLog:
+    __slots__ = ('requests', 'queries', 'max_queries', 'statements')
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.statements = {}  # fingerprint -> _Statement
+
+
+class QueryLog:
+    """Per-endpoint statement counts fed by on_query()/on_request().
+
+    repeat_threshold: executions of one fingerprint in a request that mark it
+    as repeated. The first time an endpoint shows a flag it is logged.
+    """
+
+    def __init__(self, repeat_threshold=2):
+        self.repeat_threshold = repeat_threshold
+        self._lock = threading.Lock()
+        self._endpoints = collections.defaultdict(_EndpointLog)
+
+    def reset(self, repeat_threshold):
+        """Forget every count and apply a new threshold."""
+        self._lock = threading.Lock()
+        self._endpoints = collections.defaultdict(_EndpointLog)
+        self.repeat_threshold = repeat_threshold
+
+    # ----------------- Listeners -----------------
+    def on_query(self, stats, sql):
+        if stats.statements is None:
+            stats.statements = collections.Counter()
+        stats.statements[fingerprint(sql)] += 1
+
+    def on_request(self, stats):
+        statements = stats.statements or {}
+        endpoint = stats.endpoint or 'unmatched'
+        flagged = []
+        with self._lock:
+            log = self._endpoints[endpoint]
+            log.requests += 1
+            log.queries += stats.queries
+            log.max_queries = max(log.max_queries, stats.queries)
+            for sql, count in statements.items():
+                statement = log.statements.get(sql)
+                if statement is None:
+                    statement = log.statements[sql] = _Statement(is_schema_probe(sql))
+                    if statement.schema_probe:
+                        flagged.append(f"schema probe: {sql}")
+                statement.executions += count
+                statement.requests += 1
+                statement.max_per_request = max(statement.max_per_request, count)
+                if count >= self.repeat_threshold:
+                    if not statement.repeated_requests:
+                        flagged.append(f"executed {count}x in one request: {sql}")
+                    statement.repeated_requests += 1
+        for flag in flagged:
+            logging.warning(f"Query log {endpoint}: {flag}")
+
+    # ----------------- Report -----------------
+    def report(self):
+        """{endpoint: {requests, queries_per_request, max_queries, flags, statements}}, statements
+        most executed first, each {sql, executions, per_request, max_per_request, repeated_requests,
+        schema_probe}."""
+        with self._lock:
+            report = {}
+            for endpoint, log in sorted(self._endpoints.items()):
+                statements = sorted(log.statements.items(), key=lambda item: -item[1].executions)
+                report[endpoint] = {
+                    'requests': log.requests,
+                    'queries_per_request': round(log.queries / log.requests, 2),
+                    'max_queries': log.max_queries,
+                    'flags': self._flags(statements),
+                    'statements': [{
+                        'sql': sql,
+                        'executions': s.executions,
+                        'per_request': round(s.executions / log.requests, 2),
+                        'max_per_request': s.max_per_request,
+                        'repeated_requests': s.repeated_requests,
+                        'schema_probe': s.schema_probe,
+                    } for sql, s in statements],
+                }
+            return report
+
+    @staticmethod
+    def _flags(statements):
+        flags = []
+        for sql, s in statements:
+            if s.schema_probe:
+                flags.append({'kind': 'schema_probe', 'sql': sql})
+            if s.repeated_requests:
+                flags.append({'kind': 'repeated', 'sql': sql, 'max_per_request': s.max_per_request})
+        return flags
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Revenue Rollups
+Per-day, per-location, per-vehicle_type and per-payment_type revenue totals,
+kept in the revenue_rollup table so reporting never scans payments.
+
+process_payment updates the rollup in the same transaction as the payment
+insert. To (re)build it from history:
+
+    python revenue.py backfill
+"""
+
+import argparse
+import sys
+
+ROLLUP_KEYS = ['day', 'location', 'vehicle_type', 'payment_type']
+ROLLUP_COUNTERS = ['payment_count', 'total_amount']
+GROUP_BY_CHOICES = ROLLUP_KEYS
+
+UNKNOWN_LOCATION = 'unknown'
+
+_SELECT_FROM_PAYMENTS = f"""
+    SELECT DATE(created_at), COALESCE(location, '{UNKNOWN_LOCATION}'), vehicle_type, payment_type,
+           COUNT(*), SUM(amount)
+    FROM payments
+    WHERE payment_status = 'completed'
+"""
+
+
+def record_payment(cur, backend, payment_id):
+    """Fold one completed payment into the rollup. Caller commits."""
+    cur.execute(
+        f"INSERT INTO revenue_rollup ({', '.join(ROLLUP_KEYS + ROLLUP_COUNTERS)})"
+        + _SELECT_FROM_PAYMENTS
+        + " AND id = %s GROUP BY DATE(created_at), COALESCE(location, '" + UNKNOWN_LOCATION + "'), vehicle_type, payment_type "
+        + backend.upsert_increment(ROLLUP_KEYS, ROLLUP_COUNTERS),
+        (payment_id,)
+    )
+
+
+def backfill(conn, backend):
+    """Rebuild revenue_rollup from the full payments history in one transaction."""
+    cur = backend.cursor(conn)
+    try:
+        cur.execute("DELETE FROM revenue_rollup")
+        cur.execute(
+            f"INSERT INTO revenue_rollup ({', '.join(ROLLUP_KEYS + ROLLUP_COUNTERS)})"
+            + _SELECT_FROM_PAYMENTS
+            + " GROUP BY DATE(created_at), COALESCE(location, '" + UNKNOWN_LOCATION + "'), vehicle_type, payment_type"
+        )
+        conn.commit()
+        cur.execute("SELECT COUNT(*), SUM(payment_count) FROM revenue_rollup")
+        return cur.fetchone()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def totals(cur):
+    """(payment_count, total_amount) across the whole rollup."""
+    cur.execute("SELECT SUM(payment_count), SUM(total_amount) FROM revenue_rollup")
+    count, amount = cur.fetchone()
+    return int(count or 0), float(amount) if amount is not None else 0.0
+
+
+def report(cur, date_from=None, date_to=None, group_by=('day',)):
+    """Revenue grouped by any of ROLLUP_KEYS between date_from and date_to (inclusive)."""
+    group_by = list(group_by)
+    for key in group_by:
+        if key not in GROUP_BY_CHOICES:
+            raise ValueError(f"Cannot group revenue by '{key}'")
+    where, params = [], []
+    if date_from:
+        where.append("day >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append("day <= %s")
+        params.append(date_to)
+    columns = ', '.join(group_by)
+    sql = f"SELECT {columns + ', ' if group_by else ''}SUM(payment_count), SUM(total_amount) FROM revenue_rollup"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if group_by:
+        sql += f" GROUP BY {columns} ORDER BY {columns}"
+    cur.execute(sql, tuple(params))
+    rows = []
+    for row in cur.fetchall():
+        entry = {key: str(value) if key == 'day' else value for key, value in zip(group_by, row)}
+        entry['payment_count'] = int(row[-2] or 0)
+        entry['total_amount'] = float(row[-1]) if row[-1] is not None else 0.0
+        rows.append(entry)
+    return rows
+
+
+def main():
+    from storage import create_backend, config_from_env
+
+    parser = argparse.ArgumentParser(description="Revenue rollup maintenance")
+    parser.add_argument('command', choices=['backfill'])
+    parser.parse_args()
+
+    backend = create_backend(config_from_env())
+    print(f"🔗 Connecting to {backend.name} database...")
+    conn = backend.connect()
+    try:
+        backend.init_schema(conn)
+        print("📊 Rebuilding revenue_rollup from payments...")
+        rollup_rows, payment_count = backfill(conn, backend)
+        print(f"✅ Backfill complete: {payment_count or 0} payments folded into {rollup_rows} rollup rows")
+        return True
+    except Exception as e:
+        print(f"❌ Backfill failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
@@ -4,9 +4,50 @@ Database Setup Script
 This script will create the database and tables using Python instead of MySQL command line.
 """
 
+import argparse
 import os
 import sys
 
+import migrations
+
+# Database configuration
+MYSQL_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'kane@22*',
+    'port': 3306
+}
+
+# Sample data shared by the MySQL and SQLite setups
+notifications_data = [
+    ('Welcome to Parking Management System', 'Thank you for registering with our parking management system. Enjoy hassle-free parking!', 'success'),
+    ('New Feature Available', 'We have introduced online payment options for your convenience.', 'info'),
+    ('Maintenance Notice', 'Parking slots 5-8 will be under maintenance on Sunday. Please plan accordingly.', 'warning'),
+    ('Holiday Schedule', 'Parking rates will be revised during upcoming holidays. Check our pricing page for details.', 'info')
+]
+
+features_data = [
+    ('Easy Booking', 'Book your parking slot in just a few clicks with our user-friendly interface.', '🚗'),
+    ('Real-time Availability', 'Check slot availability in real-time and avoid waiting in queues.', '⏰'),
+    ('Secure Payments', 'Multiple payment options with secure transaction processing.', '💳'),
+    ('24/7 Support', 'Round-the-clock customer support for all your parking needs.', '📞'),
+    ('Mobile App', 'Access parking services on the go with our mobile application.', '📱'),
+    ('Digital Receipts', 'Get digital receipts instantly after payment completion.', '🧾')
+]
+
+guidelines_data = [
+    ('General Parking Rules', '1. Park only in designated slots\n2. Follow traffic rules\n3. Keep your vehicle locked\n4. Do not block other vehicles', 'general'),
+    ('Payment Guidelines', '1. Payment must be completed before parking\n2. Keep payment receipt for verification\n3. Multiple payment methods accepted\n4. Refunds processed within 24 hours', 'payment'),
+    ('Safety Guidelines', '1. Do not leave valuables in your vehicle\n2. Report any suspicious activity\n3. Follow emergency exit signs\n4. Keep emergency contacts handy', 'safety'),
+    ('Vehicle Guidelines', '1. Ensure your vehicle is in good condition\n2. Follow size restrictions for slots\n3. Do not park oversized vehicles in regular slots\n4. Report any vehicle damage immediately', 'vehicle')
+]
+
+
+def sample_slots():
+    return [(location, slot_num, 'available')
+            for location in ['mall', 'office', 'airport', 'hospital']
+            for slot_num in range(1, 11)]
+
 def setup_database():
     """Set up the database using Python MySQL connector"""
     
@@ -20,18 +61,10 @@ def setup_database():
         print("Please install it: pip install mysql-connector-python")
         return False
     
-    # Database configuration
-    config = {
-        'host': 'localhost',
-        'user': 'root',
-        'password': 'kane@22*',
-        'port': 3306
-    }
-    
     try:
         # Connect to MySQL server (without specifying database)
         print("🔗 Connecting to MySQL server...")
-        connection = mysql.connector.connect(**config)
+        connection = mysql.connector.connect(**MYSQL_CONFIG)
         
         if connection.is_connected():
             cursor = connection.cursor()
@@ -102,12 +135,26 @@ def setup_database():
                     amount DECIMAL(10,2) NOT NULL,
                     payment_type ENUM('cash', 'card', 'online') NOT NULL,
                     payment_status ENUM('pending', 'completed', 'failed') DEFAULT 'completed',
+                    location VARCHAR(100) NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
                 )
             """)
             
+            # Revenue rollup table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS revenue_rollup (
+                    day DATE NOT NULL,
+                    location VARCHAR(100) NOT NULL,
+                    vehicle_type VARCHAR(20) NOT NULL,
+                    payment_type VARCHAR(20) NOT NULL,
+                    payment_count INT NOT NULL DEFAULT 0,
+                    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, location, vehicle_type, payment_type)
+                )
+            """)
+            
             # Notifications table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS notifications (
@@ -156,52 +203,24 @@ def setup_database():
             cursor.execute("SELECT COUNT(*) FROM notifications")
             if cursor.fetchone()[0] == 0:
                 # Insert sample notifications
-                notifications_data = [
-                    ('Welcome to Parking Management System', 'Thank you for registering with our parking management system. Enjoy hassle-free parking!', 'success'),
-                    ('New Feature Available', 'We have introduced online payment options for your convenience.', 'info'),
-                    ('Maintenance Notice', 'Parking slots 5-8 will be under maintenance on Sunday. Please plan accordingly.', 'warning'),
-                    ('Holiday Schedule', 'Parking rates will be revised during upcoming holidays. Check our pricing page for details.', 'info')
-                ]
-                
                 cursor.executemany("""
                     INSERT INTO notifications (title, message, type) VALUES (%s, %s, %s)
                 """, notifications_data)
                 
                 # Insert sample features
-                features_data = [
-                    ('Easy Booking', 'Book your parking slot in just a few clicks with our user-friendly interface.', '🚗'),
-                    ('Real-time Availability', 'Check slot availability in real-time and avoid waiting in queues.', '⏰'),
-                    ('Secure Payments', 'Multiple payment options with secure transaction processing.', '💳'),
-                    ('24/7 Support', 'Round-the-clock customer support for all your parking needs.', '📞'),
-                    ('Mobile App', 'Access parking services on the go with our mobile application.', '📱'),
-                    ('Digital Receipts', 'Get digital receipts instantly after payment completion.', '🧾')
-                ]
-                
                 cursor.executemany("""
                     INSERT INTO features (title, description, icon) VALUES (%s, %s, %s)
                 """, features_data)
                 
                 # Insert sample guidelines
-                guidelines_data = [
-                    ('General Parking Rules', '1. Park only in designated slots\n2. Follow traffic rules\n3. Keep your vehicle locked\n4. Do not block other vehicles', 'general'),
-                    ('Payment Guidelines', '1. Payment must be completed before parking\n2. Keep payment receipt for verification\n3. Multiple payment methods accepted\n4. Refunds processed within 24 hours', 'payment'),
-                    ('Safety Guidelines', '1. Do not leave valuables in your vehicle\n2. Report any suspicious activity\n3. Follow emergency exit signs\n4. Keep emergency contacts handy', 'safety'),
-                    ('Vehicle Guidelines', '1. Ensure your vehicle is in good condition\n2. Follow size restrictions for slots\n3. Do not park oversized vehicles in regular slots\n4. Report any vehicle damage immediately', 'vehicle')
-                ]
-                
                 cursor.executemany("""
                     INSERT INTO guidelines (title, content, category) VALUES (%s, %s, %s)
                 """, guidelines_data)
                 
                 # Insert sample parking slots
-                slot_data = []
-                for location in ['mall', 'office', 'hospital']:
-                    for slot_num in range(1, 11):
-                        slot_data.append((location, slot_num, 'available'))
-                
                 cursor.executemany("""
                     INSERT INTO ParkingSlot (location, slot_number, status) VALUES (%s, %s, %s)
-                """, slot_data)
+                """, sample_slots())
                 
                 print("✅ Sample data inserted successfully!")
             else:
@@ -210,6 +229,11 @@ def setup_database():
             # Commit changes
             connection.commit()
             
+            # Apply schema migrations (indexes, rollup tables, ...)
+            print("🧱 Applying schema migrations...")
+            migrations.migrate(connection, 'mysql', verbose=True)
+            print(f"✅ Schema at version {migrations.current_version(connection, 'mysql')}")
+            
             # Show table counts
             print("\n📊 Database Summary:")
             tables = ['users', 'admins', 'ParkingSlot', 'payments', 'notifications', 'features', 'guidelines']
@@ -236,7 +260,84 @@ def setup_database():
         print(f"❌ Unexpected error: {e}")
         return False
 
+def migrate_mysql_database():
+    """Apply pending schema migrations to an existing MySQL database"""
+    
+    try:
+        import mysql.connector
+    except ImportError:
+        print("❌ mysql-connector-python not installed!")
+        print("Please install it: pip install mysql-connector-python")
+        return False
+    
+    try:
+        connection = mysql.connector.connect(database='parking_system1', **MYSQL_CONFIG)
+        try:
+            print(f"🧱 Schema version: {migrations.current_version(connection, 'mysql')}")
+            applied = migrations.migrate(connection, 'mysql', verbose=True)
+            if not applied:
+                print("ℹ️ Schema is up to date")
+            print(f"✅ Schema at version {migrations.current_version(connection, 'mysql')}")
+        finally:
+            connection.close()
+        return True
+    except Exception as e:
+        print(f"❌ Migration error: {e}")
+        return False
+
+def setup_sqlite_database(path):
+    """Set up the embedded SQLite database used when DB_BACKEND=sqlite"""
+    
+    print(f"🚀 Setting up SQLite database at '{path}'...")
+    
+    from storage import SQLiteBackend, TABLES
+    
+    backend = SQLiteBackend(path)
+    connection = backend.connect()
+    try:
+        backend.init_schema(connection)
+        print("✅ All tables created successfully!")
+        print(f"✅ Schema at version {migrations.current_version(connection, 'sqlite')}")
+        
+        cursor = backend.cursor(connection)
+        cursor.execute("SELECT COUNT(*) FROM notifications")
+        if cursor.fetchone()[0] == 0:
+            print("📝 Inserting sample data...")
+            cursor.executemany("INSERT INTO notifications (title, message, type) VALUES (%s, %s, %s)", notifications_data)
+            cursor.executemany("INSERT INTO features (title, description, icon) VALUES (%s, %s, %s)", features_data)
+            cursor.executemany("INSERT INTO guidelines (title, content, category) VALUES (%s, %s, %s)", guidelines_data)
+            cursor.executemany("INSERT INTO ParkingSlot (location, slot_number, status) VALUES (%s, %s, %s)", sample_slots())
+            migrations.BACKFILL_LOCATIONS.apply(cursor, 'sqlite')
+            connection.commit()
+            print("✅ Sample data inserted successfully!")
+        else:
+            print("ℹ️ Sample data already exists, skipping...")
+        
+        print("\n📊 Database Summary:")
+        for table in TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            print(f"   - {table}: {cursor.fetchone()[0]} records")
+        cursor.close()
+    except Exception as e:
+        print(f"❌ SQLite setup error: {e}")
+        return False
+    finally:
+        connection.close()
+    
+    print("\n🎉 Database setup completed successfully!")
+    print("You can now run: DB_BACKEND=sqlite SQLITE_PATH=" + path + " python app.py")
+    return True
+
 if __name__ == "__main__":
-    success = setup_database()
+    parser = argparse.ArgumentParser(description="Set up the Parking Management System database")
+    parser.add_argument('--sqlite', metavar='PATH', help="create an embedded SQLite database instead of MySQL")
+    parser.add_argument('--migrate', action='store_true', help="only apply pending schema migrations to MySQL")
+    args = parser.parse_args()
+    if args.migrate:
+        success = migrate_mysql_database()
+    elif args.sqlite:
+        success = setup_sqlite_database(args.sqlite)
+    else:
+        success = setup_database()
     if not success:
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1) 
\ No newline at end of file
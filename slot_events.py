@@ -0,0 +1,292 @@
+"""
+Live Slot Events
+Pushes slot status changes to browsers as Server-Sent Events, one stream
+per location.
+
+The slot index reports every change (bookings, releases, reconciles) to
+publish(). Changes are coalesced per location for `coalesce` seconds --
+a burst of bookings becomes one event carrying each slot's latest status --
+then encoded once and appended to a short per-location history. Every
+subscriber of that location gets the same pre-encoded bytes, so fan-out
+costs a wake-up and a socket write per subscriber, not a query or a render.
+
+A subscription can be read two ways. Iterating it (WSGI) blocks a server
+thread between events. `async for` over it (asgi.py) waits on an
+asyncio.Queue of its own, which the flusher thread feeds through the
+subscriber's event loop, so any number of streams share the loop thread.
+A queue that fills up (a client that stopped reading) is emptied down to
+the newest event, and the gap in versions makes that subscriber start over
+from a snapshot.
+
+Events carry absolute statuses, so applying one twice is harmless. Each
+has an id, "<epoch>.<version>": the location's event version, qualified by
+the hub's epoch, a random id drawn on first use, because versions restart
+at 1 in every process. A reconnecting EventSource sends the id back as
+Last-Event-ID and resumes from the history, or gets a fresh snapshot if it
+fell too far behind or the id is another process's.
+"""
+
+import asyncio
+import collections
+import json
+import os
+import threading
+import time
+
+
+class TooManySubscribers(Exception):
+    """Raised when the subscriber limit is reached."""
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, separators=(',', ':'))}"]
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def _offer(queue, item):
+    if queue.full():
+        # Keep only the newest event: the subscriber sees the version gap and takes a snapshot
+        while not queue.empty():
+            queue.get_nowait()
+    queue.put_nowait(item)
+
+
+class _Channel:
+    """History, wake-up condition and async subscriber queues for one location."""
+
+    __slots__ = ('version', 'history', 'cond', 'queues', 'subscribers')
+
+    def __init__(self, lock, history):
+        self.version = 0
+        self.history = collections.deque(maxlen=history)  # (version, encoded event)
+        self.cond = threading.Condition(lock)
+        self.queues = {}  # asyncio.Queue -> its event loop
+        self.subscribers = 0
+
+
+class Subscription:
+    """A reserved subscriber slot and its SSE byte stream.
+
+    Iterate it on a thread or `async for` over it on an event loop; the slot
+    is released when the stream ends or close() is called (the server closes
+    the response), even if the stream was never read.
+    """
+
+    def __init__(self, hub, location, channel, last_event_id):
+        self.hub = hub
+        self.location = location
+        self.channel = channel
+        self.last_event_id = last_event_id
+        self._closed = False
+
+    def __iter__(self):
+        return self.hub._events_for(self)
+
+    def __aiter__(self):
+        return self.hub._async_events_for(self)
+
+    def close(self):
+        self.hub._release(self)
+
+
+class SlotEventHub:
+    """Coalescing SSE broadcaster.
+
+    snapshot: callable(location) -> {'slots': [...], 'counts': {...}} built
+    from the slot index, sent to new (or lagging) subscribers.
+    """
+
+    def __init__(self, snapshot, coalesce=0.25, history=256, heartbeat=15.0, max_subscribers=1000):
+        self._snapshot = snapshot
+        self.coalesce = coalesce
+        self.history = history
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._pending_ready = threading.Condition(self._lock)
+        self._pending = {}  # location -> {slot_id: (slot_number, status)}
+        self._channels = {}
+        self.epoch = None  # u32, drawn with the first channel (after any fork)
+        self._subscribers = 0
+        self._thread = None
+        self._published = 0
+        self._events = 0
+
+    def _channel(self, location):
+        if self.epoch is None:
+            self.epoch = int.from_bytes(os.urandom(4), 'big')
+        channel = self._channels.get(location)
+        if channel is None:
+            channel = self._channels[location] = _Channel(self._lock, self.history)
+        return channel
+
+    # ----------------- Publishing -----------------
+    def publish(self, location, changes, local=True):
+        """Queue [(slot_id, slot_number, status), ...] for location (a SlotIndex listener)."""
+        self._ensure_flusher()
+        with self._lock:
+            pending = self._pending.setdefault(location, {})
+            for slot_id, number, status in changes:
+                pending[slot_id] = (number, status)
+            self._published += len(changes)
+            self._pending_ready.notify()
+
+    def _ensure_flusher(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slot-events', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._pending_ready.wait()
+            time.sleep(self.coalesce)  # let the burst finish
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                for location, slots in pending.items():
+                    channel = self._channel(location)
+                    channel.version += 1
+                    data = {
+                        'location': location,
+                        'epoch': self.epoch,
+                        'version': channel.version,
+                        'slots': [{'id': slot_id, 'slot_number': number, 'status': status}
+                                  for slot_id, (number, status) in slots.items()],
+                    }
+                    item = (channel.version, _sse('delta', data, f"{self.epoch}.{channel.version}"))
+                    channel.history.append(item)
+                    self._events += 1
+                    channel.cond.notify_all()
+                    for queue, loop in list(channel.queues.items()):
+                        try:
+                            loop.call_soon_threadsafe(_offer, queue, item)
+                        except RuntimeError:  # its loop is closed
+                            del channel.queues[queue]
+
+    # ----------------- Subscribing -----------------
+    def stream(self, location, last_event_id=None):
+        """Subscription to location's SSE stream; runs until the client disconnects.
+
+        The subscriber slot is taken here: raises TooManySubscribers if the hub is full.
+        """
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                raise TooManySubscribers(f"{self._subscribers} subscribers already connected")
+            channel = self._channel(location)
+            self._subscribers += 1
+            channel.subscribers += 1
+        return Subscription(self, location, channel, last_event_id)
+
+    def _release(self, subscription):
+        with self._lock:
+            if subscription._closed:
+                return
+            subscription._closed = True
+            self._subscribers -= 1
+            subscription.channel.subscribers -= 1
+
+    def _events_for(self, subscription):
+        location, channel = subscription.location, subscription.channel
+        try:
+            yield b"retry: 3000\n\n"
+            seen = self._resume_point(channel, subscription.last_event_id)
+            if seen is None:
+                with self._lock:
+                    seen = channel.version
+                yield self._snapshot_event(location, seen)
+            while True:
+                with self._lock:
+                    if channel.version == seen:
+                        channel.cond.wait(self.heartbeat)
+                    latest = channel.version
+                    oldest = channel.history[0][0] if channel.history else latest + 1
+                    pending = [event for version, event in channel.history if version > seen]
+                if latest == seen:
+                    yield b": keep-alive\n\n"
+                    continue
+                if seen + 1 < oldest:
+                    # Missed events that already left the history: start over from a snapshot
+                    yield self._snapshot_event(location, latest)
+                else:
+                    yield b''.join(pending)
+                seen = latest
+        finally:
+            subscription.close()
+
+    async def _async_events_for(self, subscription):
+        location, channel = subscription.location, subscription.channel
+        queue = asyncio.Queue(maxsize=self.history)
+        with self._lock:
+            # Registered before reading the resume point, so no event falls in between
+            channel.queues[queue] = asyncio.get_running_loop()
+            seen = self._resume_point(channel, subscription.last_event_id, locked=True)
+            backlog = [item for item in channel.history if seen is not None and item[0] > seen]
+            latest = channel.version
+        try:
+            yield b"retry: 3000\n\n"
+            if seen is None:
+                seen = latest
+                yield self._snapshot_event(location, seen)
+            elif backlog:
+                seen = backlog[-1][0]
+                yield b''.join(event for _, event in backlog)
+            while True:
+                try:
+                    version, event = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if version <= seen:
+                    continue
+                if version > seen + 1:
+                    # Events were dropped while this subscriber lagged: start over from a snapshot
+                    with self._lock:
+                        seen = channel.version
+                    yield self._snapshot_event(location, seen)
+                    continue
+                yield event
+                seen = version
+        finally:
+            with self._lock:
+                channel.queues.pop(queue, None)
+            subscription.close()
+
+    def _resume_point(self, channel, last_event_id, locked=False):
+        """Version to resume after, or None if a snapshot is needed (no id, another
+        epoch's id, or events the history no longer holds)."""
+        try:
+            epoch, _, version = (last_event_id or '').partition('.')
+            epoch, version = int(epoch), int(version)
+        except ValueError:
+            return None
+        if locked:
+            return self._resumable(channel, epoch, version)
+        with self._lock:
+            return self._resumable(channel, epoch, version)
+
+    def _resumable(self, channel, epoch, version):
+        oldest = channel.history[0][0] if channel.history else channel.version + 1
+        if epoch != self.epoch or version > channel.version or version + 1 < oldest:
+            return None
+        return version
+
+    def _snapshot_event(self, location, version):
+        data = dict(self._snapshot(location), location=location, epoch=self.epoch, version=version)
+        return _sse('snapshot', data, f"{self.epoch}.{version}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'locations': {location: {'version': channel.version, 'subscribers': channel.subscribers,
+                                         'async_subscribers': len(channel.queues)}
+                              for location, channel in self._channels.items()},
+                'changes_published': self._published,
+                'events_sent': self._events,
+                'coalesce_ms': round(self.coalesce * 1000),
+            }
@@ -0,0 +1,265 @@
+"""
+Slot Availability Index
+In-process copy of ParkingSlot status, keyed by location, so the slots page
+and availability API can answer without touching the database. Listeners
+are told about every status change, whether it came from the app or from a
+reconcile, and which of the two it was.
+
+Every location also carries its own version, bumped on each status change,
+and a bounded log of recent changes, so availability clients can ask for
+"what changed since version N" instead of a full copy. Versions count from 1
+in every process, so they are only meaningful together with the index's
+epoch, a random id drawn when it is first loaded: a client holding another
+epoch's version (another worker, or before a restart) gets a full copy.
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+from array import array
+
+STATUS_CODES = {'available': 0, 'booked': 1, 'maintenance': 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+CHANGE_LOG_SIZE = 4096
+
+# status byte -> '1' for available, '0' otherwise (see availability_bits)
+_BITS = bytes.maketrans(bytes(range(256)), b'1' + b'0' * 255)
+
+
+class _LocationSlots:
+    """Parallel arrays for one location, ordered by slot_number.
+
+    version counts status changes; log holds (version, position, code) for
+    the most recent ones and is complete for every version >= base.
+    """
+
+    __slots__ = ('ids', 'numbers', 'status', 'version', 'base', 'log', 'bits')
+
+    def __init__(self):
+        self.ids = array('l')
+        self.numbers = array('l')
+        self.status = bytearray()
+        self.version = 0
+        self.base = 0
+        self.log = collections.deque(maxlen=CHANGE_LOG_SIZE)
+        self.bits = None  # (version, packed availability) cache
+
+    def record(self, pos, code):
+        if len(self.log) == self.log.maxlen:
+            self.base = self.log[0][0]
+        self.status[pos] = code
+        self.version += 1
+        self.log.append((self.version, pos, code))
+
+
+class SlotIndex:
+    """Thread-safe availability index.
+
+    Each location keeps slot ids and numbers in compact arrays and status as
+    one byte per slot. A global id -> (location, position) map makes point
+    updates O(1).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._locations = {}
+        self._positions = {}
+        self.loaded = False
+        self.loaded_at = None
+        self.epoch = None  # u32, drawn at the first load (after any fork)
+        self.version = 0
+        self._reconciler = None
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call listener(location, [(slot_id, slot_number, status), ...], local) after status
+        changes; local is True for set_status() and False for changes found by a rebuild
+        (made by another process, or out of band)."""
+        self._listeners.append(listener)
+
+    def _notify(self, changes, local):
+        for location, slots in changes.items():
+            for listener in self._listeners:
+                try:
+                    listener(location, slots, local)
+                except Exception as e:
+                    logging.error(f"Slot index listener failed: {e}")
+
+    def rebuild(self, rows, expected_version=None):
+        """Replace the index from (id, location, slot_number, status, ...) rows.
+
+        If expected_version is given and the index changed while the rows were
+        being loaded, the (possibly stale) rows are discarded and False returned.
+        """
+        locations = {}
+        positions = {}
+        for row in sorted(rows, key=lambda r: (r[1], r[2])):
+            slot_id, location, slot_number, status = row[0], row[1], row[2], row[3]
+            entry = locations.get(location)
+            if entry is None:
+                entry = locations[location] = _LocationSlots()
+            positions[slot_id] = (location, len(entry.ids))
+            entry.ids.append(slot_id)
+            entry.numbers.append(slot_number)
+            entry.status.append(STATUS_CODES.get(status, STATUS_CODES['maintenance']))
+        with self._lock:
+            if expected_version is not None and self.version != expected_version:
+                return False
+            changes = self._merge_history(locations)
+            self._locations = locations
+            self._positions = positions
+            if not self.loaded:
+                self.epoch = int.from_bytes(os.urandom(4), 'big')
+            self.loaded = True
+            self.loaded_at = time.time()
+            self.version += 1
+        self._notify(changes, local=False)
+        return True
+
+    def _merge_history(self, locations):
+        """Carry versions and change logs over from the current index into freshly
+        loaded entries. Returns the slots whose status differs (new slots included)."""
+        changes = {}
+        for location, entry in locations.items():
+            old = self._locations.get(location)
+            if old is not None and old.ids == entry.ids and old.numbers == entry.numbers:
+                # Same slots: replay the differences into the old entry's history
+                status, entry.status = entry.status, old.status
+                entry.version, entry.base, entry.log, entry.bits = old.version, old.base, old.log, old.bits
+                if status == old.status:
+                    continue
+                for pos, code in enumerate(status):
+                    if entry.status[pos] != code:
+                        entry.record(pos, code)
+                        changes.setdefault(location, []).append(
+                            (entry.ids[pos], entry.numbers[pos], STATUS_NAMES[code]))
+                continue
+            # New location or slots added/removed: positions moved, so deltas restart here
+            entry.version = entry.base = (old.version + 1) if old is not None else 1
+            if not self.loaded:
+                continue
+            for slot_id, number, code in zip(entry.ids, entry.numbers, entry.status):
+                position = self._positions.get(slot_id)
+                if position is None or self._locations[position[0]].status[position[1]] != code:
+                    changes.setdefault(location, []).append((slot_id, number, STATUS_NAMES[code]))
+        return changes
+
+    def set_status(self, slot_id, status):
+        """Record a status change made through the app. Returns False for unknown slots."""
+        code = STATUS_CODES[status]
+        with self._lock:
+            position = self._positions.get(slot_id)
+            if position is None:
+                return False
+            location, pos = position
+            entry = self._locations[location]
+            if entry.status[pos] == code:
+                return True
+            entry.record(pos, code)
+            self.version += 1
+            number = entry.numbers[pos]
+        self._notify({location: [(slot_id, number, status)]}, local=True)
+        return True
+
+    def locations(self):
+        with self._lock:
+            return sorted(self._locations)
+
+    def slots(self, location):
+        """Rows shaped like SELECT id, location, slot_number, status FROM ParkingSlot."""
+        with self._lock:
+            entry = self._locations.get(location)
+            if entry is None:
+                return []
+            return [(slot_id, location, number, STATUS_NAMES[code])
+                    for slot_id, number, code in zip(entry.ids, entry.numbers, entry.status)]
+
+    def first_available(self, location, exclude=(), start=0):
+        """(slot_id, slot_number) of the first available slot not in exclude, or None.
+
+        The search begins at position start (modulo the number of slots) and
+        wraps around, so callers can spread concurrent picks over the location.
+        """
+        free = STATUS_CODES['available']
+        with self._lock:
+            entry = self._locations.get(location)
+            if entry is None or not entry.status:
+                return None
+            start %= len(entry.status)
+            for begin, end in ((start, len(entry.status)), (0, start)):
+                pos = entry.status.find(free, begin, end)
+                while pos != -1:
+                    if entry.ids[pos] not in exclude:
+                        return entry.ids[pos], entry.numbers[pos]
+                    pos = entry.status.find(free, pos + 1, end)
+            return None
+
+    def availability_bits(self, location):
+        """(version, slot_numbers, bitset) for location, or None if unknown.
+
+        Bit i of the bitset (MSB first within each byte, like numpy.packbits)
+        is 1 when slot_numbers[i] is available. Packed once per version.
+        """
+        with self._lock:
+            entry = self._locations.get(location)
+            if entry is None:
+                return None
+            if entry.bits is None or entry.bits[0] != entry.version:
+                count = len(entry.status)
+                digits = entry.status.translate(_BITS) + b'0' * (-count % 8)
+                entry.bits = (entry.version, int(digits, 2).to_bytes(len(digits) // 8, 'big') if count else b'')
+            return entry.version, entry.numbers, entry.bits[1]
+
+    def changes_since(self, location, since, epoch):
+        """(version, became_available, became_unavailable) position lists since version
+        `since` of `epoch`, or None if that is another epoch's version or the log no
+        longer reaches back that far (send everything)."""
+        with self._lock:
+            entry = self._locations.get(location)
+            if entry is None or epoch != self.epoch or since < entry.base or since > entry.version:
+                return None
+            latest = {}
+            for version, pos, code in reversed(entry.log):
+                if version <= since:
+                    break
+                latest.setdefault(pos, code)
+            version = entry.version
+        free = STATUS_CODES['available']
+        return (version, sorted(pos for pos, code in latest.items() if code == free),
+                sorted(pos for pos, code in latest.items() if code != free))
+
+    def location_versions(self):
+        """{location: (version, available, total)}"""
+        free = STATUS_CODES['available']
+        with self._lock:
+            return {location: (entry.version, entry.status.count(free), len(entry.status))
+                    for location, entry in self._locations.items()}
+
+    def counts(self, location):
+        with self._lock:
+            entry = self._locations.get(location)
+            status = bytes(entry.status) if entry is not None else b''
+        return {name: status.count(code) for name, code in STATUS_CODES.items()} | {'total': len(status)}
+
+    # -------------------------
+    # Reconciliation
+    # -------------------------
+    def start_reconciler(self, load_rows, interval):
+        """Periodically rebuild from load_rows() to pick up out-of-band changes."""
+        if self._reconciler is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    version = self.version
+                    self.rebuild(load_rows(), expected_version=version)
+                except Exception as e:
+                    logging.error(f"Slot index reconcile failed: {e}")
+
+        self._reconciler = threading.Thread(target=run, name='slot-index-reconciler', daemon=True)
+        self._reconciler.start()
@@ -0,0 +1,194 @@
+"""
+Slot Release Scheduler
+Hands booked slots back when their reservation ends.
+
+Expiries live in a min-heap of (expires_at, slot_id), so the thread only
+ever looks at the earliest one: it sleeps until that moment (or until an
+earlier expiry is scheduled), pops everything that is due and releases it
+with one batched UPDATE per max_batch slots. Scheduling and each release
+are O(log n), so hundreds of thousands of active bookings cost a heap of
+tuples and nothing per tick.
+
+Extending a reservation simply pushes a new entry; the old one is skipped
+when it surfaces because it no longer matches the slot's latest expiry.
+The UPDATE itself re-checks reserved_until, so a stale entry, another
+worker or another process can never release a slot early. A periodic sweep
+of expired_slots() picks up bookings made by other processes.
+"""
+
+import datetime
+import heapq
+import logging
+import threading
+import time
+
+from storage import DataStore
+
+
+class SlotReleaseScheduler:
+    """Min-heap driven release of expired ParkingSlot reservations.
+
+    get_pool: callable returning the db_pool.ConnectionPool to write through.
+    on_release: called with the list of released slot ids (e.g. to update
+    the slot index).
+    """
+
+    RETRY_SECONDS = 5.0
+
+    def __init__(self, backend, get_pool, on_release=None, max_batch=500, sweep_interval=60.0):
+        self.backend = backend
+        self._get_pool = get_pool
+        self._on_release = on_release
+        self.max_batch = max_batch
+        self.sweep_interval = sweep_interval
+        self._heap = []
+        self._expiry = {}  # slot_id -> latest expires_at (epoch seconds)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._next_sweep = 0.0
+        self._released = 0
+        self._batches = 0
+        self._stale = 0
+        self._errors = 0
+
+    # ----------------- Scheduling -----------------
+    def schedule(self, slot_id, expires_at):
+        """Release slot_id at expires_at (datetime or epoch seconds), replacing any earlier schedule."""
+        when = expires_at.timestamp() if hasattr(expires_at, 'timestamp') else float(expires_at)
+        with self._cond:
+            self._expiry[slot_id] = when
+            heapq.heappush(self._heap, (when, slot_id))
+            if self._heap[0] == (when, slot_id):
+                self._cond.notify()  # new earliest expiry: wake the thread early
+            self._compact()
+
+    def cancel(self, slot_id):
+        with self._cond:
+            self._expiry.pop(slot_id, None)
+
+    def load(self, rows):
+        """Replace the schedule with (slot_id, reserved_until) rows, e.g. DataStore.reserved_slots()."""
+        expiry = {slot_id: until.timestamp() for slot_id, until in rows if hasattr(until, 'timestamp')}
+        heap = [(when, slot_id) for slot_id, when in expiry.items()]
+        heapq.heapify(heap)
+        with self._cond:
+            self._expiry = expiry
+            self._heap = heap
+            self._cond.notify()
+
+    def _compact(self):
+        # Extensions and cancels leave dead entries behind; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._expiry) + 1024:
+            self._heap = [(when, slot_id) for slot_id, when in self._expiry.items()]
+            heapq.heapify(self._heap)
+
+    def _due(self):
+        """Pop up to max_batch due slot ids, waiting until at least one is due or a sweep is."""
+        with self._cond:
+            while True:
+                now = time.time()
+                due = []
+                while self._heap and self._heap[0][0] <= now and len(due) < self.max_batch:
+                    when, slot_id = heapq.heappop(self._heap)
+                    if self._expiry.get(slot_id) == when:
+                        del self._expiry[slot_id]
+                        due.append(slot_id)
+                    else:
+                        self._stale += 1
+                if due or (self.sweep_interval > 0 and now >= self._next_sweep):
+                    return due
+                timeout = self._heap[0][0] - now if self._heap else None
+                if self.sweep_interval > 0:
+                    until_sweep = self._next_sweep - now
+                    timeout = until_sweep if timeout is None else min(timeout, until_sweep)
+                self._cond.wait(timeout)
+
+    # ----------------- Worker -----------------
+    def start(self, load_rows=None):
+        """Start the release thread, seeding the heap from load_rows() (reserved_slots) first."""
+        if self._thread is not None:
+            return
+        if load_rows is not None:
+            self.load(load_rows())
+        self._next_sweep = time.time() + self.sweep_interval
+        self._thread = threading.Thread(target=self._run, name='slot-release', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            due = self._due()
+            try:
+                if due:
+                    self._release(due)
+                else:
+                    self._next_sweep = time.time() + self.sweep_interval
+                    self._sweep()
+            except Exception as e:
+                logging.error(f"Releasing {len(due)} slots failed: {e}")
+                with self._cond:
+                    self._errors += 1
+                retry = time.time() + self.RETRY_SECONDS
+                for slot_id in due:
+                    self.schedule(slot_id, retry)
+
+    def _with_store(self, work):
+        pool = self._get_pool()
+        pooled = pool.acquire()
+        broken = False
+        try:
+            return work(DataStore(self.backend, lambda: pooled.raw))
+        except self.backend.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.release(pooled, broken=broken)
+
+    def _release(self, slot_ids):
+        now = time.time()
+        released = self._with_store(lambda store: store.release_slots(slot_ids, _db_time(now)))
+        self._released_batch(released)
+
+    def _sweep(self):
+        """Release expired slots this process never scheduled (booked elsewhere)."""
+        def work(store):
+            released = []
+            while True:
+                now = _db_time(time.time())
+                expired = store.expired_slots(now, limit=self.max_batch)
+                batch = store.release_slots(expired, now) if expired else []
+                released.extend(batch)
+                if len(expired) < self.max_batch or not batch:
+                    return released
+        released = self._with_store(work)
+        with self._cond:
+            for slot_id in released:
+                self._expiry.pop(slot_id, None)
+        self._released_batch(released)
+
+    def _released_batch(self, released):
+        if not released:
+            return
+        with self._cond:
+            self._batches += 1
+            self._released += len(released)
+        if self._on_release is not None:
+            self._on_release(released)
+
+    def stats(self):
+        with self._cond:
+            next_expiry = self._heap[0][0] if self._heap else None
+            return {
+                'scheduled': len(self._expiry),
+                'heap_size': len(self._heap),
+                'next_expiry_in': None if next_expiry is None else round(max(next_expiry - time.time(), 0.0), 1),
+                'released': self._released,
+                'batches': self._batches,
+                'stale_entries': self._stale,
+                'errors': self._errors,
+                'running': self._thread is not None,
+            }
+
+
+def _db_time(epoch):
+    """Naive local datetime, matching how reserved_until is stored."""
+    return datetime.datetime.fromtimestamp(int(epoch))
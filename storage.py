@@ -0,0 +1,985 @@
+"""
+Storage Backends
+Data-access layer for the parking system. Routes talk to DataStore, which
+issues portable SQL through a Backend (MySQL or embedded SQLite).
+"""
+
+import base64
+import datetime
+import functools
+import json
+import os
+import sqlite3
+
+import migrations
+import revenue
+
+
+# -------------------------
+# Backends
+# -------------------------
+class Backend:
+    """Driver-specific connection handling.
+
+    SQL in this module is written with %s placeholders (MySQLdb style);
+    backends with a different paramstyle translate it in cursor().
+    """
+
+    name = None
+    Error = Exception
+    IntegrityError = Exception
+    OperationalError = Exception
+
+    def connect(self):
+        raise NotImplementedError
+
+    def ping(self, conn):
+        raise NotImplementedError
+
+    def cursor(self, conn):
+        return conn.cursor()
+
+    def stream_cursor(self, conn):
+        """Cursor whose rows are pulled with fetchmany() as they are read rather
+        than buffered client-side. Nothing else may use conn until it is closed."""
+        return self.cursor(conn)
+
+    def init_schema(self, conn):
+        """Create any missing tables. MySQL schemas come from database_setup.sql."""
+
+    def upsert_increment(self, keys, counters):
+        """Clause turning an INSERT into 'add counters to the existing row on key conflict'."""
+        raise NotImplementedError
+
+    def skip_locked(self):
+        """Clause making a SELECT lock the rows it returns and pass over rows other
+        transactions hold, or '' where the backend has no row locks."""
+        return ''
+
+
+class MySQLBackend(Backend):
+    name = 'mysql'
+
+    def __init__(self, host, user, password, db, port=3306):
+        import MySQLdb
+        import MySQLdb.cursors
+        self._driver = MySQLdb
+        self.Error = MySQLdb.Error
+        self.IntegrityError = MySQLdb.IntegrityError
+        self.OperationalError = MySQLdb.OperationalError
+        self.params = dict(host=host, user=user, passwd=password, db=db, port=port, charset='utf8mb4')
+
+    def connect(self):
+        return self._driver.connect(**self.params)
+
+    def ping(self, conn):
+        conn.ping()
+
+    def stream_cursor(self, conn):
+        return conn.cursor(self._driver.cursors.SSCursor)
+
+    def skip_locked(self):
+        return ' FOR UPDATE SKIP LOCKED'  # MySQL 8.0+
+
+    def upsert_increment(self, keys, counters):
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = {c} + VALUES({c})" for c in counters)
+
+
+@functools.lru_cache(maxsize=512)
+def _to_qmark(sql):
+    """Translate %s placeholders to sqlite's ? (cached per statement text)."""
+    return sql.replace('%s', '?')
+
+
+class _SQLiteCursor:
+    """DB-API cursor wrapper that accepts MySQLdb-style %s placeholders."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, params=()):
+        return self._cur.execute(_to_qmark(sql), params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._cur.executemany(_to_qmark(sql), seq_of_params)
+
+    def __getattr__(self, attr):
+        return getattr(self._cur, attr)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+
+def _convert_timestamp(value):
+    text = value.decode()
+    for fmt in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return text
+
+
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+
+
+def timestamp_value(value):
+    """Timestamp from an aggregate such as MAX(updated_at): sqlite loses the
+    column type on aggregates, so no converter ran and the value is text."""
+    if isinstance(value, str):
+        return _convert_timestamp(value.encode())
+    return value
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    phone VARCHAR(15),
+    profile_picture VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS admins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    phone VARCHAR(15),
+    role VARCHAR(20) DEFAULT 'admin',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS ParkingSlot (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    location VARCHAR(100) NOT NULL,
+    slot_number INT NOT NULL,
+    status TEXT CHECK (status IN ('available', 'booked', 'maintenance')) DEFAULT 'available',
+    user_id INT NULL REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (location, slot_number)
+);
+
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    plot_no VARCHAR(20) NOT NULL,
+    vehicle_no VARCHAR(20) NOT NULL,
+    vehicle_type TEXT CHECK (vehicle_type IN ('2wheeler', '4wheeler')) NOT NULL,
+    hours INT NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    payment_type TEXT CHECK (payment_type IN ('cash', 'card', 'online')) NOT NULL,
+    payment_status TEXT CHECK (payment_status IN ('pending', 'completed', 'failed')) DEFAULT 'completed',
+    location VARCHAR(100) NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS revenue_rollup (
+    day DATE NOT NULL,
+    location VARCHAR(100) NOT NULL,
+    vehicle_type VARCHAR(20) NOT NULL,
+    payment_type VARCHAR(20) NOT NULL,
+    payment_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, location, vehicle_type, payment_type)
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(200) NOT NULL,
+    message TEXT NOT NULL,
+    type TEXT CHECK (type IN ('info', 'warning', 'success', 'error')) DEFAULT 'info',
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS features (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(200) NOT NULL,
+    description TEXT NOT NULL,
+    icon VARCHAR(50),
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS guidelines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(200) NOT NULL,
+    content TEXT NOT NULL,
+    category VARCHAR(50),
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# SQLite has no ON UPDATE CURRENT_TIMESTAMP; emulate it per table.
+_UPDATED_AT_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_updated_at AFTER UPDATE ON {table}
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+"""
+
+TABLES = ['users', 'admins', 'ParkingSlot', 'payments', 'notifications', 'features', 'guidelines']
+
+
+class SQLiteBackend(Backend):
+    """Embedded, zero-network backend (WAL journal, cached prepared statements)."""
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+    OperationalError = sqlite3.OperationalError
+
+    def __init__(self, path, busy_timeout=5.0, cached_statements=256):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+
+    def connect(self):
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def ping(self, conn):
+        conn.execute("SELECT 1")
+
+    def cursor(self, conn):
+        return _SQLiteCursor(conn.cursor())
+
+    def upsert_increment(self, keys, counters):
+        return (f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+                + ", ".join(f"{c} = {c} + excluded.{c}" for c in counters))
+
+    def init_schema(self, conn):
+        conn.executescript(SQLITE_SCHEMA)
+        for table in TABLES:
+            conn.executescript(_UPDATED_AT_TRIGGER.format(table=table))
+        conn.commit()
+        migrations.migrate(conn, 'sqlite')
+
+
+def config_from_env():
+    """Backend settings from the same environment variables app.py reads."""
+    return {
+        'DB_BACKEND': os.getenv('DB_BACKEND', 'mysql'),
+        'SQLITE_PATH': os.getenv('SQLITE_PATH', 'parking_system1.db'),
+        'MYSQL_HOST': os.getenv('MYSQL_HOST', 'localhost'),
+        'MYSQL_USER': os.getenv('MYSQL_USER', 'root'),
+        'MYSQL_PASSWORD': os.getenv('MYSQL_PASSWORD', 'kane@22*'),
+        'MYSQL_DB': os.getenv('MYSQL_DB', 'parking_system1'),
+        'MYSQL_PORT': int(os.getenv('MYSQL_PORT', 3306)),
+    }
+
+
+def create_backend(config):
+    """Build the backend selected by config['DB_BACKEND'] ('mysql' or 'sqlite')."""
+    kind = (config.get('DB_BACKEND') or 'mysql').lower()
+    if kind == 'sqlite':
+        return SQLiteBackend(config.get('SQLITE_PATH', 'parking_system1.db'))
+    if kind == 'mysql':
+        return MySQLBackend(
+            host=config['MYSQL_HOST'],
+            user=config['MYSQL_USER'],
+            password=config['MYSQL_PASSWORD'],
+            db=config['MYSQL_DB'],
+            port=config['MYSQL_PORT'],
+        )
+    raise ValueError(f"Unknown DB_BACKEND '{kind}' (expected 'mysql' or 'sqlite')")
+
+
+# -------------------------
+# Keyset pagination
+# -------------------------
+MAX_PAGE_SIZE = 100
+
+# Tables exposed through DataStore.page(). 'filters' maps a request
+# parameter to (column, comparison operator).
+PAGINATED_TABLES = {
+    'users': {
+        'table': 'users',
+        'columns': ['id', 'username', 'email', 'phone', 'created_at'],
+        'sortable': ['id', 'created_at', 'username'],
+        'filters': {
+            'username': ('username', '='),
+            'email': ('email', '='),
+            'created_from': ('created_at', '>='),
+            'created_to': ('created_at', '<'),
+        },
+    },
+    'slots': {
+        'table': 'ParkingSlot',
+        'columns': ['id', 'location', 'slot_number', 'status', 'user_id', 'level', 'slot_type'],
+        'sortable': ['id', 'location', 'slot_number'],
+        'filters': {
+            'location': ('location', '='),
+            'status': ('status', '='),
+            'user_id': ('user_id', '='),
+        },
+    },
+    'payments': {
+        'table': 'payments',
+        'columns': ['id', 'user_id', 'plot_no', 'vehicle_no', 'vehicle_type', 'hours', 'amount',
+                    'payment_type', 'payment_status', 'created_at'],
+        'sortable': ['id', 'created_at', 'amount'],
+        'filters': {
+            'user_id': ('user_id', '='),
+            'vehicle_type': ('vehicle_type', '='),
+            'payment_type': ('payment_type', '='),
+            'payment_status': ('payment_status', '='),
+            'created_from': ('created_at', '>='),
+            'created_to': ('created_at', '<'),
+        },
+    },
+    'notifications': {
+        'table': 'notifications',
+        'columns': ['id', 'title', 'message', 'created_at'],
+        'sortable': ['id', 'created_at'],
+        'filters': {
+            'is_active': ('is_active', '='),
+        },
+    },
+}
+
+
+def page_query(name, sort='id', descending=True, after=None, limit=20, filters=None):
+    """(sql, params, limit) fetching one keyset page of a PAGINATED_TABLES entry,
+    plus one extra row to tell whether another page follows."""
+    spec = PAGINATED_TABLES.get(name)
+    if spec is None:
+        raise KeyError(name)
+    if sort not in spec['sortable']:
+        raise ValueError(f"Cannot sort {name} by '{sort}'")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    where, params = [], []
+    for param, value in (filters or {}).items():
+        if param not in spec['filters']:
+            raise ValueError(f"Cannot filter {name} by '{param}'")
+        column, op = spec['filters'][param]
+        where.append(f"{column} {op} %s")
+        params.append(value)
+
+    op = '<' if descending else '>'
+    if after is not None:
+        if len(after) != 2:
+            raise ValueError("Malformed cursor")
+        if sort == 'id':
+            where.append(f"id {op} %s")
+            params.append(after[1])
+        else:
+            # Tie-break on id so equal sort values still paginate deterministically
+            where.append(f"({sort} {op} %s OR ({sort} = %s AND id {op} %s))")
+            params.extend([after[0], after[0], after[1]])
+
+    direction = 'DESC' if descending else 'ASC'
+    order = f"id {direction}" if sort == 'id' else f"{sort} {direction}, id {direction}"
+    sql = f"SELECT {', '.join(spec['columns'])} FROM {spec['table']}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT %s"
+    params.append(limit + 1)
+    return sql, tuple(params), limit
+
+
+def page_result(name, sort, limit, rows):
+    """(rows, next_cursor) from the rows page_query() fetched."""
+    columns = PAGINATED_TABLES[name]['columns']
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = [last[columns.index(sort)], last[0]]
+    return rows, next_cursor
+
+
+# Tables exposed through DataStore.iter_export() (passwords never leave the DB)
+EXPORT_TABLES = {
+    'payments': {
+        'table': 'payments',
+        'columns': ['id', 'user_id', 'plot_no', 'vehicle_no', 'vehicle_type', 'hours', 'amount',
+                    'payment_type', 'payment_status', 'location', 'created_at', 'updated_at'],
+    },
+    'slots': {
+        'table': 'ParkingSlot',
+        'columns': ['id', 'location', 'slot_number', 'status', 'user_id', 'level', 'slot_type',
+                    'created_at', 'updated_at'],
+    },
+    'users': {
+        'table': 'users',
+        'columns': ['id', 'username', 'email', 'phone', 'created_at', 'updated_at'],
+    },
+}
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date,)):
+        return value.isoformat()
+    if hasattr(value, 'is_finite'):  # Decimal
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe token for a keyset position."""
+    raw = json.dumps([_cursor_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list):
+        raise ValueError("Malformed cursor")
+    return values
+
+
+# -------------------------
+# Data store
+# -------------------------
+class DataStore:
+    """All queries the web app issues, grouped by table.
+
+    get_connection: callable returning the DB-API connection to use (app.py
+    passes its per-request pooled connection).
+    """
+
+    def __init__(self, backend, get_connection):
+        self.backend = backend
+        self._get_connection = get_connection
+
+    def cursor(self):
+        return self.backend.cursor(self._get_connection())
+
+    def commit(self):
+        self._get_connection().commit()
+
+    def _fetchone(self, sql, params=()):
+        cur = self.cursor()
+        try:
+            cur.execute(sql, params)
+            return cur.fetchone()
+        finally:
+            cur.close()
+
+    def _fetchall(self, sql, params=()):
+        cur = self.cursor()
+        try:
+            cur.execute(sql, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    def _write(self, sql, params=()):
+        """Run a single-statement write, commit it and return (lastrowid, rowcount)."""
+        cur = self.cursor()
+        try:
+            cur.execute(sql, params)
+            self.commit()
+            return cur.lastrowid, cur.rowcount
+        finally:
+            cur.close()
+
+    def page(self, name, sort='id', descending=True, after=None, limit=20, filters=None):
+        """One keyset-paginated page of a PAGINATED_TABLES entry.
+
+        after is a decoded cursor ([sort_value, id]) from a previous page.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        sql, params, limit = page_query(name, sort, descending, after, limit, filters)
+        return page_result(name, sort, limit, self._fetchall(sql, params))
+
+    def iter_export(self, name, start_id=None, end_id=None, chunk_size=1000):
+        """Yield lists of up to chunk_size EXPORT_TABLES rows in id order.
+
+        One query over [start_id, end_id] read through a streaming cursor, so
+        the table is never held in memory; an interrupted export resumes with
+        start_id = last exported id + 1.
+        """
+        spec = EXPORT_TABLES.get(name)
+        if spec is None:
+            raise KeyError(name)
+        where, params = [], []
+        if start_id is not None:
+            where.append("id >= %s")
+            params.append(int(start_id))
+        if end_id is not None:
+            where.append("id <= %s")
+            params.append(int(end_id))
+        sql = f"SELECT {', '.join(spec['columns'])} FROM {spec['table']}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id"
+
+        cur = self.backend.stream_cursor(self._get_connection())
+        try:
+            cur.execute(sql, tuple(params))
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield list(rows)
+        finally:
+            cur.close()
+
+    def dashboard_summary(self):
+        """Counts and sums for the admin dashboard, aggregated in SQL."""
+        cur = self.cursor()
+        try:
+            cur.execute("SELECT COUNT(*) FROM users")
+            user_count = cur.fetchone()[0] or 0
+            cur.execute("SELECT status, COUNT(*) FROM ParkingSlot GROUP BY status")
+            slots_by_status = {status: count for status, count in cur.fetchall()}
+            payment_count, total_amount = revenue.totals(cur)
+        finally:
+            cur.close()
+        return {
+            'user_count': user_count,
+            'slot_count': sum(slots_by_status.values()),
+            'slots_by_status': slots_by_status,
+            'payment_count': payment_count,
+            'total_amount': total_amount,
+        }
+
+    # Tables whose newest updated_at versions the public pages (see http_cache.py)
+    VERSIONED_TABLES = ('users', 'notifications', 'features', 'guidelines')
+
+    def max_updated_at(self, table):
+        if table not in self.VERSIONED_TABLES:
+            raise ValueError(f"No content version for table '{table}'")
+        return timestamp_value(self._fetchone(f"SELECT MAX(updated_at) FROM {table}")[0])
+
+    # ----------------- Users -----------------
+    def count_users(self):
+        return self._fetchone("SELECT COUNT(*) FROM users")[0] or 0
+
+    def get_user_by_email(self, email):
+        return self._fetchone("SELECT id, username, email, password FROM users WHERE email = %s", (email,))
+
+    def create_user(self, username, email, password_hash, phone=None, profile_picture=None):
+        user_id, _ = self._write(
+            'INSERT INTO users (username, email, password, phone, profile_picture) VALUES (%s, %s, %s, %s, %s)',
+            (username, email, password_hash, phone, profile_picture)
+        )
+        return user_id
+
+    # ----------------- Admins -----------------
+    def get_admin_by_email(self, email):
+        return self._fetchone("SELECT id, username, email, password FROM admins WHERE email = %s", (email,))
+
+    def create_admin(self, username, email, password_hash):
+        admin_id, _ = self._write(
+            'INSERT INTO admins (username, email, password) VALUES (%s, %s, %s)',
+            (username, email, password_hash)
+        )
+        return admin_id
+
+    # ----------------- Parking slots -----------------
+    def list_slots(self, location):
+        return self._fetchall(
+            "SELECT id, location, slot_number, status FROM ParkingSlot WHERE location = %s", (location,)
+        )
+
+    def list_all_slots(self):
+        return self._fetchall("SELECT id, location, slot_number, status, user_id FROM ParkingSlot")
+
+    def book_slot(self, slot_id, location, slot_number, user_id, reserved_until=None):
+        """Mark an available slot as booked. Returns True if this call won the slot.
+
+        reserved_until: when the release scheduler may hand the slot back
+        (None keeps it booked until someone frees it).
+        """
+        _, rowcount = self._write("""
+            UPDATE ParkingSlot
+            SET status = 'booked', user_id = %s, slot_number = %s, reserved_until = %s
+            WHERE id = %s AND location = %s AND status = 'available'
+        """, (user_id, slot_number, reserved_until, slot_id, location))
+        return rowcount > 0
+
+    def claim_any_slot(self, location, user_id, reserved_until=None):
+        """Book the lowest-numbered available slot at location in one transaction.
+
+        On MySQL the candidate row is locked with SKIP LOCKED, so concurrent
+        callers each get a different slot instead of queueing on the same row.
+        Returns (slot_id, slot_number), None if the location has no available
+        slot, or False if another transaction booked the chosen slot first
+        (possible only where the backend has no row locks).
+        """
+        conn = self._get_connection()
+        cur = self.cursor()
+        try:
+            cur.execute(f"""
+                SELECT id, slot_number FROM ParkingSlot
+                WHERE location = %s AND status = 'available'
+                ORDER BY slot_number LIMIT 1{self.backend.skip_locked()}
+            """, (location,))
+            row = cur.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            cur.execute("""
+                UPDATE ParkingSlot SET status = 'booked', user_id = %s, reserved_until = %s
+                WHERE id = %s AND status = 'available'
+            """, (user_id, reserved_until, row[0]))
+            if cur.rowcount <= 0:
+                conn.rollback()
+                return False
+            conn.commit()
+            return row[0], row[1]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    # ----------------- Locations -----------------
+    def list_locations(self):
+        return self._fetchall("SELECT id, name, capacity, levels, created_at FROM locations ORDER BY name")
+
+    def location_layout(self, name):
+        """(level, slot_type, status, count) rows for one location."""
+        return self._fetchall("""
+            SELECT level, slot_type, status, COUNT(*) FROM ParkingSlot
+            WHERE location = %s
+            GROUP BY level, slot_type, status ORDER BY level, slot_type, status
+        """, (name,))
+
+    def create_location(self, name, layout):
+        """Create a location with its slots materialized from layout, in one transaction.
+
+        layout: [(level, slot_type, count), ...] (see locations.parse_layout).
+        Raises backend.IntegrityError if the location already exists.
+        Returns (location_id, first_slot_number, last_slot_number).
+        """
+        conn = self._get_connection()
+        cur = self.cursor()
+        try:
+            cur.execute("INSERT INTO locations (name, capacity, levels) VALUES (%s, 0, 1)", (name,))
+            location_id = cur.lastrowid
+            first, last = self._insert_slots(cur, name, layout)
+            conn.commit()
+            return location_id, first, last
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def provision_slots(self, name, layout):
+        """Append slots to an existing location, numbered after its highest slot.
+
+        Returns (first_slot_number, last_slot_number), or None for an unknown
+        location. Two concurrent calls for one location cannot both commit:
+        the loser hits the (location, slot_number) unique key and raises
+        backend.IntegrityError.
+        """
+        conn = self._get_connection()
+        cur = self.cursor()
+        try:
+            cur.execute("SELECT id FROM locations WHERE name = %s", (name,))
+            if cur.fetchone() is None:
+                conn.rollback()
+                return None
+            numbers = self._insert_slots(cur, name, layout)
+            conn.commit()
+            return numbers
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def _insert_slots(self, cur, name, layout):
+        """Insert the layout's slots with one executemany (MySQL drivers send it as
+        multi-row INSERTs, SQLite reuses one prepared statement) and grow the
+        location's capacity and level count to match."""
+        cur.execute("SELECT MAX(slot_number) FROM ParkingSlot WHERE location = %s", (name,))
+        first = (cur.fetchone()[0] or 0) + 1
+        rows = []
+        for level, slot_type, count in layout:
+            start = first + len(rows)
+            rows.extend((name, number, 'available', level, slot_type) for number in range(start, start + count))
+        cur.executemany(
+            "INSERT INTO ParkingSlot (location, slot_number, status, level, slot_type) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+        cur.execute("""
+            UPDATE locations
+            SET capacity = capacity + %s, levels = CASE WHEN levels < %s THEN %s ELSE levels END
+            WHERE name = %s
+        """, (len(rows), max(level for level, _, _ in layout), max(level for level, _, _ in layout), name))
+        return first, first + len(rows) - 1
+
+    # ----------------- Reservations -----------------
+    def reserve_slot(self, slot_id, user_id, starts_at, ends_at, payment_id=None):
+        """Hold a slot for user_id until ends_at and record the reservation.
+
+        The slot must be booked by the same user or (if an earlier hold has
+        already lapsed) available again. Returns the reservation id, or None
+        if someone else has the slot.
+        """
+        conn = self._get_connection()
+        cur = self.cursor()
+        try:
+            cur.execute("""
+                UPDATE ParkingSlot
+                SET status = 'booked', user_id = %s, reserved_until = %s
+                WHERE id = %s AND (status = 'available' OR (status = 'booked' AND user_id = %s))
+            """, (user_id, ends_at, slot_id, user_id))
+            if cur.rowcount <= 0:
+                conn.rollback()
+                return None
+            cur.execute(
+                "INSERT INTO reservations (slot_id, user_id, payment_id, starts_at, ends_at) VALUES (%s, %s, %s, %s, %s)",
+                (slot_id, user_id, payment_id, starts_at, ends_at)
+            )
+            reservation_id = cur.lastrowid
+            conn.commit()
+            return reservation_id
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def reserved_slots(self):
+        """(slot_id, reserved_until) for every booked slot with an expiry."""
+        return self._fetchall(
+            "SELECT id, reserved_until FROM ParkingSlot WHERE status = 'booked' AND reserved_until IS NOT NULL"
+        )
+
+    def expired_slots(self, now, limit=500):
+        """Ids of booked slots whose reservation ended at or before now, oldest first."""
+        return [row[0] for row in self._fetchall("""
+            SELECT id FROM ParkingSlot
+            WHERE status = 'booked' AND reserved_until <= %s
+            ORDER BY reserved_until LIMIT %s
+        """, (now, limit))]
+
+    def release_slots(self, slot_ids, now):
+        """Make slots whose reservation ended by now available again, in one statement.
+
+        Slots that were extended or released meanwhile are left alone.
+        Returns the ids actually released.
+        """
+        slot_ids = list(slot_ids)
+        if not slot_ids:
+            return []
+        conn = self._get_connection()
+        cur = self.cursor()
+        where = f"id IN ({', '.join(['%s'] * len(slot_ids))}) AND status = 'booked' AND reserved_until <= %s"
+        params = tuple(slot_ids) + (now,)
+        try:
+            cur.execute(f"SELECT id FROM ParkingSlot WHERE {where}", params)
+            released = [row[0] for row in cur.fetchall()]
+            if released:
+                cur.execute(
+                    f"UPDATE ParkingSlot SET status = 'available', user_id = NULL, reserved_until = NULL WHERE {where}",
+                    params
+                )
+            conn.commit()
+            return released
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    # ----------------- Occupancy -----------------
+    def log_occupancy(self, events):
+        """Append (location, slot_id, status, occupied, total, occurred_at) rows in one transaction."""
+        conn = self._get_connection()
+        cur = self.cursor()
+        try:
+            cur.executemany(
+                "INSERT INTO occupancy_events (location, slot_id, status, occupied, total, occurred_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s)", events
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def iter_occupancy(self, since, chunk_size=10000):
+        """(location, occupied, total, occurred_at) chunks for events logged at or after since, in log order."""
+        row = self._fetchone("SELECT MIN(id) FROM occupancy_events WHERE occurred_at >= %s", (since,))
+        next_id = row[0] if row else None
+        while next_id is not None:
+            rows = self._fetchall(
+                "SELECT id, location, occupied, total, occurred_at FROM occupancy_events "
+                "WHERE id >= %s ORDER BY id LIMIT %s", (next_id, chunk_size)
+            )
+            if rows:
+                yield [row[1:] for row in rows]
+            if len(rows) < chunk_size:
+                return
+            next_id = rows[-1][0] + 1
+
+    # ----------------- Payments -----------------
+    def create_payment(self, user_id, plot_no, vehicle_no, vehicle_type, hours, amount, payment_type,
+                       payment_status='completed', location=None, idempotency_key=None):
+        """Insert a payment and fold it into revenue_rollup in the same transaction."""
+        return self.create_payments([dict(
+            user_id=user_id, plot_no=plot_no, vehicle_no=vehicle_no, vehicle_type=vehicle_type, hours=hours,
+            amount=amount, payment_type=payment_type, payment_status=payment_status, location=location,
+            idempotency_key=idempotency_key,
+        )])[0]
+
+    # Values the payments schema accepts (ENUM / VARCHAR(20) on MySQL)
+    PAYMENT_TYPES = ('cash', 'card', 'online')
+    PAYMENT_TEXT_MAX_LENGTH = 20  # plot_no, vehicle_no
+
+    _PAYMENT_COLUMNS = ['user_id', 'plot_no', 'vehicle_no', 'vehicle_type', 'hours', 'amount', 'payment_type',
+                        'payment_status', 'location', 'idempotency_key']
+
+    def create_payments(self, payments):
+        """Insert several payments (dicts of _PAYMENT_COLUMNS) and their rollups with one commit.
+
+        All or nothing: a duplicate idempotency_key raises backend.IntegrityError
+        and nothing is written. Returns the new ids in order.
+        """
+        conn = self._get_connection()
+        cur = self.cursor()
+        sql = (f"INSERT INTO payments ({', '.join(self._PAYMENT_COLUMNS)}) "
+               f"VALUES ({', '.join(['%s'] * len(self._PAYMENT_COLUMNS))})")
+        try:
+            payment_ids = []
+            for payment in payments:
+                values = {'payment_status': 'completed', 'location': None, 'idempotency_key': None}
+                values.update(payment)
+                cur.execute(sql, tuple(values[column] for column in self._PAYMENT_COLUMNS))
+                payment_ids.append(cur.lastrowid)
+                revenue.record_payment(cur, self.backend, cur.lastrowid)
+            conn.commit()
+            return payment_ids
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def find_payments_by_keys(self, keys):
+        """{idempotency_key: (id, user_id, plot_no, amount)} for the keys already stored."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self._fetchall(
+            f"SELECT idempotency_key, id, user_id, plot_no, amount FROM payments "
+            f"WHERE idempotency_key IN ({', '.join(['%s'] * len(keys))})", tuple(keys)
+        )
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def revenue_report(self, date_from=None, date_to=None, group_by=('day',)):
+        cur = self.cursor()
+        try:
+            return revenue.report(cur, date_from, date_to, group_by)
+        finally:
+            cur.close()
+
+    _BILL_SELECT = """
+        SELECT p.id, p.plot_no, p.vehicle_no, p.vehicle_type, p.hours, p.amount, p.payment_type, p.created_at, u.username
+        FROM payments p
+        JOIN users u ON p.user_id = u.id
+    """
+
+    def get_bill_data(self, payment_id):
+        return self._fetchone(self._BILL_SELECT + " WHERE p.id = %s", (payment_id,))
+
+    def iter_bill_data(self, date_from=None, date_to=None, payment_ids=None, chunk_size=500):
+        """Yield get_bill_data rows for many payments, chunk_size rows per query.
+
+        Either payment_ids (any order, yielded by id) or a created_at range
+        [date_from, date_to) walked in (created_at, id) keyset order, so each
+        chunk is one indexed query and only one chunk is held at a time.
+        """
+        if payment_ids is not None:
+            ids = sorted(set(int(payment_id) for payment_id in payment_ids))
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                yield from self._fetchall(
+                    self._BILL_SELECT + f" WHERE p.id IN ({', '.join(['%s'] * len(chunk))}) ORDER BY p.id",
+                    tuple(chunk)
+                )
+            return
+
+        where, params = [], []
+        if date_from is not None:
+            where.append("p.created_at >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("p.created_at < %s")
+            params.append(date_to)
+        after = None
+        while True:
+            conditions = list(where)
+            chunk_params = list(params)
+            if after is not None:
+                conditions.append("(p.created_at > %s OR (p.created_at = %s AND p.id > %s))")
+                chunk_params.extend([after[0], after[0], after[1]])
+            sql = self._BILL_SELECT
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY p.created_at, p.id LIMIT %s"
+            rows = self._fetchall(sql, tuple(chunk_params) + (chunk_size,))
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1][7], rows[-1][0])
+
+    # ----------------- Notifications -----------------
+    def notifications_feed(self, after=None, limit=10):
+        """Active notifications, newest first, one keyset page at a time.
+
+        Walks idx_notifications_active_created (is_active, created_at[, id])
+        so each page costs O(limit) regardless of how many notifications exist.
+        """
+        return self.page('notifications', sort='created_at', after=after, limit=limit,
+                         filters={'is_active': True})
+
+    # ----------------- Features -----------------
+    def list_features(self):
+        return self._fetchall("SELECT title, description, icon FROM features WHERE is_active = TRUE")
+
+    def add_feature(self, title, description, icon):
+        feature_id, _ = self._write(
+            "INSERT INTO features (title, description, icon) VALUES (%s, %s, %s)", (title, description, icon)
+        )
+        return feature_id
+
+    # ----------------- Guidelines -----------------
+    def list_guidelines(self):
+        return self._fetchall("SELECT title, content, category FROM guidelines WHERE is_active = TRUE")
+
+    def add_guideline(self, title, content, category):
+        guideline_id, _ = self._write(
+            "INSERT INTO guidelines (title, content, category) VALUES (%s, %s, %s)", (title, content, category)
+        )
+        return guideline_id
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Tariff Engine
+Prices parking from data-driven rate tables (tariffs.json) instead of
+branches in the routes. A rate applies to a location, a vehicle_type and a
+time band ('*' matches any); the most specific rate wins:
+
+    amount = base_amount + max(ceil(hours) - base_hours, 0) * hourly
+
+Rates are compiled once into NumPy arrays indexed [location, vehicle_type,
+band], so pricing thousands of (vehicle_type, hours, location) tuples is a
+handful of array operations.
+
+Usage:
+    python tariff.py audit        # re-price every payment, report mismatches
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from storage import EXPORT_TABLES
+
+ANY = '*'
+
+
+class TariffTable:
+    """Compiled rate tables.
+
+    rates: [{'location', 'vehicle_type', 'band', 'base_hours', 'base_amount', 'hourly'}]
+    time_bands: {name: {'start': hour, 'end': hour}} (end exclusive, may wrap midnight)
+    """
+
+    def __init__(self, rates, time_bands=None):
+        time_bands = time_bands or {}
+        self.locations = [ANY] + sorted({r['location'] for r in rates} - {ANY})
+        self.vehicle_types = sorted({r['vehicle_type'] for r in rates})
+        self.bands = [ANY] + sorted(time_bands)
+        self._location_index = {name: i for i, name in enumerate(self.locations)}
+        self._vehicle_index = {name: i for i, name in enumerate(self.vehicle_types)}
+
+        # hour of day -> band index (0 = no band)
+        self._band_of_hour = np.zeros(24, dtype=np.intp)
+        for name, band in time_bands.items():
+            start, end = int(band['start']) % 24, int(band['end']) % 24
+            hours = np.arange(start, end) if start < end else np.r_[np.arange(start, 24), np.arange(0, end)]
+            self._band_of_hour[hours] = self.bands.index(name)
+
+        shape = (len(self.locations), len(self.vehicle_types), len(self.bands))
+        self._base_hours = np.full(shape, np.nan)
+        self._base_amount = np.full(shape, np.nan)
+        self._hourly = np.full(shape, np.nan)
+        # Least specific first, so location- and band-specific rates overwrite the defaults
+        for rate in sorted(rates, key=lambda r: (r['location'] != ANY) * 2 + (r.get('band', ANY) != ANY)):
+            band = rate.get('band', ANY)
+            if band not in self.bands:
+                raise ValueError(f"Rate refers to unknown time band '{band}'")
+            loc = slice(None) if rate['location'] == ANY else self._location_index[rate['location']]
+            b = slice(None) if band == ANY else self.bands.index(band)
+            v = self._vehicle_index[rate['vehicle_type']]
+            self._base_hours[loc, v, b] = rate['base_hours']
+            self._base_amount[loc, v, b] = rate['base_amount']
+            self._hourly[loc, v, b] = rate['hourly']
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['rates'], data.get('time_bands'))
+
+    @staticmethod
+    def _lookup(values, index, default=None, what='value'):
+        values = np.asarray(values, dtype=object).astype(str)
+        unique, inverse = np.unique(values, return_inverse=True)
+        mapped = np.array([index.get(value, -1 if default is None else default) for value in unique], dtype=np.intp)
+        if (mapped < 0).any():
+            raise ValueError(f"Unknown {what} '{unique[mapped < 0][0]}'")
+        return mapped[inverse.reshape(values.shape)]
+
+    def price(self, vehicle_types, hours, locations=None, start_hours=None):
+        """Amounts for equally long sequences of vehicle types and hours.
+
+        locations: unknown or None entries use the '*' rates; start_hours:
+        hour of day each stay starts (selects the time band), None for no band.
+        Raises ValueError for unknown vehicle types, non-positive hours or
+        combinations without a rate.
+        """
+        v = self._lookup(vehicle_types, self._vehicle_index, what='vehicle type')
+        h = np.ceil(np.asarray(hours, dtype=float))
+        if h.shape != v.shape:
+            raise ValueError("vehicle_types and hours must have the same length")
+        if not (h > 0).all():
+            raise ValueError("hours must be positive")
+        if locations is None:
+            loc = np.zeros_like(v)
+        else:
+            loc = self._lookup([ANY if l is None else l for l in locations], self._location_index, default=0)
+        if start_hours is None:
+            band = np.zeros_like(v)
+        else:
+            band = self._band_of_hour[np.asarray(start_hours, dtype=np.intp) % 24]
+
+        base_hours = self._base_hours[loc, v, band]
+        if np.isnan(base_hours).any():
+            i = int(np.flatnonzero(np.isnan(base_hours))[0])
+            raise ValueError(f"No rate for {self.vehicle_types[v[i]]} at {self.locations[loc[i]]}")
+        return self._base_amount[loc, v, band] + np.maximum(h - base_hours, 0) * self._hourly[loc, v, band]
+
+    def quote(self, vehicle_type, hours, location=None, start_hour=None):
+        """Amount for a single stay."""
+        return float(self.price([vehicle_type], [hours], [location],
+                                None if start_hour is None else [start_hour])[0])
+
+    def rates_for(self, location=None, start_hour=None):
+        """The rate each vehicle type pays at location, starting at start_hour, as
+        [{'vehicle_type', 'base_hours', 'base_amount', 'hourly'}] (for pricing tables)."""
+        loc = self._location_index.get(location, 0)
+        band = 0 if start_hour is None else self._band_of_hour[start_hour % 24]
+        return [{
+            'vehicle_type': vehicle_type,
+            'base_hours': float(self._base_hours[loc, v, band]),
+            'base_amount': float(self._base_amount[loc, v, band]),
+            'hourly': float(self._hourly[loc, v, band]),
+        } for v, vehicle_type in enumerate(self.vehicle_types) if not np.isnan(self._base_hours[loc, v, band])]
+
+
+def audit(store, tariffs, chunk_size=5000):
+    """Re-price every payment (time band from the hour it was paid).
+
+    Returns (payments, mismatches, charged - expected).
+    """
+    columns = EXPORT_TABLES['payments']['columns']
+    vt, hrs, amt, loc, start = (columns.index(c) for c in ('vehicle_type', 'hours', 'amount', 'location', 'created_at'))
+    total = mismatches = 0
+    delta = 0.0
+    for rows in store.iter_export('payments', chunk_size=chunk_size):
+        expected = tariffs.price([r[vt] for r in rows], [r[hrs] for r in rows], [r[loc] for r in rows],
+                                 [r[start].hour if r[start] else 0 for r in rows])
+        charged = np.array([float(r[amt]) for r in rows])
+        wrong = ~np.isclose(charged, expected)
+        total += len(rows)
+        mismatches += int(wrong.sum())
+        delta += float((charged - expected)[wrong].sum())
+    return total, mismatches, delta
+
+
+def main():
+    from storage import create_backend, config_from_env, DataStore
+
+    parser = argparse.ArgumentParser(description="Tariff engine tools")
+    parser.add_argument('command', choices=['audit'])
+    parser.add_argument('--tariffs', default='tariffs.json')
+    args = parser.parse_args()
+
+    tariffs = TariffTable.from_file(args.tariffs)
+    backend = create_backend(config_from_env())
+    print(f"🔗 Connecting to {backend.name} database...")
+    conn = backend.connect()
+    try:
+        backend.init_schema(conn)
+        store = DataStore(backend, lambda: conn)
+        print("🧮 Re-pricing payments...")
+        total, mismatches, delta = audit(store, tariffs)
+        print(f"✅ {total} payments checked, {mismatches} charged differently from the tariff "
+              f"(net difference ₹{delta:.2f})")
+        return True
+    except Exception as e:
+        print(f"❌ Audit failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)